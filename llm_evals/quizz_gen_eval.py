@@ -3,6 +3,7 @@ from opik.evaluation.metrics import GEval, Hallucination, AnswerRelevance
 from opik.evaluation import evaluate
 from settings import settings
 from services.quizz_gen_service.model import quizz_generator
+from services.quizz_gen_service.quiz_parser import QuizParseError
 
 client = Opik(api_key=settings.OPIK_API_KEY)
 metrics = [
@@ -33,7 +34,11 @@ def eval_task(x):
     topic = x["topic"]
     num_questions = x["num_questions"]
 
-    output = quizz_generator(topic, num_questions, difficulty, style)
+    try:
+        output = quizz_generator(topic, num_questions, difficulty, style)
+    except QuizParseError as e:
+        # Conta como resposta falhada em vez de interromper a avaliação
+        output = {"Output": f"Error: {e}"}
     return {
         "output": output,
     }
@@ -1,5 +1,6 @@
 # utils/redis_config.py
 import redis
+import redis.asyncio as aioredis
 from .eval_settings import eval_settings
 
 
@@ -24,5 +25,19 @@ class RedisConfig:
             health_check_interval=30,
         )
 
+    def get_async_client(self) -> aioredis.Redis:
+        return aioredis.Redis(
+            host=self.host,
+            username=self.username,
+            password=self.password,
+            ssl=False,
+            port=self.port,
+            decode_responses=True,
+            socket_connect_timeout=2,
+            socket_timeout=2,
+            health_check_interval=30,
+        )
+
 
 redis_client = RedisConfig().get_client()
+async_redis_client = RedisConfig().get_async_client()
@@ -3,7 +3,7 @@ from sqlmodel import Field, SQLModel
 import uuid
 from uuid import UUID
 from datetime import datetime
-from typing import List
+from typing import List, Literal
 from pydantic import Field as PydField
 
 
@@ -12,11 +12,28 @@ class SingleEvaluationRequest(BaseModel):
     answer: str
 
 
+GradingMode = Literal["per_question", "batch"]
+
+
 class EvaluationRequest(BaseModel):
     student_id: str
     topic: str
     quizz_questions: List[str]
     student_answers: List[str]
+    # None usa EVAL_GRADING_MODE / EVAL_BATCH_SIZE
+    grading_mode: GradingMode | None = None
+    batch_size: int | None = PydField(default=None, ge=1)
+
+
+class GradeItem(BaseModel):
+    index: int
+    correct_answer: str
+    feedback: str
+    score: float = PydField(ge=0.0, le=1.0)
+
+
+class BatchGrades(BaseModel):
+    grades: List[GradeItem]
 
 
 class Evaluation(SQLModel, table=True):
@@ -28,6 +45,11 @@ class Evaluation(SQLModel, table=True):
     score: float
     feedback: str
     date: datetime
+    # Agrupa as perguntas de um mesmo quiz (store_evals_bulk); None em
+    # linhas antigas, gravadas uma a uma
+    batch_id: str | None = Field(default=None, index=True)
+    # Posição da pergunta no quiz (ordem do valor `Eval:*`)
+    position: int | None = None
 
 
 class User(BaseModel):
@@ -50,6 +72,7 @@ class EvaluationJobMessage(BaseModel):
     student_answers: List[str]
     created_at: str = PydField(description="ISO8601 datetime string")
     trace_id: str | None = None
+    grading_mode: GradingMode | None = None
 
 
 class EvaluationCompleted(BaseModel):
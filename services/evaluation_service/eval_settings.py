@@ -15,12 +15,54 @@ class EvalSettings(BaseSettings):
     REDIS_ENDPOINT: str
     REDIS_PASSWORD: str
     OPIK_API_KEY: str
+    # Log every SQL statement (debugging only)
+    EVAL_DB_ECHO: bool = False
 
     # RabbitMQ
     RABBITMQ_URL: str | None = None
     RABBITMQ_EXCHANGE: str = "app.events"
     RABBITMQ_ROUTING_KEY: str = "quiz.generate.request"
     RABBITMQ_PREFETCH: int = 16
+    # Messages processed concurrently per process (<= prefetch) and how long
+    # shutdown waits for them before requeueing
+    RABBITMQ_CONSUMER_CONCURRENCY: int = 8
+    RABBITMQ_DRAIN_TIMEOUT_SECONDS: float = 30.0
+    # Threads for the sync calls left in the consumers (DB, sync Redis, LLM)
+    # and event loop lag above which a warning is logged
+    BLOCKING_POOL_SIZE: int = 8
+    LOOP_LAG_WARN_MS: float = 200.0
+    # evaluation.completed outbox: max queued events (new ones are dropped
+    # when full), retry backoff cap and how long shutdown waits to flush it
+    EVAL_OUTBOX_MAX_SIZE: int = 1000
+    EVAL_OUTBOX_MAX_BACKOFF_SECONDS: float = 30.0
+    EVAL_OUTBOX_DRAIN_TIMEOUT_SECONDS: float = 10.0
+
+    # Shared LLM HTTP pool, per model: max concurrent requests + keep-alive
+    LLM_MAX_CONNECTIONS: int = 32
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 16
+    LLM_KEEPALIVE_EXPIRY_SECONDS: float = 60.0
+
+    # Quiz grading: questions graded concurrently per process, per-question
+    # timeout
+    EVAL_MAX_CONCURRENCY: int = 8
+    EVAL_GRADE_TIMEOUT_SECONDS: float = 60.0
+    # "per_question" or "batch" (one structured-output call per EVAL_BATCH_SIZE
+    # questions, 0 = whole quiz; falls back to per-question on a bad reply)
+    EVAL_GRADING_MODE: str = "per_question"
+    EVAL_BATCH_SIZE: int = 10
+    EVAL_BATCH_TIMEOUT_SECONDS: float = 120.0
+
+    # Grade cache (Redis), keyed on the normalized question/answer pair, the
+    # prompt fingerprint and the model. Bump EVAL_GRADE_CACHE_VERSION to drop
+    # every cached grade without touching the prompts.
+    EVAL_GRADE_CACHE_ENABLED: bool = True
+    EVAL_GRADE_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    EVAL_GRADE_CACHE_VERSION: str = "1"
+
+    # Push job status: max lifetime of a /jobs/{id}/events SSE stream and max
+    # server-side wait of the /jobs/{id}/wait long-poll
+    JOB_SSE_MAX_SECONDS: float = 300.0
+    JOB_LONG_POLL_MAX_SECONDS: float = 30.0
 
 
 eval_settings = EvalSettings()
@@ -1,15 +1,19 @@
+import hashlib
 import opik
 from langchain_openai import ChatOpenAI
 from dotenv import load_dotenv
-from typing import TYPE_CHECKING
+from typing import List, Tuple, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from services.evaluation_service.eval_settings import eval_settings as eval_cfg
+    from services.evaluation_service.llm_registry import LLMClientRegistry
 else:
     try:
         from services.evaluation_service.eval_settings import eval_settings as eval_cfg
+        from services.evaluation_service.llm_registry import LLMClientRegistry
     except Exception:
         from .eval_settings import eval_settings as eval_cfg
+        from .llm_registry import LLMClientRegistry
 
 load_dotenv()
 OPIK_API_KEY = eval_cfg.OPIK_API_KEY
@@ -97,11 +101,65 @@ Please give your answer to the question and compare it witn the when evaluating
 """,
 )
 
+BATCH_EVALUATOR_PROMPT = opik.Prompt(
+    name="Batch_Evaluator_Prompt",
+    prompt="""
+You are an expert mathematics teacher. Your task is to evaluate a student's answers to several math questions from the same quiz.
+
+For EACH numbered item below:
+1. Work out the correct answer to the question
+2. Determine if the student's answer is fully correct, partially correct, or incorrect
+3. Give constructive feedback — what they got right, what they missed, and how to improve
+4. Assign a score from 0 to 1
+
+Rules:
+- Score must be between 0.0 and 1.0
+- 1.0 = fully correct
+- 0.7-0.9 = mostly correct with minor issues
+- 0.4-0.6 = partially correct
+- 0.1-0.3 = some understanding but major errors
+- 0.0 = completely incorrect
+- Grade every item independently, and return exactly one grade per item, in the same order, with its item number as `index`
+
+Examples:
+- Question: What is the derivative of f(x) = sin(x²)? Student: f '(x) = cos(x²) -> correct_answer: "f '(x) = 2x * cos(x²)", score 0.5, feedback: the chain rule was applied but the factor 2x from the inner function is missing.
+- Question: Find the area of a circle with radius 3. Student: 9π -> correct_answer: "9π", score 1.0, feedback: correct use of A = πr².
+- Question: Explain how the derivative of a function relates to its graph. Student: It shows if it’s going up or down. -> score 0.7, feedback: right intuition, but mention slope and what a zero derivative means.
 
-def get_llm(model_name: str = "gpt-4o-mini", temperature: float = 0.7) -> ChatOpenAI:
-    llm = ChatOpenAI(model=model_name, temperature=temperature)
-    return llm
+Items:
+{items}
+""",
+)
+
+
+llm_registry = LLMClientRegistry(
+    max_connections=eval_cfg.LLM_MAX_CONNECTIONS,
+    max_keepalive_connections=eval_cfg.LLM_MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry=eval_cfg.LLM_KEEPALIVE_EXPIRY_SECONDS,
+)
+
+
+GRADING_MODEL = "gpt-4o-mini"
+
+
+def get_llm(model_name: str = GRADING_MODEL, temperature: float = 0.7) -> ChatOpenAI:
+    # Cliente partilhado (pool HTTP keep-alive) em vez de um novo por pedido
+    return llm_registry.get(model_name, temperature)
+
+
+def grading_prompt_version() -> str:
+    # Impressão digital dos prompts de avaliação: mudar o texto muda a chave
+    text = EVALUATOR_PROMPT.prompt + "\0" + BATCH_EVALUATOR_PROMPT.prompt
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
 
 
 def format_evaluator_prompt(question: str, answer: str) -> str:
     return EVALUATOR_PROMPT.prompt.format(question=question, student_response=answer)
+
+
+def format_batch_evaluator_prompt(pairs: List[Tuple[str, str]]) -> str:
+    items = "\n".join(
+        f"{i}. Question: {question}\n   Student Response: {answer}"
+        for i, (question, answer) in enumerate(pairs)
+    )
+    return BATCH_EVALUATOR_PROMPT.prompt.format(items=items)
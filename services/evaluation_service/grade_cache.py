@@ -0,0 +1,167 @@
+"""
+Redis cache for graded (question, answer) pairs.
+
+Many submissions repeat the same answer to the same question, so a grade is
+stored under a hash of the normalized pair (Unicode NFKC, whitespace
+collapsed) namespaced by EVAL_GRADE_CACHE_VERSION, the grading prompt
+fingerprint and the model. Editing a prompt or switching models therefore
+never serves an old grade; the keys of previous versions simply expire, or
+can be removed at once by an operator:
+
+    python -m services.evaluation_service.grade_cache [--all-versions]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import unicodedata
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .cache import async_redis_client
+from .eval_settings import eval_settings
+from .eval_utils import GRADING_MODEL, grading_prompt_version
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+KEY_PREFIX = "eval:grade"
+
+
+@dataclass
+class GradeCacheStats:
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    invalidated: int = 0
+    errors: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = asdict(self)
+        lookups = self.hits + self.misses
+        data["hit_rate"] = round(self.hits / lookups, 4) if lookups else 0.0
+        return data
+
+
+def normalize(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", text or "").split())
+
+
+class GradeCache:
+    def __init__(
+        self,
+        client: Any,
+        model: str = GRADING_MODEL,
+        prompt_version: Optional[str] = None,
+        version: str = "1",
+        ttl_seconds: Optional[int] = None,
+        enabled: bool = True,
+    ) -> None:
+        self.client = client
+        self.model = model
+        self.prompt_version = prompt_version or grading_prompt_version()
+        self.version = version
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self.stats = GradeCacheStats()
+
+    @property
+    def namespace(self) -> str:
+        return f"{KEY_PREFIX}:v{self.version}:{self.prompt_version}:{self.model}"
+
+    def key(self, question: str, answer: str) -> str:
+        pair = normalize(question) + "\0" + normalize(answer)
+        digest = hashlib.sha256(pair.encode("utf-8")).hexdigest()
+        return f"{self.namespace}:{digest}"
+
+    async def get_many(
+        self, pairs: Sequence[Tuple[str, str]]
+    ) -> List[Optional[Dict[str, Any]]]:
+        if not self.enabled or not pairs:
+            return [None] * len(pairs)
+        try:
+            raws = await self.client.mget([self.key(q, a) for q, a in pairs])
+        except Exception as e:
+            self.stats.errors += 1
+            logger.warning(f"Grade cache mget failed: {e}")
+            return [None] * len(pairs)
+        grades: List[Optional[Dict[str, Any]]] = []
+        for raw in raws:
+            try:
+                grades.append(None if raw is None else json.loads(raw))
+            except ValueError:
+                grades.append(None)
+        hits = sum(g is not None for g in grades)
+        self.stats.hits += hits
+        self.stats.misses += len(pairs) - hits
+        return grades
+
+    async def set_many(self, items: Sequence[Dict[str, Any]]) -> None:
+        """Store graded items (with question/student_answer); errors are skipped."""
+        items = [item for item in items if "error" not in item]
+        if not self.enabled or not items:
+            return
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for item in items:
+                grade = {
+                    "correct_answer": item["correct_answer"],
+                    "feedback": item["feedback"],
+                    "score": item["score"],
+                }
+                pipe.set(
+                    self.key(item["question"], item["student_answer"]),
+                    json.dumps(grade),
+                    ex=self.ttl_seconds,
+                )
+            await pipe.execute()
+        except Exception as e:
+            self.stats.errors += 1
+            logger.warning(f"Grade cache pipeline set failed: {e}")
+            return
+        self.stats.stores += len(items)
+
+    async def invalidate(self, all_versions: bool = False) -> int:
+        """
+        Delete cached grades of other prompt/model/version namespaces (after a
+        prompt change), or every cached grade with `all_versions=True`.
+        """
+        current = f"{self.namespace}:"
+        deleted = 0
+        batch: List[str] = []
+        async for key in self.client.scan_iter(match=f"{KEY_PREFIX}:*", count=500):
+            if all_versions or not key.startswith(current):
+                batch.append(key)
+            if len(batch) >= 500:
+                deleted += await self.client.delete(*batch)
+                batch = []
+        if batch:
+            deleted += await self.client.delete(*batch)
+        self.stats.invalidated += deleted
+        logger.info(f"Grade cache invalidated {deleted} keys")
+        return deleted
+
+
+grade_cache = GradeCache(
+    async_redis_client,
+    version=eval_settings.EVAL_GRADE_CACHE_VERSION,
+    ttl_seconds=eval_settings.EVAL_GRADE_CACHE_TTL_SECONDS or None,
+    enabled=eval_settings.EVAL_GRADE_CACHE_ENABLED,
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Drop cached grades of old prompt/model versions."
+    )
+    parser.add_argument(
+        "--all-versions", action="store_true", help="drop the current version too"
+    )
+    args = parser.parse_args()
+    deleted = asyncio.run(grade_cache.invalidate(all_versions=args.all_versions))
+    print(f"{deleted} keys deleted (current namespace: {grade_cache.namespace})")
+
+
+if __name__ == "__main__":
+    main()
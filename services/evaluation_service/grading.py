@@ -0,0 +1,221 @@
+"""
+Concurrent quiz grading.
+
+Every (question, answer) pair is graded in its own LLM call; the calls of a
+quiz run concurrently, bounded by EVAL_MAX_CONCURRENCY for the whole process
+(shared by HTTP requests and the MQ consumer), and the results come back in
+question order. A question that fails (LLM error, timeout or unparseable
+JSON) does not fail the quiz: its item carries an `error` instead of a grade.
+
+In "batch" mode the quiz is split into groups of `batch_size` questions and
+each group is graded by one structured-output call (the few-shot prompt is
+paid once per group instead of once per question). A group whose reply is
+missing, malformed or does not have one grade per question is regraded with
+per-question calls.
+
+Pairs already graded with the same prompt and model are served from the
+grade cache (see grade_cache.py) and only the misses reach the LLM.
+"""
+
+import asyncio
+import json
+import weakref
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .eval_settings import eval_settings
+from .grade_cache import grade_cache
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+GradeFn = Callable[[str, str], Awaitable[Any]]
+BatchGradeFn = Callable[[List[Tuple[str, str]]], Awaitable[Any]]
+
+
+@dataclass
+class GradingStats:
+    questions: int = 0
+    llm_calls: int = 0
+    batches: int = 0
+    batch_fallbacks: int = 0
+    failures: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = asdict(self)
+        data["questions_per_call"] = (
+            round(self.questions / self.llm_calls, 2) if self.llm_calls else 0.0
+        )
+        return data
+
+
+grading_stats = GradingStats()
+
+# Um semáforo por event loop (asyncio.Semaphore fica preso ao loop onde é usado)
+_limiters: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _limiter() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    limiter = _limiters.get(loop)
+    if limiter is None:
+        limiter = asyncio.Semaphore(eval_settings.EVAL_MAX_CONCURRENCY)
+        _limiters[loop] = limiter
+    return limiter
+
+
+def parse_grade(response: Any) -> Dict[str, Any]:
+    if isinstance(response, dict):
+        result = response
+    else:
+        content = getattr(response, "content", response)
+        result = json.loads(str(content))
+    return {
+        "correct_answer": result["correct_answer"],
+        "feedback": result["feedback"],
+        "score": result["score"],
+    }
+
+
+async def _grade_one(grade: GradeFn, question: str, answer: str) -> Dict[str, Any]:
+    item: Dict[str, Any] = {"question": question, "student_answer": answer}
+    try:
+        grading_stats.llm_calls += 1
+        async with _limiter():
+            response = await asyncio.wait_for(
+                grade(question, answer), eval_settings.EVAL_GRADE_TIMEOUT_SECONDS
+            )
+        item.update(parse_grade(response))
+    except Exception as e:
+        logger.error(f"Grading failed for question {question!r}: {e!r}")
+        grading_stats.failures += 1
+        item.update(
+            {
+                "correct_answer": None,
+                "feedback": None,
+                "score": None,
+                "error": str(e) or type(e).__name__,
+            }
+        )
+    return item
+
+
+async def grade_quiz(
+    questions: Sequence[str], answers: Sequence[str], grade: GradeFn
+) -> List[Dict[str, Any]]:
+    """Grade every pair concurrently; items are returned in question order."""
+    grading_stats.questions += min(len(questions), len(answers))
+    return list(
+        await asyncio.gather(
+            *(_grade_one(grade, q, a) for q, a in zip(questions, answers))
+        )
+    )
+
+
+def graded(items: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [item for item in items if "error" not in item]
+
+
+def parse_batch(result: Any, expected: int) -> List[Dict[str, Any]]:
+    """Grades of a batch reply, in item order; raises if it is not usable."""
+    if hasattr(result, "model_dump"):
+        data = result.model_dump()
+    elif hasattr(result, "content"):
+        data = json.loads(str(result.content))
+    else:
+        data = result
+    grades = data["grades"] if isinstance(data, dict) else data
+    if len(grades) != expected:
+        raise ValueError(f"expected {expected} grades, got {len(grades)}")
+    by_index = {int(g["index"]): g for g in grades}
+    if sorted(by_index) != list(range(expected)):
+        raise ValueError("grade indexes do not match the items")
+    parsed = [parse_grade(by_index[i]) for i in range(expected)]
+    for grade in parsed:
+        if not 0.0 <= float(grade["score"]) <= 1.0:
+            raise ValueError(f"score out of range: {grade['score']}")
+    return parsed
+
+
+async def _grade_batch(
+    grade_batch: BatchGradeFn, grade: GradeFn, pairs: List[Tuple[str, str]]
+) -> List[Dict[str, Any]]:
+    try:
+        grading_stats.llm_calls += 1
+        grading_stats.batches += 1
+        async with _limiter():
+            result = await asyncio.wait_for(
+                grade_batch(pairs), eval_settings.EVAL_BATCH_TIMEOUT_SECONDS
+            )
+        grades = parse_batch(result, len(pairs))
+    except Exception as e:
+        logger.warning(
+            f"Batch grading of {len(pairs)} questions failed ({e!r}); "
+            "falling back to per-question calls"
+        )
+        grading_stats.batch_fallbacks += 1
+        return list(await asyncio.gather(*(_grade_one(grade, q, a) for q, a in pairs)))
+    return [
+        {"question": q, "student_answer": a, **g} for (q, a), g in zip(pairs, grades)
+    ]
+
+
+async def grade_quiz_batched(
+    questions: Sequence[str],
+    answers: Sequence[str],
+    grade_batch: BatchGradeFn,
+    grade: GradeFn,
+    batch_size: int = 0,
+) -> List[Dict[str, Any]]:
+    """
+    Grade the quiz in groups of `batch_size` (0 = one group), one LLM call
+    per group, groups in parallel; items are returned in question order.
+    """
+    pairs = list(zip(questions, answers))
+    grading_stats.questions += len(pairs)
+    size = batch_size if batch_size > 0 else max(len(pairs), 1)
+    groups = [pairs[i : i + size] for i in range(0, len(pairs), size)]
+    results = await asyncio.gather(
+        *(_grade_batch(grade_batch, grade, g) for g in groups)
+    )
+    return [item for group in results for item in group]
+
+
+async def grade_answers(
+    questions: Sequence[str],
+    answers: Sequence[str],
+    grade: GradeFn,
+    grade_batch: BatchGradeFn,
+    mode: Optional[str] = None,
+    batch_size: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Grade with the requested mode (None = EVAL_GRADING_MODE); cached pairs
+    are not sent to the LLM and new grades are cached.
+    """
+    pairs = list(zip(questions, answers))
+    cached = await grade_cache.get_many(pairs)
+    todo = [pair for pair, hit in zip(pairs, cached) if hit is None]
+    fresh: List[Dict[str, Any]] = []
+    if todo:
+        todo_q = [q for q, _ in todo]
+        todo_a = [a for _, a in todo]
+        if (mode or eval_settings.EVAL_GRADING_MODE) == "batch":
+            if batch_size is None:
+                batch_size = eval_settings.EVAL_BATCH_SIZE
+            fresh = await grade_quiz_batched(
+                todo_q, todo_a, grade_batch, grade, batch_size
+            )
+        else:
+            fresh = await grade_quiz(todo_q, todo_a, grade)
+        await grade_cache.set_many(fresh)
+
+    graded_iter = iter(fresh)
+    return [
+        next(graded_iter)
+        if hit is None
+        else {"question": q, "student_answer": a, **hit}
+        for (q, a), hit in zip(pairs, cached)
+    ]
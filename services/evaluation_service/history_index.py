@@ -0,0 +1,156 @@
+"""
+Per-user history index in Redis.
+
+Listing a user's cached results used to SCAN `<prefix>:<user>:*` across the
+whole keyspace, which is O(total keys). Writers now also add the key to a
+sorted set `history:<kind>:<user>` scored by creation time (trimmed to
+HISTORY_MAX_ENTRIES, with the TTL of the values it points to), so a page
+costs ZCARD + ZREVRANGE + MGET on that user's keys only. Members whose value
+has expired are dropped from the index when a page meets them, and the page
+is read again so it is not returned short.
+
+When the index is empty (expired, or Redis unavailable), or a page goes past
+the end of an index that was trimmed to HISTORY_MAX_ENTRIES, the endpoints
+page the same history from Postgres, the source of truth.
+
+Keys cached before the index existed are added once with
+
+    python -m services.evaluation_service.history_index Eval
+"""
+
+import argparse
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from .cache import redis_client
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+INDEX_PREFIX = "history"
+HISTORY_MAX_ENTRIES = 500
+
+
+@dataclass
+class HistoryPage:
+    items: List[str]
+    total: int
+    source: str
+
+
+def index_key(kind: str, username: str) -> str:
+    return f"{INDEX_PREFIX}:{kind}:{username}"
+
+
+def _queue_record(
+    pipe: Any,
+    kind: str,
+    username: str,
+    key: str,
+    ttl_seconds: Optional[int],
+    created_at: Optional[float],
+) -> None:
+    idx = index_key(kind, username)
+    pipe.zadd(idx, {key: created_at if created_at is not None else time.time()})
+    # Mantém só as HISTORY_MAX_ENTRIES mais recentes
+    pipe.zremrangebyrank(idx, 0, -HISTORY_MAX_ENTRIES - 1)
+    if ttl_seconds:
+        pipe.expire(idx, ttl_seconds)
+
+
+def record(
+    client: Any,
+    kind: str,
+    username: str,
+    key: str,
+    ttl_seconds: Optional[int] = None,
+    created_at: Optional[float] = None,
+) -> None:
+    """Index `key` in the user's history (sync client); never raises."""
+    try:
+        pipe = client.pipeline(transaction=False)
+        _queue_record(pipe, kind, username, key, ttl_seconds, created_at)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"History index update failed for {key}: {e}")
+
+
+async def arecord(
+    client: Any,
+    kind: str,
+    username: str,
+    key: str,
+    ttl_seconds: Optional[int] = None,
+    created_at: Optional[float] = None,
+) -> None:
+    """Async-client variant of `record`; never raises."""
+    try:
+        pipe = client.pipeline(transaction=False)
+        _queue_record(pipe, kind, username, key, ttl_seconds, created_at)
+        await pipe.execute()
+    except Exception as e:
+        logger.warning(f"History index update failed for {key}: {e}")
+
+
+def read_page(
+    client: Any, kind: str, username: str, offset: int, limit: int
+) -> Optional[HistoryPage]:
+    """
+    Newest-first page of cached values, or None when Postgres has to serve it
+    (empty index, or a page past the end of a trimmed one).
+    """
+    idx = index_key(kind, username)
+    while True:
+        pipe = client.pipeline(transaction=False)
+        pipe.zcard(idx)
+        pipe.zrevrange(idx, offset, offset + limit - 1)
+        total, keys = pipe.execute()
+        if not total:
+            return None
+        if offset + limit > total and total >= HISTORY_MAX_ENTRIES:
+            # As entradas mais antigas foram cortadas do índice
+            return None
+        values = client.mget(keys) if keys else []
+        expired = [k for k, v in zip(keys, values) if v is None]
+        if not expired:
+            return HistoryPage(items=list(values), total=total, source="redis")
+        # Remove as expiradas e relê: a página seguinte sobe para o lugar delas
+        client.zrem(idx, *expired)
+
+
+def backfill(client: Any, kind: str, scan_count: int = 1000) -> Dict[str, int]:
+    """
+    Index every `<kind>:<user>:<id>` key already in Redis (one keyspace SCAN),
+    for entries cached before the index existed. They get score 0, older
+    than anything recorded since; members already indexed keep their score.
+    Returns the number of keys found per user.
+    """
+    found: Dict[str, List[str]] = {}
+    for raw in client.scan_iter(match=f"{kind}:*", count=scan_count):
+        key = raw.decode() if isinstance(raw, bytes) else raw
+        username = key[len(kind) + 1 : key.rfind(":")]
+        if username:
+            found.setdefault(username, []).append(key)
+    for username, keys in found.items():
+        idx = index_key(kind, username)
+        pipe = client.pipeline(transaction=False)
+        pipe.zadd(idx, {key: 0 for key in keys}, nx=True)
+        pipe.zremrangebyrank(idx, 0, -HISTORY_MAX_ENTRIES - 1)
+        pipe.execute()
+    return {username: len(keys) for username, keys in found.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Index history keys cached before the per-user index."
+    )
+    parser.add_argument("kinds", nargs="+", help="key prefixes, e.g. Eval")
+    args = parser.parse_args()
+    for kind in args.kinds:
+        counts = backfill(redis_client, kind)
+        print(f"{kind}: {sum(counts.values())} keys for {len(counts)} users")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Push channel for async job status (quiz generation and answer evaluation).
+
+Every status transition (queued -> processing -> done/failed) is appended to
+a small Redis stream `jobs:<status key>` (e.g. `jobs:Quizz:<user>:<id>`)
+next to the status key itself. Unlike pub/sub, the stream keeps the last
+events, so a client that connects after a transition (or reconnects with
+`Last-Event-ID`) still receives it. The status keys and `GET /jobs/{id}`
+are unchanged; publishing an event is best effort.
+
+Readers use the async client and block in XREAD slices shorter than the
+client socket timeout: `sse_events` yields Server-Sent Events until a
+terminal status, `wait_event` is the long-poll variant.
+"""
+
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+STREAM_PREFIX = "jobs"
+STREAM_MAXLEN = 20
+STREAM_TTL_SECONDS = 3600
+TERMINAL_STATUSES = {"done", "failed"}
+# XREAD BLOCK por fatias abaixo do socket_timeout (2s) do cliente Redis
+_BLOCK_SLICE_MS = 1000
+
+Event = Tuple[str, Dict[str, Any]]
+
+
+def stream_key(status_key: str) -> str:
+    return f"{STREAM_PREFIX}:{status_key}"
+
+
+def publish_event(client: Any, status_key: str, event: Dict[str, Any]) -> None:
+    """Append `event` to the job stream (sync client); never raises."""
+    key = stream_key(status_key)
+    try:
+        pipe = client.pipeline(transaction=False)
+        pipe.xadd(
+            key, {"event": json.dumps(event)}, maxlen=STREAM_MAXLEN, approximate=True
+        )
+        pipe.expire(key, STREAM_TTL_SECONDS)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Job event publish failed for {status_key}: {e}")
+
+
+async def apublish_event(client: Any, status_key: str, event: Dict[str, Any]) -> None:
+    """Async-client variant of `publish_event`; never raises."""
+    key = stream_key(status_key)
+    try:
+        pipe = client.pipeline(transaction=False)
+        pipe.xadd(
+            key, {"event": json.dumps(event)}, maxlen=STREAM_MAXLEN, approximate=True
+        )
+        pipe.expire(key, STREAM_TTL_SECONDS)
+        await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Job event publish failed for {status_key}: {e}")
+
+
+async def read_events(
+    client: Any, status_key: str, last_id: str = "0", block_ms: int = 0
+) -> List[Event]:
+    """Events after `last_id`, waiting up to `block_ms` (0 = do not wait)."""
+    kwargs: Dict[str, Any] = {"count": 50}
+    if block_ms > 0:
+        kwargs["block"] = block_ms
+    resp = await client.xread({stream_key(status_key): last_id}, **kwargs)
+    events: List[Event] = []
+    for _stream, entries in resp or []:
+        for event_id, fields in entries:
+            try:
+                events.append((event_id, json.loads(fields["event"])))
+            except (KeyError, ValueError):
+                logger.warning(f"Malformed job event {event_id} for {status_key}")
+    return events
+
+
+async def wait_event(
+    client: Any, status_key: str, since: str = "0", timeout: float = 25.0
+) -> Optional[Dict[str, Any]]:
+    """
+    Long-poll: the latest event after `since` (the current status right away
+    when `since` is "0"), or None if nothing happened within `timeout`.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        remaining_ms = int((deadline - loop.time()) * 1000)
+        block_ms = max(1, min(_BLOCK_SLICE_MS, remaining_ms))
+        events = await read_events(client, status_key, since, block_ms)
+        if events:
+            event_id, event = events[-1]
+            return {"event_id": event_id, **event}
+        if remaining_ms <= 0:
+            return None
+
+
+async def sse_events(
+    client: Any,
+    status_key: str,
+    last_id: str = "0",
+    max_seconds: float = 300.0,
+    heartbeat_seconds: float = 15.0,
+) -> AsyncIterator[str]:
+    """Server-Sent Events for the job until a terminal status or `max_seconds`."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_seconds
+    last_beat = loop.time()
+    while loop.time() < deadline:
+        try:
+            events = await read_events(client, status_key, last_id, _BLOCK_SLICE_MS)
+        except Exception as e:
+            logger.warning(f"Job event stream failed for {status_key}: {e}")
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+            return
+        for event_id, event in events:
+            last_id = event_id
+            yield f"id: {event_id}\nevent: status\ndata: {json.dumps(event)}\n\n"
+            if event.get("status") in TERMINAL_STATUSES:
+                return
+        if loop.time() - last_beat >= heartbeat_seconds:
+            # Comentário SSE: mantém a ligação viva em proxies (nginx, LB)
+            last_beat = loop.time()
+            yield ": keep-alive\n\n"
@@ -0,0 +1,209 @@
+"""
+Process-wide registry of LLM clients.
+
+`get_llm()` used to build a new ChatOpenAI (and with it a new HTTP client,
+TCP connection and TLS handshake) on every call. The registry keeps one
+ChatOpenAI per (model, temperature, timeout, max_retries) and one pair of
+keep-alive httpx clients (sync + async) per model, shared by every ChatOpenAI
+of that model. `max_connections` bounds the concurrent requests per model:
+callers above the limit wait for a free connection in the pool.
+
+Pool utilisation (in-flight/peak requests, errors, open connections) is
+counted by a transport wrapper and reported by `as_dict()`.
+"""
+
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+
+class PoolStats:
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+
+    def started(self) -> None:
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def finished(self, failed: bool) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            if failed:
+                self.errors += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "utilization": round(self.in_flight / self.limit, 4) if self.limit else 0,
+        }
+
+
+# Conta pedidos até à chegada dos headers (o corpo é lido depois pelo SDK)
+class _MeteredTransport(httpx.BaseTransport):
+    def __init__(self, inner: httpx.BaseTransport, stats: PoolStats) -> None:
+        self.inner = inner
+        self.stats = stats
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self.stats.started()
+        failed = True
+        try:
+            response = self.inner.handle_request(request)
+            failed = response.status_code >= 500
+            return response
+        finally:
+            self.stats.finished(failed)
+
+    def close(self) -> None:
+        self.inner.close()
+
+
+class _AsyncMeteredTransport(httpx.AsyncBaseTransport):
+    def __init__(self, inner: httpx.AsyncBaseTransport, stats: PoolStats) -> None:
+        self.inner = inner
+        self.stats = stats
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.stats.started()
+        failed = True
+        try:
+            response = await self.inner.handle_async_request(request)
+            failed = response.status_code >= 500
+            return response
+        finally:
+            self.stats.finished(failed)
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+def _open_connections(transport: Any) -> int:
+    # httpcore não expõe isto publicamente; 0 se a estrutura mudar
+    pool = getattr(getattr(transport, "inner", None), "_pool", None)
+    return len(getattr(pool, "connections", []) or [])
+
+
+class _ModelPool:
+    def __init__(
+        self,
+        limits: httpx.Limits,
+        transport: Optional[httpx.BaseTransport],
+        async_transport: Optional[httpx.AsyncBaseTransport],
+    ) -> None:
+        self.stats = PoolStats(limits.max_connections or 0)
+        self._sync_transport = _MeteredTransport(
+            transport or httpx.HTTPTransport(limits=limits), self.stats
+        )
+        self._async_transport = _AsyncMeteredTransport(
+            async_transport or httpx.AsyncHTTPTransport(limits=limits), self.stats
+        )
+        self.client = httpx.Client(transport=self._sync_transport)
+        self.async_client = httpx.AsyncClient(transport=self._async_transport)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            **self.stats.as_dict(),
+            "open_connections": _open_connections(self._sync_transport)
+            + _open_connections(self._async_transport),
+        }
+
+
+class LLMClientRegistry:
+    def __init__(
+        self,
+        max_connections: int = 32,
+        max_keepalive_connections: int = 16,
+        keepalive_expiry: float = 60.0,
+        factory: Callable[..., Any] = ChatOpenAI,
+        transport: Optional[httpx.BaseTransport] = None,
+        async_transport: Optional[httpx.AsyncBaseTransport] = None,
+    ) -> None:
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.factory = factory
+        self._transport = transport
+        self._async_transport = async_transport
+        self._lock = threading.Lock()
+        self._clients: Dict[Tuple[Any, ...], Any] = {}
+        self._pools: Dict[str, _ModelPool] = {}
+        self.created = 0
+        self.reused = 0
+
+    def pool(self, model: str) -> _ModelPool:
+        with self._lock:
+            return self._pool(model)
+
+    def _pool(self, model: str) -> _ModelPool:
+        if model not in self._pools:
+            self._pools[model] = _ModelPool(
+                self.limits, self._transport, self._async_transport
+            )
+        return self._pools[model]
+
+    def get(
+        self,
+        model: str,
+        temperature: float = 0.7,
+        timeout: Optional[float] = None,
+        max_retries: int = 2,
+        **kwargs: Any,
+    ) -> Any:
+        """
+        Shared ChatOpenAI for this configuration. Extra kwargs (e.g. api_key)
+        are only used when the client is first created.
+        """
+        key = (model, temperature, timeout, max_retries)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self.reused += 1
+                return client
+            pool = self._pool(model)
+            client = self.factory(
+                model=model,
+                temperature=temperature,
+                timeout=timeout,
+                max_retries=max_retries,
+                http_client=pool.client,
+                http_async_client=pool.async_client,
+                **kwargs,
+            )
+            self._clients[key] = client
+            self.created += 1
+            return client
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            pools = dict(self._pools)
+            clients = len(self._clients)
+        return {
+            "clients": clients,
+            "created": self.created,
+            "reused": self.reused,
+            "models": {model: pool.as_dict() for model, pool in pools.items()},
+        }
+
+    async def aclose(self) -> None:
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+            self._clients.clear()
+        for pool in pools:
+            pool.client.close()
+            await pool.async_client.aclose()
@@ -1,22 +1,28 @@
-from fastapi import FastAPI, Depends, HTTPException, status
-from typing import Annotated
+from fastapi import FastAPI, Depends, HTTPException, Header, Query, Response, status
+from fastapi.responses import StreamingResponse
+from typing import Annotated, Optional
 from .data_models import EvaluationRequest, User, SingleEvaluationRequest
-from .model import eval_answer
+from .model import aeval_answer, aeval_answers_batch, eval_answer
 import hashlib
 import json
-from .cache import redis_client
+from .cache import async_redis_client, redis_client
 from .auth_client import get_current_active_user
 from contextlib import asynccontextmanager
-import contextlib
 import asyncio
 from .mq_consumer import start_consumer_task
+from .mq_runtime import runtime_as_dict, stop_consumer_task
 from .eval_settings import eval_settings
 import aio_pika
 from .db import create_db_and_tables
 from .logging_config import get_logger
-from .persistence import store_evals
-from typing import Tuple, List, cast
-from .mq_producer import publish_evaluation_completed_sync
+from .persistence import eval_history, store_evals_bulk
+from .history_index import read_page, record
+from typing import cast
+from .mq_producer import evaluation_outbox
+from .eval_utils import llm_registry
+from .grading import grade_answers, graded, grading_stats
+from .grade_cache import grade_cache
+from .job_events import sse_events, wait_event
 
 # Initialize the logger for this module
 logger = get_logger(__name__)
@@ -27,18 +33,18 @@ async def lifespan(app: FastAPI):
     logger.info("Creating Evaluation tables...")
     create_db_and_tables()
     logger.info("Evaluation tables created. Service is ready.")
+    evaluation_outbox.start()
     consumer_task = start_consumer_task()
     try:
         yield
     finally:
-        # Graceful stop
-        stop_event = getattr(consumer_task, "stop_event", None)
-        if stop_event is not None:
-            stop_event.set()
-        consumer_task.cancel()
-        with contextlib.suppress(Exception):
-            asyncio.get_event_loop().run_until_complete(consumer_task)
+        # Graceful stop: mensagens em curso terminam (ou voltam para a fila)
+        await stop_consumer_task(
+            consumer_task, eval_settings.RABBITMQ_DRAIN_TIMEOUT_SECONDS + 5
+        )
         logger.info("Consumer task stopped")
+        await evaluation_outbox.stop(eval_settings.EVAL_OUTBOX_DRAIN_TIMEOUT_SECONDS)
+        logger.info("Evaluation outbox stopped")
 
 
 app = FastAPI(title="Evaluation Service", lifespan=lifespan)
@@ -62,65 +68,75 @@ async def health_check():
     }
 
 
+@app.get("/metrics")
+async def metrics():
+    """In-process counters (per worker)"""
+    return {
+        "llm_pool": llm_registry.as_dict(),
+        "grading": grading_stats.as_dict(),
+        "grade_cache": grade_cache.stats.as_dict(),
+        **runtime_as_dict(),
+        "outbox": evaluation_outbox.as_dict(),
+    }
+
+
 @app.post("/eval-service")
-def evaluation(
+async def evaluation(
     request: EvaluationRequest,
     current_user: Annotated[User, Depends(get_current_active_user)],
 ):
     try:
         if request.quizz_questions:
-            feedback = []
             question_list = request.quizz_questions
             logger.info(f"question_list: {question_list}")
             answer_list = request.student_answers
             logger.info(f"answer_list: {answer_list}")
 
-            for question, answer in zip(question_list, answer_list):
-                _resp = eval_answer(question, answer)
-                _content = getattr(_resp, "content", _resp)
-                correct_answer = json.loads(cast(str, _content))
-                logger.info(f"correct_answer: {correct_answer}")
-                # request.student_responses.append(request.student_response)
-                store_evals(
-                    current_user.username,
-                    question,
-                    answer,
-                    correct_answer["correct_answer"],
-                    correct_answer["score"],
-                    correct_answer["feedback"],
-                )
+            # Perguntas avaliadas em paralelo; a ordem do quiz é preservada
+            feedback = await grade_answers(
+                question_list,
+                answer_list,
+                aeval_answer,
+                aeval_answers_batch,
+                mode=request.grading_mode,
+                batch_size=request.batch_size,
+            )
+            ok = graded(feedback)
+            if not ok:
+                raise RuntimeError(feedback[0].get("error", "no answers to grade"))
 
-                feedback.append(
-                    {
-                        "question": question,
-                        "student_answer": answer,
-                        "correct_answer": correct_answer["correct_answer"],
-                        "feedback": correct_answer["feedback"],
-                        "score": correct_answer["score"],
-                    }
+            # Chamadas bloqueantes (Postgres/Redis/RabbitMQ) fora do event loop;
+            # todas as avaliações do quiz numa só transação
+            stored = await asyncio.to_thread(
+                store_evals_bulk, current_user.username, ok
+            )
+            for failure in stored.failures:
+                logger.error(
+                    f"Evaluation not saved ({failure.question!r}): {failure.error}"
                 )
 
             question_str = json.dumps(feedback, sort_keys=True)
             question_hash = hashlib.sha256(question_str.encode()).hexdigest()
             key = f"Eval:{current_user.username}:{question_hash}"
-            redis_client.set(key, question_str)
+            await asyncio.to_thread(redis_client.set, key, question_str)
+            await asyncio.to_thread(
+                record, redis_client, "Eval", current_user.username, key
+            )
             logger.info(f"Feedback cached: {feedback}")
-            publish_evaluation_completed_sync(
+            # Só as perguntas avaliadas seguem para o learning assessment;
+            # enfileirado no outbox (publicado em background, sem I/O aqui)
+            evaluation_outbox.enqueue(
                 {
                     "username": current_user.username,
                     "email": current_user.email,
                     "assessment_id": question_hash,
                     "topic": request.topic,
-                    "quizz_questions": question_list,
-                    "student_answers": answer_list,
-                    "correct_answers": [
-                        correct_answer["correct_answer"] for correct_answer in feedback
-                    ],
-                    "scores": [correct_answer["score"] for correct_answer in feedback],
-                    "feedback": [
-                        correct_answer["feedback"] for correct_answer in feedback
-                    ],
-                }
+                    "quizz_questions": [item["question"] for item in ok],
+                    "student_answers": [item["student_answer"] for item in ok],
+                    "correct_answers": [item["correct_answer"] for item in ok],
+                    "scores": [item["score"] for item in ok],
+                    "feedback": [item["feedback"] for item in ok],
+                },
             )
             return {"request_id": question_hash, "feedback": feedback}
 
@@ -148,28 +164,30 @@ def evaluate_answer(request: SingleEvaluationRequest):
 
 
 @app.get("/eval-service/get-feedback")
-def get_feedback(current_user: Annotated[User, Depends(get_current_active_user)]):
-    matching_keys: list[str] = []
-    cursor = 0  # Start with cursor 0
-
-    # Scan until the cursor returned by Redis is 0
-    while True:
-        cursor, keys = cast(
-            Tuple[int, List[str]],
-            redis_client.scan(
-                cursor=cursor, match=f"Eval:{current_user.username}:*", count=100
-            ),
-        )
-        logger.info(f"Matching keys: {matching_keys}")
-        matching_keys.extend(keys)
-        if cursor == 0:
-            break
-
-    # Retrieve all the values for the found keys
-    if matching_keys:
-        values = redis_client.mget(matching_keys)
-        logger.info(f"Values: {values}")
-        return values
+def get_feedback(
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    response: Response,
+    offset: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[int, Query(ge=1, le=500)] = 50,
+):
+    """
+    Newest-first page of the user's feedback: from the per-user Redis index
+    (no keyspace SCAN), or from Postgres when it is empty. Total and source
+    go in the X-Total-Count / X-History-Source headers.
+    """
+    page = None
+    try:
+        page = read_page(redis_client, "Eval", current_user.username, offset, limit)
+    except Exception as e:
+        logger.warning(f"History index read failed, using Postgres: {e}")
+    if page is None:
+        page = eval_history(current_user.username, offset, limit)
+    response.headers["X-Total-Count"] = str(page.total)
+    response.headers["X-History-Source"] = page.source
+
+    if page.items:
+        logger.info(f"Values: {page.items}")
+        return page.items
     else:
         return "No keys found for the pattern."
 
@@ -188,6 +206,55 @@ def get_job_status(
         return {"status": "done", "feedback": val}
 
 
+@app.get("/eval-service/jobs/{job_id}/events")
+async def stream_job_status(
+    job_id: str,
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    last_event_id: Annotated[Optional[str], Header()] = None,
+):
+    """
+    Server-Sent Events with the job status transitions (queued, processing,
+    done with the feedback, or failed); resumes from `Last-Event-ID`.
+    """
+    key = f"Eval:{current_user.username}:{job_id}"
+    return StreamingResponse(
+        sse_events(
+            async_redis_client,
+            key,
+            last_event_id or "0",
+            eval_settings.JOB_SSE_MAX_SECONDS,
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/eval-service/jobs/{job_id}/wait")
+async def wait_job_status(
+    job_id: str,
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    since: str = "0",
+    timeout: float = 25.0,
+):
+    """
+    Long-poll fallback: returns the first status after event `since` (the
+    current one when omitted) or 204 if none arrives within `timeout`.
+    """
+    key = f"Eval:{current_user.username}:{job_id}"
+    timeout = max(0.0, min(timeout, eval_settings.JOB_LONG_POLL_MAX_SECONDS))
+    try:
+        event = await wait_event(async_redis_client, key, since, timeout)
+    except Exception as e:
+        logger.error(f"Job wait failed: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Job wait failed: {str(e)}",
+        )
+    if event is None:
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+    return event
+
+
 # Protected endpoint to test authentication
 @app.get("/eval-service/me")
 async def get_my_info(current_user: Annotated[User, Depends(get_current_active_user)]):
@@ -1,16 +1,28 @@
-from typing import TYPE_CHECKING
+from typing import List, Tuple, TYPE_CHECKING
 from langchain_core.messages import AIMessage
 
 if TYPE_CHECKING:
-    from services.evaluation_service.eval_utils import format_evaluator_prompt, get_llm
+    from services.evaluation_service.eval_utils import (
+        format_batch_evaluator_prompt,
+        format_evaluator_prompt,
+        get_llm,
+    )
+    from services.evaluation_service.data_models import BatchGrades
 else:
     try:
         from services.evaluation_service.eval_utils import (
+            format_batch_evaluator_prompt,
             format_evaluator_prompt,
             get_llm,
         )
+        from services.evaluation_service.data_models import BatchGrades
     except Exception:
-        from .eval_utils import format_evaluator_prompt, get_llm
+        from .eval_utils import (
+            format_batch_evaluator_prompt,
+            format_evaluator_prompt,
+            get_llm,
+        )
+        from .data_models import BatchGrades
 from opik.integrations.langchain import OpikTracer
 
 opik_tracer = OpikTracer(
@@ -28,3 +40,17 @@ def eval_answer(question: str, answer: str) -> AIMessage:
         return llm.invoke(prompt, config={"callbacks": [opik_tracer]})
     except Exception as e:
         return e
+
+
+async def aeval_answer(question: str, answer: str) -> AIMessage:
+    # Ao contrário de eval_answer, propaga a exceção (tratada por pergunta)
+    llm = get_llm()
+    prompt = format_evaluator_prompt(question, answer)
+    return await llm.ainvoke(prompt, config={"callbacks": [opik_tracer]})
+
+
+async def aeval_answers_batch(pairs: List[Tuple[str, str]]) -> BatchGrades:
+    # Um só pedido (com structured output) para várias perguntas do quiz
+    llm = get_llm().with_structured_output(BatchGrades)
+    prompt = format_batch_evaluator_prompt(pairs)
+    return await llm.ainvoke(prompt, config={"callbacks": [opik_tracer]})
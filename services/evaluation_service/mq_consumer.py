@@ -4,10 +4,14 @@ import aio_pika
 from typing import Any, Dict, List
 from .logging_config import get_logger
 from .data_models import EvaluationJobMessage
-from .model import eval_answer
-from .persistence import store_evals
-from .cache import redis_client
+from .model import aeval_answer, aeval_answers_batch
+from .grading import grade_answers, graded
+from .persistence import store_evals_bulk
+from .cache import async_redis_client
+from .job_events import apublish_event
+from .history_index import arecord
 from .eval_settings import eval_settings
+from .mq_runtime import ConsumerRuntime, blocking_pool, loop_lag, run_blocking
 
 logger = get_logger(__name__)
 
@@ -17,6 +21,9 @@ ROUTING_KEY = eval_settings.model_dump().get(
 )
 PREFETCH = int(eval_settings.model_dump().get("RABBITMQ_PREFETCH", 16))
 RABBIT_URL = eval_settings.model_dump().get("RABBITMQ_URL")
+CONCURRENCY = eval_settings.RABBITMQ_CONSUMER_CONCURRENCY
+DRAIN_TIMEOUT = eval_settings.RABBITMQ_DRAIN_TIMEOUT_SECONDS
+blocking_pool.configure(eval_settings.BLOCKING_POOL_SIZE)
 
 QUEUE_NAME = "quiz.generate.q"
 DLX_NAME = "app.dlx"
@@ -26,34 +33,50 @@ DLQ_NAME = "quiz.generate.dlq"
 async def _handle_message(message: aio_pika.IncomingMessage) -> None:
     async with message.process(requeue=False):
         payload: Dict[str, Any] = json.loads(message.body)
-        msg = EvaluationJobMessage(**payload)
-        logger.info(f"Consuming job_id={msg.job_id} for user={msg.username}")
-
-        feedback: List[Dict[str, Any]] = []
-        for question, answer in zip(msg.quizz_questions, msg.student_answers or []):
-            result = json.loads(eval_answer(question, answer).content)
-            store_evals(
-                msg.username,
-                question,
-                answer,
-                result["correct_answer"],
-                result["score"],
-                result["feedback"],
-            )
-            feedback.append(
-                {
-                    "question": question,
-                    "student_answer": answer,
-                    "correct_answer": result["correct_answer"],
-                    "feedback": result["feedback"],
-                    "score": result["score"],
-                }
-            )
-
-        # Persist aggregated feedback in Redis under Eval:{username}:{job_id}
-        key = f"Eval:{msg.username}:{msg.job_id}"
-        redis_client.set(key, json.dumps(feedback))
-        logger.info(f"Stored feedback for job_id={msg.job_id} key={key}")
+        username, job_id = payload.get("username"), payload.get("job_id")
+        key = f"Eval:{username}:{job_id}" if username and job_id else None
+        try:
+            await _evaluate(payload)
+        except Exception as e:
+            # Evento terminal para os clientes SSE/long-poll; a mensagem
+            # continua a seguir para a DLQ
+            if key is not None:
+                await apublish_event(
+                    async_redis_client, key, {"status": "failed", "error": str(e)}
+                )
+            raise
+
+
+async def _evaluate(payload: Dict[str, Any]) -> None:
+    msg = EvaluationJobMessage(**payload)
+    logger.info(f"Consuming job_id={msg.job_id} for user={msg.username}")
+    key = f"Eval:{msg.username}:{msg.job_id}"
+    await apublish_event(async_redis_client, key, {"status": "processing"})
+
+    feedback: List[Dict[str, Any]] = await grade_answers(
+        msg.quizz_questions,
+        msg.student_answers or [],
+        aeval_answer,
+        aeval_answers_batch,
+        mode=msg.grading_mode,
+    )
+    ok = graded(feedback)
+    if feedback and not ok:
+        raise RuntimeError("no question could be graded")
+    stored = await run_blocking(store_evals_bulk, msg.username, ok)
+    for failure in stored.failures:
+        logger.error(
+            f"job_id={msg.job_id}: evaluation not saved "
+            f"({failure.question!r}): {failure.error}"
+        )
+
+    # Persist aggregated feedback in Redis under Eval:{username}:{job_id}
+    await async_redis_client.set(key, json.dumps(feedback))
+    await arecord(async_redis_client, "Eval", msg.username, key)
+    await apublish_event(
+        async_redis_client, key, {"status": "done", "feedback": feedback}
+    )
+    logger.info(f"Stored feedback for job_id={msg.job_id} key={key}")
 
 
 async def _declare_topology(channel: aio_pika.abc.AbstractChannel) -> None:
@@ -75,17 +98,21 @@ async def _declare_topology(channel: aio_pika.abc.AbstractChannel) -> None:
 
 async def run_consumer(stop_event: asyncio.Event) -> None:
     assert RABBIT_URL, "RABBITMQ_URL must be set"
-    connection = await aio_pika.connect_robust(RABBIT_URL)
-    async with connection:
-        channel = await connection.channel()
-        await channel.set_qos(prefetch_count=PREFETCH)
-        await _declare_topology(channel)
-        queue = await channel.get_queue(QUEUE_NAME, ensure=False)
-        async with queue.iterator() as queue_iter:
-            async for message in queue_iter:
-                if stop_event.is_set():
-                    break
-                await _handle_message(message)
+    loop_lag.start(threshold_ms=eval_settings.LOOP_LAG_WARN_MS)
+    try:
+        connection = await aio_pika.connect_robust(RABBIT_URL)
+        async with connection:
+            channel = await connection.channel()
+            await channel.set_qos(prefetch_count=PREFETCH)
+            await _declare_topology(channel)
+            queue = await channel.get_queue(QUEUE_NAME, ensure=False)
+            runtime = ConsumerRuntime(
+                QUEUE_NAME, _handle_message, CONCURRENCY, DRAIN_TIMEOUT
+            )
+            async with queue.iterator() as queue_iter:
+                await runtime.run(queue_iter, stop_event)
+    finally:
+        loop_lag.stop()
 
 
 def start_consumer_task() -> asyncio.Task:
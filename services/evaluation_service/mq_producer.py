@@ -1,7 +1,9 @@
 import asyncio
+import time
+from collections import deque
 import aio_pika
-from aio_pika.abc import AbstractRobustConnection, AbstractChannel
-from typing import Any, Dict, Optional
+from aio_pika.abc import AbstractRobustConnection, AbstractChannel, AbstractExchange
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
 from .eval_settings import eval_settings
 import json
 from .logging_config import get_logger
@@ -11,10 +13,11 @@ logger = get_logger(__name__)
 # Reutilização de ligação/canal + retry simples para reduzir falhas intermitentes
 _connection: Optional[AbstractRobustConnection] | None = None
 _channel: Optional[AbstractChannel] | None = None
+_exchange: Optional[AbstractExchange] = None
 
 
 async def _get_channel() -> AbstractChannel:
-    global _connection, _channel
+    global _connection, _channel, _exchange
     if _connection is None or _connection.is_closed:
         # Aumenta timeout para lidar com arranques / flutuações de rede
         _connection = await aio_pika.connect_robust(
@@ -24,43 +27,180 @@ async def _get_channel() -> AbstractChannel:
         )
     if _channel is None or _channel.is_closed:
         _channel = await _connection.channel(publisher_confirms=True)
+        _exchange = None
 
     assert _channel is not None
     return _channel
 
 
 async def _publish(payload: Dict[str, Any], routing_key: str) -> None:
+    global _exchange
     channel = await asyncio.wait_for(_get_channel(), timeout=3.0)
-    exchange = await channel.declare_exchange(
-        eval_settings.RABBITMQ_EXCHANGE,
-        aio_pika.ExchangeType.TOPIC,
-        durable=True,
-    )
+    if _exchange is None:
+        # Declarado uma vez por canal, não por mensagem
+        _exchange = await channel.declare_exchange(
+            eval_settings.RABBITMQ_EXCHANGE,
+            aio_pika.ExchangeType.TOPIC,
+            durable=True,
+        )
+    exchange = _exchange
     message = aio_pika.Message(
         body=json.dumps(payload).encode("utf-8"),
         content_type="application/json",
         delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
     )
-    await exchange.publish(message, routing_key=routing_key)
+    # Com publisher confirms, publish() só retorna depois do ack do broker
+    await exchange.publish(message, routing_key=routing_key, timeout=10)
     logger.info(f"Evaluation completed published: {payload}")
 
 
-async def _publish_with_retry(
-    payload: Dict[str, Any], routing_key: str, max_retries: int = 7
-) -> None:
-    for attempt in range(max_retries):
-        try:
-            await _publish(payload, routing_key)
-            return
-        except Exception as e:
+async def close_publisher() -> None:
+    global _connection, _channel, _exchange
+    if _connection is not None and not _connection.is_closed:
+        await _connection.close()
+    _connection = _channel = _exchange = None
+
+
+class OutboxStats:
+    def __init__(self) -> None:
+        self.enqueued = 0
+        self.published = 0
+        self.dropped = 0
+        self.failed_attempts = 0
+        self.lost_on_shutdown = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.latency_last = 0.0
+
+    def as_dict(self, backlog: int, max_size: int) -> Dict[str, Any]:
+        return {
+            "backlog": backlog,
+            "max_size": max_size,
+            "enqueued": self.enqueued,
+            "published": self.published,
+            "dropped": self.dropped,
+            "failed_attempts": self.failed_attempts,
+            "lost_on_shutdown": self.lost_on_shutdown,
+            # enqueue -> confirmação do broker
+            "avg_publish_latency_ms": (
+                round(self.latency_total / self.published * 1e3, 2)
+                if self.published
+                else 0.0
+            ),
+            "max_publish_latency_ms": round(self.latency_max * 1e3, 2),
+            "last_publish_latency_ms": round(self.latency_last * 1e3, 2),
+        }
+
+
+class EvaluationOutbox:
+    """
+    Bounded in-process outbox for evaluation events.
+
+    Request handlers call `enqueue()`, which never blocks or does I/O; a
+    background task started in the app lifespan publishes the events in
+    order on the persistent publisher connection, retrying with capped
+    exponential backoff until the broker confirms. When the outbox is full
+    new events are dropped (and counted) instead of failing the request.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1000,
+        publish: Callable[[Dict[str, Any], str], Awaitable[None]] = _publish,
+        max_backoff: float = 30.0,
+    ) -> None:
+        self.max_size = max_size
+        self.publish = publish
+        self.max_backoff = max_backoff
+        self.stats = OutboxStats()
+        self._items: Deque[Tuple[Dict[str, Any], str, float]] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    @property
+    def backlog(self) -> int:
+        return len(self._items)
+
+    def enqueue(
+        self, payload: Dict[str, Any], routing_key: str = "evaluation.completed"
+    ) -> bool:
+        if len(self._items) >= self.max_size:
+            self.stats.dropped += 1
             logger.error(
-                f"Evaluation completed publish failed (attempt {attempt + 1}/{max_retries}): {e}"
+                f"Evaluation outbox full ({self.max_size}); event dropped: "
+                f"{payload.get('assessment_id')}"
             )
-            if attempt == max_retries - 1:
-                raise
-            await asyncio.sleep(2**attempt)
-    raise Exception("Evaluation completed publish failed after all retries")
+            return False
+        self._items.append((payload, routing_key, time.perf_counter()))
+        self.stats.enqueued += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            if self._items:
+                self._wakeup.set()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        assert self._wakeup is not None
+        backoff = 0.5
+        while True:
+            if not self._items:
+                if self._stopping:
+                    return
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            payload, routing_key, enqueued_at = self._items[0]
+            try:
+                await self.publish(payload, routing_key)
+            except Exception as e:
+                self.stats.failed_attempts += 1
+                logger.error(
+                    f"Evaluation event publish failed (backlog {self.backlog}), "
+                    f"retrying in {backoff:.1f}s: {e}"
+                )
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+            self._items.popleft()
+            backoff = 0.5
+            latency = time.perf_counter() - enqueued_at
+            self.stats.published += 1
+            self.stats.latency_total += latency
+            self.stats.latency_last = latency
+            self.stats.latency_max = max(self.stats.latency_max, latency)
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Publish what is left (up to `timeout`), then close the connection."""
+        if self._task is not None:
+            self._stopping = True
+            if self._wakeup is not None:
+                self._wakeup.set()
+            try:
+                await asyncio.wait_for(self._task, timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                pass
+            self._task = None
+        if self._items:
+            self.stats.lost_on_shutdown += len(self._items)
+            logger.error(f"{len(self._items)} evaluation events not published")
+            self._items.clear()
+        try:
+            await close_publisher()
+        except Exception as e:
+            logger.warning(f"Error closing evaluation publisher: {e}")
+
+    def as_dict(self) -> Dict[str, Any]:
+        return self.stats.as_dict(self.backlog, self.max_size)
 
 
-def publish_evaluation_completed_sync(payload: Dict[str, Any]) -> None:
-    asyncio.run(_publish_with_retry(payload, "evaluation.completed"))
+evaluation_outbox = EvaluationOutbox(
+    max_size=eval_settings.EVAL_OUTBOX_MAX_SIZE,
+    max_backoff=eval_settings.EVAL_OUTBOX_MAX_BACKOFF_SECONDS,
+)
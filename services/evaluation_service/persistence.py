@@ -1,12 +1,31 @@
+import json
+import uuid
+from dataclasses import dataclass, field
 from datetime import datetime
-from sqlmodel import Session
+from typing import Any, Dict, List, Sequence, cast
+from sqlalchemy import String, cast as sql_cast
+from sqlmodel import Session, func, select
 from .logging_config import get_logger
 from .db import engine
 from .data_models import Evaluation
+from .history_index import HistoryPage
 
 logger = get_logger(__name__)
 
 
+@dataclass
+class RowFailure:
+    index: int
+    question: str
+    error: str
+
+
+@dataclass
+class BulkStoreResult:
+    saved: int = 0
+    failures: List[RowFailure] = field(default_factory=list)
+
+
 def store_evals(
     username: str,
     question: str,
@@ -33,3 +52,126 @@ def store_evals(
         except Exception as e:
             logger.exception("Error saving evaluation: %s", e)
             return f"Error saving evaluation: {e}"
+
+
+def _error(e: Exception) -> str:
+    return f"{type(e).__name__}: {e}"
+
+
+def _to_row(
+    username: str, item: Dict[str, Any], now: datetime, batch_id: str, position: int
+) -> Evaluation:
+    return Evaluation.model_validate(
+        {
+            "username": username,
+            "question": item["question"],
+            "answer": item["student_answer"],
+            "correct_answer": item["correct_answer"],
+            "score": item["score"],
+            "feedback": item["feedback"],
+            "date": now,
+            "batch_id": batch_id,
+            "position": position,
+        }
+    )
+
+
+def store_evals_bulk(username: str, items: Sequence[Dict[str, Any]]) -> BulkStoreResult:
+    """
+    Store the graded items of one quiz in a single transaction.
+
+    Items that cannot be turned into a row are reported and skipped; if the
+    bulk INSERT fails, the rows are retried one by one inside the same
+    transaction (SAVEPOINT per row) so only the offending rows are lost.
+    """
+    result = BulkStoreResult()
+    now = datetime.now()
+    batch_id = uuid.uuid4().hex
+    rows: List[tuple[int, Evaluation]] = []
+    for index, item in enumerate(items):
+        try:
+            rows.append((index, _to_row(username, item, now, batch_id, index)))
+        except Exception as e:
+            result.failures.append(
+                RowFailure(index, str(item.get("question", "")), _error(e))
+            )
+    if not rows:
+        return result
+
+    with Session(engine) as session:
+        try:
+            session.add_all([row for _, row in rows])
+            session.commit()
+            result.saved = len(rows)
+        except Exception as e:
+            logger.warning(f"Bulk insert of {len(rows)} evaluations failed: {e!r}")
+            session.rollback()
+            for index, row in rows:
+                try:
+                    with session.begin_nested():
+                        session.add(Evaluation.model_validate(row.model_dump()))
+                    result.saved += 1
+                except Exception as row_error:
+                    result.failures.append(
+                        RowFailure(index, row.question, _error(row_error))
+                    )
+            session.commit()
+    result.failures.sort(key=lambda failure: failure.index)
+    logger.info(
+        f"Evaluations saved for {username}: {result.saved}, "
+        f"failed: {len(result.failures)}"
+    )
+    return result
+
+
+def eval_history(username: str, offset: int, limit: int) -> HistoryPage:
+    """
+    Newest-first page of the user's graded quizzes from Postgres, rendered
+    like the `Eval:*` feedback values. The rows of one quiz share the
+    `batch_id` set by store_evals_bulk; older rows without one are listed as
+    a quiz each.
+    """
+    by_user = Evaluation.username == username
+    # Chave do quiz: batch_id, ou o próprio eval_id nas linhas antigas
+    quiz_key = func.coalesce(
+        cast(Any, Evaluation.batch_id), sql_cast(cast(Any, Evaluation.eval_id), String)
+    )
+    with Session(engine) as session:
+        total = session.exec(
+            select(func.count(func.distinct(quiz_key))).where(by_user)
+        ).one()
+        keys = session.exec(
+            select(quiz_key)
+            .where(by_user)
+            .group_by(quiz_key)
+            .order_by(func.max(Evaluation.date).desc())
+            .offset(offset)
+            .limit(limit)
+        ).all()
+        rows = (
+            session.exec(
+                select(Evaluation, quiz_key)
+                .where(by_user, quiz_key.in_(keys))
+                # Ordem de inserção dentro do quiz, como no valor `Eval:*`
+                .order_by(
+                    cast(Any, Evaluation.date),
+                    cast(Any, Evaluation.position),
+                    cast(Any, Evaluation.eval_id),
+                )
+            ).all()
+            if keys
+            else []
+        )
+    quizzes: Dict[str, List[Dict[str, Any]]] = {k: [] for k in keys}
+    for row, key in rows:
+        quizzes[key].append(
+            {
+                "question": row.question,
+                "student_answer": row.answer,
+                "correct_answer": row.correct_answer,
+                "feedback": row.feedback,
+                "score": row.score,
+            }
+        )
+    items = [json.dumps(quiz, sort_keys=True) for quiz in quizzes.values()]
+    return HistoryPage(items=items, total=total, source="postgres")
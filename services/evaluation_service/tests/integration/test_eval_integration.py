@@ -54,9 +54,9 @@ def client(tmp_path, monkeypatch):
         eval_main, "create_db_and_tables", _create_eval_tables_only, raising=True
     )
     monkeypatch.setattr(
-        eval_main,
-        "publish_evaluation_completed_sync",
-        lambda payload: None,
+        eval_main.evaluation_outbox,
+        "enqueue",
+        lambda payload: True,
         raising=True,
     )
 
@@ -80,6 +80,9 @@ def test_health_disabled_rabbitmq(client, monkeypatch):
 def test_evaluation_flow_with_stubbed_llm(client, monkeypatch):
     # Stub LLM to return a fixed evaluation JSON
     class _LLM:
+        async def ainvoke(self, prompt, config=None):
+            return self.invoke(prompt, config)
+
         def invoke(self, prompt, config=None):
             class _Msg:
                 content = json.dumps(
@@ -2,13 +2,34 @@ import json
 import pytest
 from fastapi.testclient import TestClient
 
+from services.evaluation_service import grading
 from services.evaluation_service import main as main_mod
 from services.evaluation_service.data_models import User
+from services.evaluation_service.grade_cache import GradeCache
+from services.evaluation_service.history_index import HistoryPage, record
+from services.evaluation_service.persistence import BulkStoreResult
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, name):
+        def _queue(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+
+        return _queue
+
+    def execute(self):
+        return [getattr(self.redis, n)(*a, **k) for n, a, k in self.calls]
 
 
 class FakeRedis:
     def __init__(self):
         self.store = {}
+        self.zsets = {}
 
     def get(self, key):
         return self.store.get(key)
@@ -16,18 +37,34 @@ class FakeRedis:
     def set(self, key, value):
         self.store[key] = value
 
-    def scan(self, cursor=0, match=None, count=10):
-        # retorna cursor=0 para parar o loop e todas as chaves que combinam
-        keys = [
-            k
-            for k in self.store.keys()
-            if (match is None or k.startswith(match.split("*")[0]))
-        ]
-        return 0, keys[:count]
-
     def mget(self, keys):
         return [self.store.get(k) for k in keys]
 
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    def zremrangebyrank(self, key, start, end):
+        return 0
+
+    def zcard(self, key):
+        return len(self.zsets.get(key, {}))
+
+    def zrevrange(self, key, start, end):
+        z = self.zsets.get(key, {})
+        return sorted(z, key=z.get, reverse=True)[start : end + 1]
+
+    def zrem(self, key, *members):
+        for m in members:
+            self.zsets.get(key, {}).pop(m, None)
+
+
+@pytest.fixture(autouse=True)
+def no_grade_cache(monkeypatch):
+    monkeypatch.setattr(grading, "grade_cache", GradeCache(None, enabled=False))
+
 
 @pytest.fixture(autouse=True)
 def client_with_user(monkeypatch):
@@ -92,24 +129,23 @@ def test_eval_service_success(client_with_user, monkeypatch):
 
     calls = {"saved": []}
 
-    def fake_store(username, q, a, correct, score, feedback):
-        calls["saved"].append((username, q, a, correct, score, feedback))
+    def fake_store(username, items):
+        calls["saved"].extend((username, item["question"]) for item in items)
+        return BulkStoreResult(saved=len(items))
 
-    monkeypatch.setattr(main_mod, "store_evals", fake_store)
-    monkeypatch.setattr(
-        main_mod, "publish_evaluation_completed_sync", lambda payload: None
-    )
+    monkeypatch.setattr(main_mod, "store_evals_bulk", fake_store)
+    monkeypatch.setattr(main_mod.evaluation_outbox, "enqueue", lambda payload: True)
 
     class AIMessage:
         def __init__(self, content):
             self.content = content
 
-    def fake_eval_answer(question, answer):
+    async def fake_eval_answer(question, answer):
         return AIMessage(
             json.dumps({"correct_answer": "X", "score": 0.9, "feedback": "ok"})
         )
 
-    monkeypatch.setattr(main_mod, "eval_answer", fake_eval_answer)
+    monkeypatch.setattr(main_mod, "aeval_answer", fake_eval_answer)
 
     body = {
         "student_id": "u",
@@ -132,10 +168,10 @@ def test_eval_service_error_500(client_with_user, monkeypatch):
     r = FakeRedis()
     monkeypatch.setattr(main_mod, "redis_client", r)
 
-    def boom(*a, **k):
+    async def boom(*a, **k):
         raise RuntimeError("llm fail")
 
-    monkeypatch.setattr(main_mod, "eval_answer", boom)
+    monkeypatch.setattr(main_mod, "aeval_answer", boom)
 
     body = {
         "student_id": "u",
@@ -149,6 +185,85 @@ def test_eval_service_error_500(client_with_user, monkeypatch):
     assert resp.status_code == 500
 
 
+def test_eval_service_partial_failure_keeps_order(client_with_user, monkeypatch):
+    r = FakeRedis()
+    monkeypatch.setattr(main_mod, "redis_client", r)
+    saved = []
+    published = []
+
+    def fake_store(username, items):
+        saved.extend(items)
+        return BulkStoreResult(saved=len(items))
+
+    monkeypatch.setattr(main_mod, "store_evals_bulk", fake_store)
+    monkeypatch.setattr(main_mod.evaluation_outbox, "enqueue", published.append)
+
+    class AIMessage:
+        def __init__(self, content):
+            self.content = content
+
+    async def fake_eval_answer(question, answer):
+        if question == "Q2":
+            return AIMessage("not json")
+        return AIMessage(
+            json.dumps({"correct_answer": question, "score": 1, "feedback": "ok"})
+        )
+
+    monkeypatch.setattr(main_mod, "aeval_answer", fake_eval_answer)
+
+    body = {
+        "student_id": "u",
+        "topic": "arithmetic",
+        "quizz_questions": ["Q1", "Q2", "Q3"],
+        "student_answers": ["a1", "a2", "a3"],
+    }
+    resp = client_with_user.post("/eval-service", json=body)
+    assert resp.status_code == 200
+    feedback = resp.json()["feedback"]
+    assert [f["question"] for f in feedback] == ["Q1", "Q2", "Q3"]
+    assert "error" in feedback[1] and feedback[1]["score"] is None
+    # só as perguntas avaliadas são gravadas e publicadas
+    assert [s["question"] for s in saved] == ["Q1", "Q3"]
+    assert published[0]["quizz_questions"] == ["Q1", "Q3"]
+    assert published[0]["scores"] == [1, 1]
+
+
+def test_eval_service_batch_mode(client_with_user, monkeypatch):
+    monkeypatch.setattr(main_mod, "redis_client", FakeRedis())
+    monkeypatch.setattr(
+        main_mod, "store_evals_bulk", lambda u, items: BulkStoreResult(len(items))
+    )
+    monkeypatch.setattr(main_mod.evaluation_outbox, "enqueue", lambda p: True)
+    batches = []
+
+    async def fake_batch(pairs):
+        batches.append(pairs)
+        return {
+            "grades": [
+                {"index": i, "correct_answer": "X", "feedback": "ok", "score": 0.5}
+                for i in range(len(pairs))
+            ]
+        }
+
+    async def no_single(question, answer):
+        raise AssertionError("per-question call not expected")
+
+    monkeypatch.setattr(main_mod, "aeval_answers_batch", fake_batch)
+    monkeypatch.setattr(main_mod, "aeval_answer", no_single)
+
+    body = {
+        "student_id": "u",
+        "topic": "arithmetic",
+        "quizz_questions": ["Q1", "Q2", "Q3"],
+        "student_answers": ["a1", "a2", "a3"],
+        "grading_mode": "batch",
+    }
+    resp = client_with_user.post("/eval-service", json=body)
+    assert resp.status_code == 200
+    assert [f["score"] for f in resp.json()["feedback"]] == [0.5, 0.5, 0.5]
+    assert batches == [[("Q1", "a1"), ("Q2", "a2"), ("Q3", "a3")]]
+
+
 def test_evaluate_answer_success(client_with_user, monkeypatch):
     class AIMessage:
         def __init__(self, content):
@@ -174,9 +289,10 @@ def test_evaluate_answer_error(client_with_user, monkeypatch):
 
 def test_get_feedback_with_results(client_with_user, monkeypatch):
     r = FakeRedis()
-    # Simula duas entradas
-    r.set("Eval:u:1", json.dumps({"score": 0.5}))
-    r.set("Eval:u:2", json.dumps({"score": 0.8}))
+    # Simula duas entradas (indexadas como no endpoint e no consumer)
+    for i, score in enumerate([0.5, 0.8]):
+        r.set(f"Eval:u:{i}", json.dumps({"score": score}))
+        record(r, "Eval", "u", f"Eval:u:{i}", created_at=i)
     monkeypatch.setattr(main_mod, "redis_client", r)
 
     resp = client_with_user.get(
@@ -191,6 +307,9 @@ def test_get_feedback_with_results(client_with_user, monkeypatch):
 def test_get_feedback_no_keys(client_with_user, monkeypatch):
     r = FakeRedis()
     monkeypatch.setattr(main_mod, "redis_client", r)
+    monkeypatch.setattr(
+        main_mod, "eval_history", lambda *a: HistoryPage([], 0, "postgres")
+    )
     resp = client_with_user.get(
         "/eval-service/get-feedback", headers={"Authorization": "Bearer t"}
     )
@@ -216,3 +335,9 @@ def test_jobs_processing_and_done(client_with_user, monkeypatch):
     )
     assert resp2.status_code == 200
     assert resp2.json()["status"] == "done"
+
+
+def test_grade_cache_cannot_be_wiped_over_http(client_with_user):
+    # A invalidação é só por CLI (python -m services.evaluation_service.grade_cache)
+    resp = client_with_user.delete("/eval-service/grade-cache?all_versions=true")
+    assert resp.status_code in (404, 405)
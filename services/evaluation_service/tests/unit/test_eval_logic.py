@@ -1,5 +1,10 @@
 from unittest.mock import patch, MagicMock
-from services.evaluation_service.eval_utils import format_evaluator_prompt, get_llm
+from services.evaluation_service.eval_utils import (
+    format_batch_evaluator_prompt,
+    format_evaluator_prompt,
+    get_llm,
+)
+from services.evaluation_service.llm_registry import LLMClientRegistry
 from services.evaluation_service.model import eval_answer
 from langchain_core.messages.ai import AIMessage
 from unittest.mock import ANY
@@ -33,26 +38,34 @@ def test_format_evaluator_prompt_empty_inputs():
     assert "Student Response: " in prompt
 
 
+def test_format_batch_evaluator_prompt_numbers_items():
+    prompt = format_batch_evaluator_prompt([("What is 2+2?", "4"), ("3*3?", "9")])
+    assert "0. Question: What is 2+2?" in prompt
+    assert "1. Question: 3*3?" in prompt
+    assert "Student Response: 9" in prompt
+
+
 # --- Test for LLM Instantiation ---
 
 
-@patch("services.evaluation_service.eval_utils.ChatOpenAI")
-def test_get_llm(MockChatOpenAI):
+def test_get_llm():
     """
-    Tests if the get_llm function initializes the ChatOpenAI client
-    with the correct model and temperature.
+    Tests if get_llm builds the ChatOpenAI client once, with the correct
+    model and temperature and the pooled HTTP clients, and then reuses it.
     """
-    # Configure the mock to return a specific object
-    mock_instance = MockChatOpenAI.return_value
-
-    # Call the function that should instantiate the client
-    llm = get_llm(model_name="test-gpt-model", temperature=0.5)
-
-    # Assert if ChatOpenAI class was called once with the expected arguments
-    MockChatOpenAI.assert_called_once_with(model="test-gpt-model", temperature=0.5)
-
-    # Assert that the function returned the created instance
-    assert llm is mock_instance
+    MockChatOpenAI = MagicMock()
+    registry = LLMClientRegistry(factory=MockChatOpenAI)
+
+    with patch("services.evaluation_service.eval_utils.llm_registry", registry):
+        llm = get_llm(model_name="test-gpt-model", temperature=0.5)
+        again = get_llm(model_name="test-gpt-model", temperature=0.5)
+
+    MockChatOpenAI.assert_called_once()
+    kwargs = MockChatOpenAI.call_args.kwargs
+    assert kwargs["model"] == "test-gpt-model"
+    assert kwargs["temperature"] == 0.5
+    assert kwargs["http_client"] is registry.pool("test-gpt-model").client
+    assert llm is again is MockChatOpenAI.return_value
 
 
 # --- Tests for the Main Evaluation Logic ---
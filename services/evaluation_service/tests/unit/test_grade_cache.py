@@ -0,0 +1,135 @@
+import asyncio
+
+from services.evaluation_service import grading
+from services.evaluation_service.grade_cache import GradeCache, normalize
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    def set(self, key, value, ex=None):
+        self.ops.append((key, value, ex))
+
+    async def execute(self):
+        for key, value, ex in self.ops:
+            await self.redis.set(key, value, ex=ex)
+
+
+class FakeAsyncRedis:
+    def __init__(self):
+        self.store = {}
+        self.ttls = {}
+
+    async def mget(self, keys):
+        return [self.store.get(k) for k in keys]
+
+    async def set(self, key, value, ex=None):
+        self.store[key] = value
+        self.ttls[key] = ex
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def scan_iter(self, match=None, count=None):
+        prefix = (match or "").split("*")[0]
+        for key in list(self.store):
+            if key.startswith(prefix):
+                yield key
+
+    async def delete(self, *keys):
+        return sum(self.store.pop(k, None) is not None for k in keys)
+
+
+def _counting_grader(calls):
+    async def grade(question, answer):
+        calls.append(question)
+        return {"correct_answer": "9π", "feedback": "f", "score": 1.0}
+
+    return grade
+
+
+async def _no_batch(pairs):
+    raise AssertionError("batch call not expected")
+
+
+def test_normalize_collapses_whitespace_and_unicode():
+    assert normalize("  9π \n") == "9π"
+    assert normalize("ﬁnd  the\tarea") == "find the area"
+
+
+def test_key_depends_on_prompt_model_and_version():
+    base = GradeCache(None, model="m", prompt_version="p1")
+    assert base.key("Q", " 9π") == base.key("Q ", "9π")
+    assert base.key("Q", "9π") != base.key("Q", "9")
+    assert base.key("Q", "a") != GradeCache(None, model="m", prompt_version="p2").key(
+        "Q", "a"
+    )
+    assert base.key("Q", "a") != GradeCache(None, model="m2", prompt_version="p1").key(
+        "Q", "a"
+    )
+    assert base.key("Q", "a") != GradeCache(
+        None, model="m", prompt_version="p1", version="2"
+    ).key("Q", "a")
+
+
+def test_grade_answers_only_sends_misses_to_llm(monkeypatch):
+    redis = FakeAsyncRedis()
+    cache = GradeCache(redis, model="m", prompt_version="p", ttl_seconds=60)
+    monkeypatch.setattr(grading, "grade_cache", cache)
+    calls = []
+    grade = _counting_grader(calls)
+
+    first = asyncio.run(
+        grading.grade_answers(["Q1", "Q2"], ["9π", "x"], grade, _no_batch)
+    )
+    second = asyncio.run(
+        grading.grade_answers(["Q0", "Q1", "Q2"], ["y", " 9π", "x"], grade, _no_batch)
+    )
+
+    assert sorted(calls) == ["Q0", "Q1", "Q2"]
+    assert [item["question"] for item in second] == ["Q0", "Q1", "Q2"]
+    assert second[1]["student_answer"] == " 9π"
+    assert second[1]["score"] == first[0]["score"] == 1.0
+    assert cache.stats.hits == 2 and cache.stats.misses == 3
+    assert set(redis.ttls.values()) == {60}
+
+
+def test_failed_grades_are_not_cached(monkeypatch):
+    cache = GradeCache(FakeAsyncRedis(), model="m", prompt_version="p")
+    monkeypatch.setattr(grading, "grade_cache", cache)
+
+    async def boom(question, answer):
+        raise RuntimeError("llm down")
+
+    items = asyncio.run(grading.grade_answers(["Q"], ["a"], boom, _no_batch))
+
+    assert items[0]["error"] == "llm down"
+    assert cache.stats.stores == 0
+
+
+def test_invalidate_drops_other_prompt_versions():
+    redis = FakeAsyncRedis()
+    old = GradeCache(redis, model="m", prompt_version="old")
+    new = GradeCache(redis, model="m", prompt_version="new")
+    item = {"correct_answer": "x", "feedback": "", "score": 1}
+    asyncio.run(old.set_many([{"question": "Q", "student_answer": "a", **item}]))
+    asyncio.run(new.set_many([{"question": "Q", "student_answer": "a", **item}]))
+    redis.store["other:key"] = "kept"
+
+    assert asyncio.run(new.invalidate()) == 1
+    assert asyncio.run(new.get_many([("Q", "a")]))[0]["score"] == 1
+    assert asyncio.run(new.invalidate(all_versions=True)) == 1
+    assert list(redis.store) == ["other:key"]
+
+
+def test_cache_errors_fall_back_to_misses():
+    class Broken:
+        async def mget(self, keys):
+            raise ConnectionError("down")
+
+    cache = GradeCache(Broken(), model="m", prompt_version="p")
+
+    assert asyncio.run(cache.get_many([("Q", "a")])) == [None]
+    assert cache.stats.errors == 1
@@ -0,0 +1,125 @@
+import asyncio
+
+from services.evaluation_service import grading
+from services.evaluation_service.data_models import BatchGrades, GradeItem
+from services.evaluation_service.eval_settings import eval_settings
+from services.evaluation_service.grade_cache import GradeCache
+
+
+class Msg:
+    def __init__(self, content):
+        self.content = content
+
+
+def _grade_after(delays, state):
+    async def grade(question, answer):
+        state["in_flight"] += 1
+        state["peak"] = max(state["peak"], state["in_flight"])
+        await asyncio.sleep(delays.get(question, 0.01))
+        state["in_flight"] -= 1
+        if question == "boom":
+            raise RuntimeError("llm down")
+        return Msg(f'{{"correct_answer": "{question}", "feedback": "f", "score": 0.5}}')
+
+    return grade
+
+
+def test_grade_quiz_is_concurrent_bounded_and_ordered(monkeypatch):
+    monkeypatch.setattr(eval_settings, "EVAL_MAX_CONCURRENCY", 3)
+    state = {"in_flight": 0, "peak": 0}
+    questions = [f"Q{i}" for i in range(8)]
+    # a primeira pergunta é a mais lenta: a ordem não pode depender da conclusão
+    grade = _grade_after({"Q0": 0.05}, state)
+
+    items = asyncio.run(grading.grade_quiz(questions, ["a"] * 8, grade))
+
+    assert [item["correct_answer"] for item in items] == questions
+    assert state["peak"] == 3
+
+
+def test_grade_quiz_isolates_failures_and_timeouts(monkeypatch):
+    monkeypatch.setattr(eval_settings, "EVAL_GRADE_TIMEOUT_SECONDS", 0.05)
+    state = {"in_flight": 0, "peak": 0}
+    grade = _grade_after({"slow": 1.0}, state)
+
+    items = asyncio.run(grading.grade_quiz(["ok", "boom", "slow"], ["a"] * 3, grade))
+
+    assert items[0]["score"] == 0.5 and "error" not in items[0]
+    assert items[1]["error"] == "llm down"
+    assert items[2]["error"] == "TimeoutError"
+    assert grading.graded(items) == [items[0]]
+
+
+def _batch_grader(calls, reply=None):
+    async def grade_batch(pairs):
+        calls.append([q for q, _ in pairs])
+        if reply is not None:
+            return reply
+        return BatchGrades(
+            grades=[
+                GradeItem(index=i, correct_answer=q, feedback="f", score=1.0)
+                for i, (q, _) in reversed(list(enumerate(pairs)))
+            ]
+        )
+
+    return grade_batch
+
+
+def test_batch_mode_grades_groups_in_one_call_each():
+    calls = []
+    state = {"in_flight": 0, "peak": 0}
+    questions = [f"Q{i}" for i in range(5)]
+
+    items = asyncio.run(
+        grading.grade_quiz_batched(
+            questions, ["a"] * 5, _batch_grader(calls), _grade_after({}, state), 2
+        )
+    )
+
+    # grades vêm fora de ordem na resposta; o index repõe a ordem do quiz
+    assert [item["correct_answer"] for item in items] == questions
+    assert sorted(calls) == [["Q0", "Q1"], ["Q2", "Q3"], ["Q4"]]
+    assert state["peak"] == 0
+
+
+def test_batch_mode_falls_back_per_question_on_bad_reply():
+    calls = []
+    state = {"in_flight": 0, "peak": 0}
+    # só uma nota para duas perguntas
+    reply = {
+        "grades": [{"index": 0, "correct_answer": "x", "feedback": "", "score": 1}]
+    }
+
+    items = asyncio.run(
+        grading.grade_quiz_batched(
+            ["Q0", "Q1"],
+            ["a", "b"],
+            _batch_grader(calls, reply),
+            _grade_after({}, state),
+        )
+    )
+
+    assert calls == [["Q0", "Q1"]]
+    assert [item["correct_answer"] for item in items] == ["Q0", "Q1"]
+    assert state["peak"] >= 1
+
+
+def test_grade_answers_dispatches_on_mode(monkeypatch):
+    monkeypatch.setattr(grading, "grade_cache", GradeCache(None, enabled=False))
+    calls = []
+    state = {"in_flight": 0, "peak": 0}
+    monkeypatch.setattr(eval_settings, "EVAL_GRADING_MODE", "per_question")
+
+    asyncio.run(
+        grading.grade_answers(
+            ["Q0"], ["a"], _grade_after({}, state), _batch_grader(calls)
+        )
+    )
+    assert calls == []
+
+    asyncio.run(
+        grading.grade_answers(
+            ["Q0"], ["a"], _grade_after({}, state), _batch_grader(calls), "batch"
+        )
+    )
+    assert calls == [["Q0"]]
@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from services.evaluation_service import mq_consumer
+
+
+class _ProcessContext:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+class FakeMessage:
+    def __init__(self, payload):
+        self.body = json.dumps(payload).encode("utf-8")
+
+    def process(self, requeue=False):
+        return _ProcessContext()
+
+
+@pytest.fixture
+def events(monkeypatch):
+    published = []
+
+    async def _publish(client, key, event):
+        published.append((key, event))
+
+    monkeypatch.setattr(mq_consumer, "apublish_event", _publish)
+    return published
+
+
+@pytest.mark.asyncio
+async def test_invalid_job_publishes_failed_and_reraises(events):
+    # Sem quizz_questions: a validação falha antes de qualquer avaliação
+    message = FakeMessage({"job_id": "j1", "username": "u"})
+
+    with pytest.raises(Exception):
+        await mq_consumer._handle_message(message)
+
+    assert [(k, e["status"]) for k, e in events] == [("Eval:u:j1", "failed")]
+
+
+@pytest.mark.asyncio
+async def test_storage_error_publishes_failed_after_processing(events, monkeypatch):
+    async def _grade(questions, answers, *args, **kwargs):
+        return [{"question": q, "score": 1.0} for q in questions]
+
+    def _store(*args):
+        raise RuntimeError("db down")
+
+    monkeypatch.setattr(mq_consumer, "grade_answers", _grade)
+    monkeypatch.setattr(mq_consumer, "graded", lambda feedback: feedback)
+    monkeypatch.setattr(mq_consumer, "store_evals_bulk", _store)
+    message = FakeMessage(
+        {
+            "job_id": "j2",
+            "username": "u",
+            "student_id": "s",
+            "quizz_questions": ["Q1"],
+            "student_answers": ["A1"],
+            "created_at": "2024-01-01T00:00:00",
+        }
+    )
+
+    with pytest.raises(RuntimeError, match="db down"):
+        await mq_consumer._handle_message(message)
+
+    assert [e for _, e in events] == [
+        {"status": "processing"},
+        {"status": "failed", "error": "db down"},
+    ]
@@ -0,0 +1,176 @@
+import asyncio
+import threading
+import time
+
+from services.evaluation_service import mq_runtime
+from services.evaluation_service.mq_runtime import ConsumerRuntime
+
+
+class FakeIncoming:
+    def __init__(self, tag, settled):
+        self.delivery_tag = tag
+        self.body = str(tag).encode()
+        self.settled = settled
+
+    async def ack(self, multiple=False):
+        self.settled.append(("ack", self.delivery_tag))
+
+    async def reject(self, requeue=False):
+        self.settled.append(("reject", self.delivery_tag))
+
+    async def nack(self, multiple=False, requeue=True):
+        self.settled.append(("requeue", self.delivery_tag))
+
+
+async def _iterate(messages, stop_event=None):
+    for message in messages:
+        yield message
+    if stop_event is not None:
+        # fila vazia: o consumidor fica à espera até ao stop
+        stop_event.set()
+        await asyncio.sleep(3600)
+
+
+def _messages(n, settled):
+    return [FakeIncoming(tag, settled) for tag in range(1, n + 1)]
+
+
+def test_runtime_is_concurrent_bounded_and_acks_in_order():
+    settled = []
+    state = {"in_flight": 0, "peak": 0}
+
+    async def handler(message):
+        async with message.process(requeue=False):
+            state["in_flight"] += 1
+            state["peak"] = max(state["peak"], state["in_flight"])
+            # as primeiras mensagens são as mais lentas
+            await asyncio.sleep(0.05 / message.delivery_tag)
+            state["in_flight"] -= 1
+
+    async def main():
+        runtime = ConsumerRuntime("q.test", handler, concurrency=3)
+        await runtime.run(_iterate(_messages(7, settled)), asyncio.Event())
+        return runtime
+
+    runtime = asyncio.run(main())
+
+    assert state["peak"] == 3
+    assert settled == [("ack", tag) for tag in range(1, 8)]
+    stats = mq_runtime.stats_as_dict()["q.test"]
+    assert stats["acked"] == 7 and stats["in_flight"] == 0
+    assert runtime.stats.peak_in_flight == 3
+
+
+def test_runtime_rejects_failed_messages_and_keeps_consuming():
+    settled = []
+
+    async def handler(message):
+        async with message.process(requeue=False):
+            if message.delivery_tag == 2:
+                raise ValueError("bad payload")
+
+    async def main():
+        runtime = ConsumerRuntime("q.errors", handler, concurrency=4)
+        await runtime.run(_iterate(_messages(3, settled)), asyncio.Event())
+        return runtime
+
+    runtime = asyncio.run(main())
+
+    assert settled == [("ack", 1), ("reject", 2), ("ack", 3)]
+    assert runtime.stats.handler_errors == 1
+
+
+def test_runtime_drains_on_stop_and_requeues_unfinished():
+    settled = []
+
+    async def handler(message):
+        await asyncio.sleep(0.01 if message.delivery_tag == 1 else 10)
+
+    async def main():
+        stop_event = asyncio.Event()
+        runtime = ConsumerRuntime("q.drain", handler, concurrency=4, drain_timeout=0.1)
+        await asyncio.wait_for(
+            runtime.run(_iterate(_messages(2, settled), stop_event), stop_event), 2
+        )
+
+    asyncio.run(main())
+
+    assert settled == [("ack", 1), ("requeue", 2)]
+
+
+def test_drain_requeues_unfinished_process_blocks_despite_requeue_false():
+    settled = []
+
+    async def handler(message):
+        async with message.process(requeue=False):
+            await asyncio.sleep(0.01 if message.delivery_tag == 1 else 10)
+
+    async def main():
+        stop_event = asyncio.Event()
+        runtime = ConsumerRuntime("q.drain2", handler, concurrency=4, drain_timeout=0.1)
+        await asyncio.wait_for(
+            runtime.run(_iterate(_messages(2, settled), stop_event), stop_event), 2
+        )
+
+    asyncio.run(main())
+
+    assert settled == [("ack", 1), ("requeue", 2)]
+
+
+def test_stop_consumer_task_waits_for_drain():
+    async def main():
+        stop_event = asyncio.Event()
+        finished = []
+
+        async def consumer():
+            await stop_event.wait()
+            await asyncio.sleep(0.01)
+            finished.append(True)
+
+        task = asyncio.create_task(consumer())
+        task.stop_event = stop_event
+        await mq_runtime.stop_consumer_task(task, timeout=1)
+        return finished
+
+    assert asyncio.run(main()) == [True]
+
+
+def test_run_blocking_uses_bounded_pool_off_the_loop():
+    pool = mq_runtime.BlockingPool(max_workers=2)
+    state = {"in_flight": 0, "peak": 0, "threads": set()}
+    lock = threading.Lock()
+
+    def work(x):
+        with lock:
+            state["in_flight"] += 1
+            state["peak"] = max(state["peak"], state["in_flight"])
+            state["threads"].add(threading.current_thread().name)
+        time.sleep(0.02)
+        with lock:
+            state["in_flight"] -= 1
+        return x * 2
+
+    async def main():
+        return await asyncio.gather(*(pool.run(work, i) for i in range(6)))
+
+    assert asyncio.run(main()) == [0, 2, 4, 6, 8, 10]
+    assert state["peak"] == 2
+    assert all(name.startswith("blocking") for name in state["threads"])
+    assert pool.as_dict()["calls"] == 6
+
+
+def test_loop_lag_monitor_reports_blocked_loop():
+    monitor = mq_runtime.LoopLagMonitor(interval=0.01, threshold_ms=30)
+
+    async def main():
+        monitor.start()
+        await asyncio.sleep(0.03)
+        time.sleep(0.08)  # bloqueia o event loop
+        await asyncio.sleep(0.03)
+        monitor.stop()
+
+    asyncio.run(main())
+
+    stats = monitor.as_dict()
+    assert stats["blocked"] >= 1
+    assert stats["max_lag_ms"] >= 50
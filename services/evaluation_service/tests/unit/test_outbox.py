@@ -0,0 +1,90 @@
+import asyncio
+
+from services.evaluation_service import mq_producer
+from services.evaluation_service.mq_producer import EvaluationOutbox
+
+
+def _recorder(published, failures=0):
+    state = {"failures": failures}
+
+    async def publish(payload, routing_key):
+        if state["failures"]:
+            state["failures"] -= 1
+            raise ConnectionError("broker down")
+        published.append((routing_key, payload["n"]))
+
+    return publish
+
+
+async def _no_close():
+    pass
+
+
+def test_outbox_publishes_in_order_in_background(monkeypatch):
+    monkeypatch.setattr(mq_producer, "close_publisher", _no_close)
+    published = []
+    outbox = EvaluationOutbox(max_size=10, publish=_recorder(published))
+
+    async def main():
+        outbox.start()
+        for n in range(3):
+            assert outbox.enqueue({"n": n}) is True
+        await outbox.stop(timeout=1)
+
+    asyncio.run(main())
+
+    assert published == [("evaluation.completed", n) for n in range(3)]
+    stats = outbox.as_dict()
+    assert stats["published"] == 3 and stats["backlog"] == 0
+
+
+def test_outbox_retries_until_confirmed(monkeypatch):
+    monkeypatch.setattr(mq_producer, "close_publisher", _no_close)
+    monkeypatch.setattr(mq_producer.asyncio, "sleep", _instant_sleep)
+    published = []
+    outbox = EvaluationOutbox(publish=_recorder(published, failures=2))
+
+    async def main():
+        outbox.start()
+        outbox.enqueue({"n": 1})
+        outbox.enqueue({"n": 2})
+        await outbox.stop(timeout=1)
+
+    asyncio.run(main())
+
+    assert [n for _, n in published] == [1, 2]
+    assert outbox.stats.failed_attempts == 2
+
+
+def test_outbox_is_bounded_and_counts_drops():
+    outbox = EvaluationOutbox(max_size=2, publish=_recorder([]))
+
+    assert outbox.enqueue({"n": 1}) and outbox.enqueue({"n": 2})
+    assert outbox.enqueue({"n": 3}) is False
+    assert outbox.as_dict()["dropped"] == 1
+    assert outbox.backlog == 2
+
+
+def test_outbox_stop_reports_unpublished_events(monkeypatch):
+    monkeypatch.setattr(mq_producer, "close_publisher", _no_close)
+
+    async def never(payload, routing_key):
+        await asyncio.sleep(10)
+
+    outbox = EvaluationOutbox(publish=never)
+
+    async def main():
+        outbox.start()
+        outbox.enqueue({"n": 1})
+        await outbox.stop(timeout=0.05)
+
+    asyncio.run(main())
+
+    assert outbox.stats.lost_on_shutdown == 1 and outbox.backlog == 0
+
+
+_real_sleep = asyncio.sleep
+
+
+async def _instant_sleep(delay):
+    await _real_sleep(0)
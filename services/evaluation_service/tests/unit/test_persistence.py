@@ -0,0 +1,129 @@
+import json
+import pytest
+from sqlalchemy import text
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from services.evaluation_service import persistence
+from services.evaluation_service.data_models import Evaluation
+
+
+def _item(question, **overrides):
+    item = {
+        "question": question,
+        "student_answer": "a",
+        "correct_answer": "c",
+        "score": 1.0,
+        "feedback": "ok",
+    }
+    item.update(overrides)
+    return item
+
+
+@pytest.fixture()
+def engine(monkeypatch):
+    engine = create_engine("sqlite://", echo=False)
+    # Só a tabela deste serviço: o ARRAY do learning_assessment não existe em SQLite
+    SQLModel.metadata.create_all(engine, tables=[Evaluation.__table__])
+    monkeypatch.setattr(persistence, "engine", engine)
+    return engine
+
+
+def _questions(engine):
+    with Session(engine) as session:
+        return sorted(e.question for e in session.exec(select(Evaluation)).all())
+
+
+def test_store_evals_bulk_saves_all_rows(engine):
+    result = persistence.store_evals_bulk("u", [_item("Q1"), _item("Q2")])
+
+    assert result.saved == 2 and result.failures == []
+    assert _questions(engine) == ["Q1", "Q2"]
+
+
+def test_store_evals_bulk_reports_invalid_items(engine):
+    items = [_item("Q1"), _item("Q2", score=None), {"question": "Q3"}]
+
+    result = persistence.store_evals_bulk("u", items)
+
+    assert result.saved == 1
+    assert [f.index for f in result.failures] == [1, 2]
+    assert result.failures[1].error.startswith("KeyError")
+    assert _questions(engine) == ["Q1"]
+
+
+def test_store_evals_bulk_isolates_rows_rejected_by_the_db(engine):
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "CREATE TRIGGER reject_bad BEFORE INSERT ON evaluation "
+                "WHEN NEW.question = 'bad' BEGIN SELECT RAISE(ABORT, 'bad row'); END"
+            )
+        )
+
+    result = persistence.store_evals_bulk("u", [_item("Q1"), _item("bad"), _item("Q3")])
+
+    assert result.saved == 2
+    assert [(f.index, f.question) for f in result.failures] == [(1, "bad")]
+    assert _questions(engine) == ["Q1", "Q3"]
+
+
+def test_eval_history_groups_quizzes_newest_first(engine):
+    persistence.store_evals_bulk("u", [_item("A1"), _item("A2")])
+    persistence.store_evals_bulk("u", [_item("B1", score=0.5)])
+    persistence.store_evals_bulk("other", [_item("X1")])
+
+    page = persistence.eval_history("u", 0, 1)
+
+    assert page.total == 2 and page.source == "postgres"
+    assert [q["question"] for q in json.loads(page.items[0])] == ["B1"]
+    older = persistence.eval_history("u", 1, 10)
+    assert sorted(q["question"] for q in json.loads(older.items[0])) == ["A1", "A2"]
+
+
+def test_eval_history_groups_by_batch_not_by_timestamp(engine, monkeypatch):
+    # Duas gravações no mesmo instante continuam a ser dois quizzes
+    frozen = persistence.datetime(2024, 1, 1)
+    monkeypatch.setattr(
+        persistence, "datetime", type("D", (), {"now": staticmethod(lambda: frozen)})
+    )
+    persistence.store_evals_bulk("u", [_item(f"A{i}") for i in range(1, 6)])
+    persistence.store_evals_bulk("u", [_item("B1")])
+    # Quiz gravado fora de ordem no disco: a posição é que conta
+    with Session(engine) as session:
+        for position in (2, 0, 1):
+            row = persistence._to_row("u", _item(f"C{position}"), frozen, "c", position)
+            session.add(row)
+            session.commit()
+    # Linhas antigas (sem batch_id) com a mesma data são uma entrada cada
+    persistence.store_evals("u", "L1", "a", "c", 1.0, "ok")
+    persistence.store_evals("u", "L2", "a", "c", 1.0, "ok")
+
+    page = persistence.eval_history("u", 0, 10)
+
+    assert page.total == 5
+    # Cada quiz mantém a ordem das perguntas
+    quizzes = sorted([q["question"] for q in json.loads(i)] for i in page.items)
+    assert quizzes == [
+        ["A1", "A2", "A3", "A4", "A5"],
+        ["B1"],
+        ["C0", "C1", "C2"],
+        ["L1"],
+        ["L2"],
+    ]
+
+
+def test_existing_evaluation_table_gets_batch_id_column(monkeypatch):
+    from sqlalchemy import inspect
+
+    from services.evaluation_service import db
+
+    legacy = create_engine("sqlite://", echo=False)
+    with legacy.begin() as conn:
+        conn.execute(text("CREATE TABLE evaluation (eval_id CHAR(32) PRIMARY KEY)"))
+    monkeypatch.setattr(db, "engine", legacy)
+
+    db._add_missing_columns()
+    db._add_missing_columns()
+
+    columns = {c["name"] for c in inspect(legacy).get_columns("evaluation")}
+    assert {"batch_id", "position"} <= columns
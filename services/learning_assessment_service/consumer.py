@@ -13,6 +13,7 @@ from fastapi import HTTPException
 from datetime import datetime, timedelta
 from sqlmodel import Session, select
 from .db import engine
+from .mq_runtime import ConsumerRuntime, blocking_pool, loop_lag, run_blocking
 
 logger = get_logger(__name__)
 
@@ -22,6 +23,9 @@ ROUTING_KEY = la_settings.model_dump().get(
 )
 PREFETCH = int(la_settings.model_dump().get("RABBITMQ_PREFETCH", 16))
 RABBIT_URL = la_settings.model_dump().get("RABBITMQ_URL")
+CONCURRENCY = la_settings.RABBITMQ_CONSUMER_CONCURRENCY
+DRAIN_TIMEOUT = la_settings.RABBITMQ_DRAIN_TIMEOUT_SECONDS
+blocking_pool.configure(la_settings.BLOCKING_POOL_SIZE)
 
 QUEUE_NAME = "evaluation.completed.q"
 DLX_NAME = "app.dlx"
@@ -131,6 +135,42 @@ async def _publish_scheduled_follow_up_quiz(
         )
 
 
+def _store_schedule(
+    msg: LearningAssessmentRequest,
+    schedule: list[tuple[str, datetime]],
+    score: float,
+    mastery_band: str,
+    now: datetime,
+) -> None:
+    with Session(engine) as session:
+        attempts = len(
+            session.exec(
+                select(MasteryStore).where(
+                    MasteryStore.username == msg.username,
+                    MasteryStore.topic == msg.topic,
+                    MasteryStore.action_type == ACTION_TYPE_FOLLOW_UP_QUIZ,
+                )
+            ).all()
+        )
+        for action_type, due_at in schedule:
+            mastery = MasteryStore(
+                username=msg.username,
+                topic=msg.topic,
+                score=score,
+                attempts=attempts + 1,
+                rolling_avg=score / (attempts + 1),
+                last_quiz_id=msg.assessment_id,
+                updated_at=now,
+                mastery_band=mastery_band,
+                created_at=now,
+                status="pending",
+                action_type=action_type,
+                due_at=due_at,
+            )
+            session.add(mastery)
+        session.commit()
+
+
 async def _handle_message(message: aio_pika.IncomingMessage) -> None:
     async with message.process(requeue=False):
         payload: Dict[str, Any] = json.loads(message.body)
@@ -140,33 +180,8 @@ async def _handle_message(message: aio_pika.IncomingMessage) -> None:
         mastery_band = "low" if score < 0.6 else "medium" if score < 0.8 else "high"
         schedule = _build_fixed_schedule(now)
         try:
-            with Session(engine) as session:
-                attempts = len(
-                    session.exec(
-                        select(MasteryStore).where(
-                            MasteryStore.username == msg.username,
-                            MasteryStore.topic == msg.topic,
-                            MasteryStore.action_type == ACTION_TYPE_FOLLOW_UP_QUIZ,
-                        )
-                    ).all()
-                )
-                for action_type, due_at in schedule:
-                    mastery = MasteryStore(
-                        username=msg.username,
-                        topic=msg.topic,
-                        score=score,
-                        attempts=attempts + 1,
-                        rolling_avg=score / (attempts + 1),
-                        last_quiz_id=msg.assessment_id,
-                        updated_at=now,
-                        mastery_band=mastery_band,
-                        created_at=now,
-                        status="pending",
-                        action_type=action_type,
-                        due_at=due_at,
-                    )
-                    session.add(mastery)
-                session.commit()
+            # Sessão SQLModel (sync) no pool de threads, fora do event loop
+            await run_blocking(_store_schedule, msg, schedule, score, mastery_band, now)
         except Exception as e:
             logger.error(f"Error storing mastery: {e}")
             raise HTTPException(status_code=500, detail=f"Error storing mastery: {e}")
@@ -194,7 +209,9 @@ async def _declare_topology(channel: AbstractChannel) -> None:
 
 async def handle_learning_assessment(msg: LearningAssessmentRequest) -> None:
     try:
-        response = learning_assessment_adviser(
+        # Chamada LLM bloqueante fora do event loop (mensagens concorrentes)
+        response = await run_blocking(
+            learning_assessment_adviser,
             msg.quizz_questions,
             msg.student_answers,
             msg.correct_answers,
@@ -211,17 +228,21 @@ async def handle_learning_assessment(msg: LearningAssessmentRequest) -> None:
 
 async def run_consumer(stop_event: asyncio.Event) -> None:
     assert RABBIT_URL, "RABBITMQ_URL must be set"
-    connection = await aio_pika.connect_robust(RABBIT_URL)
-    async with connection:
-        channel = await connection.channel()
-        await channel.set_qos(prefetch_count=PREFETCH)
-        await _declare_topology(channel)
-        queue = await channel.get_queue(QUEUE_NAME, ensure=False)
-        async with queue.iterator() as queue_iter:
-            async for message in queue_iter:
-                if stop_event.is_set():
-                    break
-                await _handle_message(message)
+    loop_lag.start(threshold_ms=la_settings.LOOP_LAG_WARN_MS)
+    try:
+        connection = await aio_pika.connect_robust(RABBIT_URL)
+        async with connection:
+            channel = await connection.channel()
+            await channel.set_qos(prefetch_count=PREFETCH)
+            await _declare_topology(channel)
+            queue = await channel.get_queue(QUEUE_NAME, ensure=False)
+            runtime = ConsumerRuntime(
+                QUEUE_NAME, _handle_message, CONCURRENCY, DRAIN_TIMEOUT
+            )
+            async with queue.iterator() as queue_iter:
+                await runtime.run(queue_iter, stop_event)
+    finally:
+        loop_lag.stop()
 
 
 def start_consumer_task() -> asyncio.Task:
@@ -25,6 +25,14 @@ class Settings(BaseSettings):
     RABBITMQ_EXCHANGE: str = "app.events"
     RABBITMQ_ROUTING_KEY: str = "evaluation.completed"
     RABBITMQ_PREFETCH: int = 16
+    # Messages processed concurrently per process (<= prefetch) and how long
+    # shutdown waits for them before requeueing
+    RABBITMQ_CONSUMER_CONCURRENCY: int = 8
+    RABBITMQ_DRAIN_TIMEOUT_SECONDS: float = 30.0
+    # Threads for the sync calls left in the consumers (DB, sync Redis, LLM)
+    # and event loop lag above which a warning is logged
+    BLOCKING_POOL_SIZE: int = 8
+    LOOP_LAG_WARN_MS: float = 200.0
     RABBITMQ_QUEUE_NAME: str = "evaluation.completed.q"
     RABBITMQ_ROUTING_KEY_GENERATE: str = "quiz.create.request"
     RABBITMQ_ROUTING_KEY_NOTIFICATION: str = "notification.email.request"
@@ -36,5 +44,10 @@ class Settings(BaseSettings):
     LA_REMINDER_2_DELAY_DAYS: int = 2
     LA_FOLLOW_UP_QUIZ_DELAY_DAYS: int = 4
 
+    # Shared LLM HTTP pool, per model: max concurrent requests + keep-alive
+    LLM_MAX_CONNECTIONS: int = 32
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 16
+    LLM_KEEPALIVE_EXPIRY_SECONDS: float = 60.0
+
 
 la_settings = Settings()
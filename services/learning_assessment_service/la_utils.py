@@ -1,6 +1,7 @@
 from langchain_openai import ChatOpenAI
 from fastapi import HTTPException, status
 from .la_settings import la_settings as la_cfg
+from .llm_registry import LLMClientRegistry
 import opik
 
 OPIK_API_KEY = la_cfg.OPIK_API_KEY
@@ -92,6 +93,13 @@ REMINDER_PROMPT = opik.Prompt(
 )
 
 
+llm_registry = LLMClientRegistry(
+    max_connections=la_cfg.LLM_MAX_CONNECTIONS,
+    max_keepalive_connections=la_cfg.LLM_MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry=la_cfg.LLM_KEEPALIVE_EXPIRY_SECONDS,
+)
+
+
 def get_llm(
     model_name: str = "gpt-4o-mini",
     temperature: float = 0.2,
@@ -104,14 +112,14 @@ def get_llm(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="OPENAI_API_KEY is not configured in the environment.",
         )
-    llm = ChatOpenAI(
-        model=model_name,
-        temperature=temperature,
-        api_key=api_key,
+    # Cliente partilhado (pool HTTP keep-alive) em vez de um novo por pedido
+    return llm_registry.get(
+        model_name,
+        temperature,
         timeout=timeout,
         max_retries=max_retries,
+        api_key=api_key,
     )
-    return llm
 
 
 def format_learning_assessment_prompt(evaluation_results: dict) -> str:
@@ -9,13 +9,14 @@ from .logging_config import get_logger
 from contextlib import asynccontextmanager
 from .db import create_db_and_tables
 from .consumer import start_consumer_task
-import contextlib
-import asyncio
+from .mq_runtime import runtime_as_dict, stop_consumer_task
+from .la_settings import la_settings
 from .quizz_create_publish import publish_quizz_create_request
 from .persistence import (
     get_learning_assessment_by_username,
     get_learning_assessment_mastery_by_username,
 )
+from .la_utils import llm_registry
 
 
 logger = get_logger(__name__)
@@ -30,14 +31,11 @@ async def lifespan(app: FastAPI):
     try:
         yield
     finally:
-        stop_event = getattr(consumer_task, "stop_event", None)
-        if stop_event is not None:
-            stop_event.set()
-        consumer_task.cancel()
-        with contextlib.suppress(Exception):
-            asyncio.get_event_loop().run_until_complete(consumer_task)
+        # Graceful stop: mensagens em curso terminam (ou voltam para a fila)
+        await stop_consumer_task(
+            consumer_task, la_settings.RABBITMQ_DRAIN_TIMEOUT_SECONDS + 5
+        )
         logger.info("Consumer task stopped")
-    yield
 
 
 app = FastAPI(title="Learning Assessment Service", lifespan=lifespan)
@@ -49,6 +47,12 @@ async def health_check():
     return {"status": "healthy", "service": "Learning Assessment Service"}
 
 
+@app.get("/metrics")
+async def metrics():
+    """In-process counters (per worker)"""
+    return {"llm_pool": llm_registry.as_dict(), **runtime_as_dict()}
+
+
 @app.post("/learning-assessment")
 async def learning_assessment_service(request: LearningAssessmentRequest):
     """Learning assessment endpoint"""
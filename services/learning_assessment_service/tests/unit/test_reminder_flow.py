@@ -68,6 +68,13 @@ eval_main_mod = importlib.import_module("services.evaluation_service.main")
 eval_data_models_mod = importlib.import_module(
     "services.evaluation_service.data_models"
 )
+eval_grading_mod = importlib.import_module("services.evaluation_service.grading")
+eval_grade_cache_mod = importlib.import_module(
+    "services.evaluation_service.grade_cache"
+)
+eval_persistence_mod = importlib.import_module(
+    "services.evaluation_service.persistence"
+)
 la_consumer_mod = importlib.import_module(
     "services.learning_assessment_service.consumer"
 )
@@ -167,18 +174,21 @@ async def test_evaluation_to_learning_assessment_to_notification_reminder_flow(
     monkeypatch.setattr(eval_main_mod, "redis_client", redis)
     monkeypatch.setattr(
         eval_main_mod,
-        "store_evals",
-        lambda username, q, a, correct, score, feedback: None,
+        "store_evals_bulk",
+        lambda username, items: eval_persistence_mod.BulkStoreResult(len(items)),
+    )
+    monkeypatch.setattr(
+        eval_grading_mod,
+        "grade_cache",
+        eval_grade_cache_mod.GradeCache(None, enabled=False),
     )
 
     class AIMessage:
         def __init__(self, content):
             self.content = content
 
-    monkeypatch.setattr(
-        eval_main_mod,
-        "eval_answer",
-        lambda question, answer: AIMessage(
+    async def fake_aeval_answer(question, answer):
+        return AIMessage(
             json.dumps(
                 {
                     "correct_answer": "42",
@@ -186,13 +196,14 @@ async def test_evaluation_to_learning_assessment_to_notification_reminder_flow(
                     "feedback": "review arithmetic basics",
                 }
             )
-        ),
-    )
+        )
+
+    monkeypatch.setattr(eval_main_mod, "aeval_answer", fake_aeval_answer)
 
     published_events: list[dict] = []
     monkeypatch.setattr(
-        eval_main_mod,
-        "publish_evaluation_completed_sync",
+        eval_main_mod.evaluation_outbox,
+        "enqueue",
         lambda payload: published_events.append(payload),
     )
 
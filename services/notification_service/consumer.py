@@ -7,12 +7,16 @@ from aiormq.types import FieldTable
 from .data_models import EmailRequest
 from .email import send_email
 from .logger import get_logger
+from .mq_runtime import ConsumerRuntime, blocking_pool, loop_lag
 from .settings import settings
 
 EXCHANGE_NAME = settings.RABBITMQ_EXCHANGE
 ROUTING_KEY = settings.RABBITMQ_ROUTING_KEY
 PREFETCH = settings.RABBITMQ_PREFETCH
 RABBIT_URL = settings.RABBITMQ_URL
+CONCURRENCY = settings.RABBITMQ_CONSUMER_CONCURRENCY
+DRAIN_TIMEOUT = settings.RABBITMQ_DRAIN_TIMEOUT_SECONDS
+blocking_pool.configure(settings.BLOCKING_POOL_SIZE)
 DLQ_NAME = settings.RABBITMQ_DLQ_NAME
 DLX_NAME = settings.RABBITMQ_DLX_NAME
 
@@ -52,17 +56,21 @@ async def _declare_topology(channel: AbstractChannel) -> None:
 
 async def run_consumer(stop_event: asyncio.Event) -> None:
     assert RABBIT_URL, "RABBITMQ_URL must be set"
-    connection = await aio_pika.connect_robust(RABBIT_URL)
-    async with connection:
-        channel = await connection.channel()
-        await channel.set_qos(prefetch_count=PREFETCH)
-        await _declare_topology(channel)
-        queue = await channel.get_queue(QUEUE_NAME, ensure=False)
-        async with queue.iterator() as queue_iter:
-            async for message in queue_iter:
-                if stop_event.is_set():
-                    break
-                await _handle_message(message)
+    loop_lag.start(threshold_ms=settings.LOOP_LAG_WARN_MS)
+    try:
+        connection = await aio_pika.connect_robust(RABBIT_URL)
+        async with connection:
+            channel = await connection.channel()
+            await channel.set_qos(prefetch_count=PREFETCH)
+            await _declare_topology(channel)
+            queue = await channel.get_queue(QUEUE_NAME, ensure=False)
+            runtime = ConsumerRuntime(
+                QUEUE_NAME, _handle_message, CONCURRENCY, DRAIN_TIMEOUT
+            )
+            async with queue.iterator() as queue_iter:
+                await runtime.run(queue_iter, stop_event)
+    finally:
+        loop_lag.stop()
 
 
 def start_consumer_task() -> asyncio.Task:
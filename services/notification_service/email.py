@@ -1,8 +1,9 @@
-import resend  # type: ignore[import-not-found]
+import resend
 from fastapi import HTTPException
 
 from .data_models import EmailRequest, EmailResponse
 from .logger import get_logger
+from .mq_runtime import run_blocking
 from .settings import settings
 
 logger = get_logger(__name__)
@@ -11,13 +12,15 @@ resend.api_key = settings.RESEND_API_KEY
 
 async def send_email(email_request: EmailRequest) -> EmailResponse:
     try:
-        response = resend.Emails.send(
+        # O SDK do Resend é síncrono: corre no pool de threads
+        response = await run_blocking(
+            resend.Emails.send,
             {
                 "from": "LLM Academy <onboarding@resend.dev>",
                 "to": [email_request.to],
                 "subject": email_request.subject,
                 "html": email_request.html,
-            }
+            },
         )
         return EmailResponse(success=True, id=response["id"])
     except Exception as e:
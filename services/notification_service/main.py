@@ -1,4 +1,3 @@
-import contextlib
 from contextlib import asynccontextmanager
 
 import aio_pika
@@ -8,6 +7,7 @@ from .consumer import start_consumer_task
 from .data_models import EmailRequest, EmailResponse
 from .email import send_email
 from .logger import get_logger
+from .mq_runtime import runtime_as_dict, stop_consumer_task
 from .settings import settings
 
 logger = get_logger(__name__)
@@ -19,12 +19,10 @@ async def lifespan(app: FastAPI):
     try:
         yield
     finally:
-        stop_event = getattr(consumer_task, "stop_event", None)
-        if stop_event is not None:
-            stop_event.set()
-        consumer_task.cancel()
-        with contextlib.suppress(Exception):
-            await consumer_task
+        # Graceful stop: emails em curso terminam (ou voltam para a fila)
+        await stop_consumer_task(
+            consumer_task, settings.RABBITMQ_DRAIN_TIMEOUT_SECONDS + 5
+        )
         logger.info("Notification consumer stopped")
 
 
@@ -36,6 +34,12 @@ async def send_email_endpoint(email_request: EmailRequest) -> EmailResponse:
     return await send_email(email_request)
 
 
+@app.get("/metrics")
+async def metrics():
+    """In-process counters (per worker)"""
+    return runtime_as_dict()
+
+
 @app.get("/health")
 async def health_check():
     rabbit = "disabled"
@@ -7,6 +7,14 @@ class Settings(BaseSettings):
     RABBITMQ_EXCHANGE: str = "app.events"
     RABBITMQ_ROUTING_KEY: str = "notification.email.request"
     RABBITMQ_PREFETCH: int = 16
+    # Messages processed concurrently per process (<= prefetch) and how long
+    # shutdown waits for them before requeueing
+    RABBITMQ_CONSUMER_CONCURRENCY: int = 8
+    RABBITMQ_DRAIN_TIMEOUT_SECONDS: float = 30.0
+    # Threads for the sync calls left in the consumers (DB, sync Redis, LLM)
+    # and event loop lag above which a warning is logged
+    BLOCKING_POOL_SIZE: int = 8
+    LOOP_LAG_WARN_MS: float = 200.0
     RABBITMQ_QUEUE_NAME: str = "notification.email.q"
     RABBITMQ_DLX_NAME: str = "app.dlx"
     RABBITMQ_DLQ_NAME: str = "notification.email.dlq"
@@ -1,6 +1,9 @@
 import asyncio
 import signal
-from .generator_consumer import run_consumer
+from .generator_consumer import logger, quizz_generator, run_consumer
+from .mq_runtime import run_blocking, runtime_as_dict
+from .quiz_pool import quiz_pool, run_filler
+from .quiz_parser import parse_stats
 
 
 async def main() -> None:
@@ -17,7 +20,25 @@ async def main() -> None:
             # Windows fallback: ignore signal handlers
             pass
 
-    await run_consumer(stop_event)
+    # O worker também mantém o pool de quizzes cheio para as specs mais pedidas
+    filler = None
+    if quiz_pool.enabled:
+        filler = asyncio.create_task(
+            run_filler(quiz_pool, quizz_generator, run_blocking, stop_event)
+        )
+    try:
+        await run_consumer(stop_event)
+    finally:
+        stop_event.set()
+        if filler is not None:
+            await filler
+    # Sem endpoint HTTP neste processo: contadores por fila no log de saída
+    logger.info(
+        "Consumer stopped: %s, quiz_pool=%s, quiz_parse=%s",
+        runtime_as_dict(),
+        quiz_pool.stats.as_dict(),
+        parse_stats.as_dict(),
+    )
 
 
 if __name__ == "__main__":
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field as PydanticField, ValidationInfo, field_validator
 from sqlmodel import Field, SQLModel, Column
 import uuid
 from uuid import UUID
@@ -14,6 +14,25 @@ class QuizzRequest(BaseModel):
     style: str
 
 
+class GeneratedQuiz(BaseModel):
+    """Quiz as returned by the generator LLM (structured output schema)."""
+
+    questions: list[str] = PydanticField(
+        min_length=1, description="The quiz questions, numbered (1., 2., ...)"
+    )
+    tags: list[str] = PydanticField(
+        default_factory=list, description="Short topic tags for the quiz"
+    )
+
+    @field_validator("questions", "tags")
+    @classmethod
+    def _strip_empty(cls, items: list[str], info: ValidationInfo) -> list[str]:
+        items = [item.strip() for item in items if item and item.strip()]
+        if info.field_name == "questions" and not items:
+            raise ValueError("the quiz has no questions")
+        return items
+
+
 class Token(BaseModel):
     access_token: str
     token_type: str
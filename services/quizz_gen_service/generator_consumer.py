@@ -10,6 +10,10 @@ from aio_pika import abc as aio_abc
 from aiormq.types import FieldTable
 from .persistence import store_quizz
 from .db import create_db_and_tables
+from .mq_runtime import ConsumerRuntime, blocking_pool, loop_lag, run_blocking
+from .quiz_pool import QuizSpec, agenerate_live, quiz_pool
+from .job_events import publish_event
+from .quiz_parser import QuizParseError
 
 logger = get_logger(__name__)
 
@@ -17,12 +21,21 @@ EXCHANGE_NAME = quizz_settings.RABBITMQ_EXCHANGE
 ROUTING_KEY = quizz_settings.RABBITMQ_ROUTING_KEY_GENERATE
 PREFETCH = int(quizz_settings.RABBITMQ_PREFETCH)
 RABBIT_URL = quizz_settings.RABBITMQ_URL
+CONCURRENCY = quizz_settings.RABBITMQ_CONSUMER_CONCURRENCY
+DRAIN_TIMEOUT = quizz_settings.RABBITMQ_DRAIN_TIMEOUT_SECONDS
+blocking_pool.configure(quizz_settings.BLOCKING_POOL_SIZE)
 
 QUEUE_NAME = quizz_settings.RABBITMQ_QUEUE_NAME
 DLX_NAME = quizz_settings.RABBITMQ_DLX_NAME
 DLQ_NAME = quizz_settings.RABBITMQ_DLQ_NAME
 
 
+def _set_status(key: str, ttl: int, status: Dict[str, Any]) -> None:
+    # Chave de estado (GET /jobs) + evento para os clientes SSE/long-poll
+    redis_client.setex(key, ttl, json.dumps(status))
+    publish_event(redis_client, key, status)
+
+
 async def _handle_message(message: aio_abc.AbstractIncomingMessage) -> None:
     async with message.process(requeue=False):
         payload: Dict[str, Any] = json.loads(message.body)
@@ -35,35 +48,55 @@ async def _handle_message(message: aio_abc.AbstractIncomingMessage) -> None:
 
         if not (username and quiz_id and topic and difficulty and style):
             logger.error("Invalid payload for quiz generation: %s", payload)
+            if username and quiz_id:
+                # Sem evento terminal os clientes SSE/long-poll só param no timeout
+                await run_blocking(
+                    _set_status,
+                    f"Quizz:{username}:{quiz_id}",
+                    1800,
+                    {"status": "failed", "error": "invalid quiz request"},
+                )
             return
 
         key = f"Quizz:{username}:{quiz_id}"
         # Mark as processing
-        redis_client.setex(key, 3600, json.dumps({"status": "processing"}))
+        await run_blocking(_set_status, key, 3600, {"status": "processing"})
+        spec = QuizSpec(topic, num_questions, difficulty, style)
+        # Quiz pré-gerado do pool (se houver um que o user ainda não viu)
+        questions = await run_blocking(quiz_pool.take, username, spec)
+        stored = False
         last_error: Exception | None = None
         backoff = 0.5
         for attempt in range(3):
             try:
-                questions = quizz_generator(topic, num_questions, difficulty, style)
-                redis_client.setex(
+                # Chamadas bloqueantes fora do event loop (mensagens concorrentes)
+                if questions is None:
+                    # Espera por uma geração igual sem ocupar threads do pool
+                    questions = await agenerate_live(
+                        quiz_pool, username, spec, quizz_generator, run_blocking
+                    )
+                # Grava antes do "done": os clientes param no primeiro "done"
+                if not stored:
+                    await run_blocking(
+                        store_quizz,
+                        username=username,
+                        topic=topic,
+                        num_questions=num_questions,
+                        difficulty=difficulty,
+                        style=style,
+                        questions=questions["questions"],
+                        tags=questions["tags"],
+                    )
+                    stored = True
+                await run_blocking(
+                    _set_status,
                     key,
                     3600,
-                    json.dumps(
-                        {
-                            "status": "done",
-                            "questions": questions["questions"],
-                            "tags": questions["tags"],
-                        }
-                    ),
-                )
-                store_quizz(
-                    username=username,
-                    topic=topic,
-                    num_questions=num_questions,
-                    difficulty=difficulty,
-                    style=style,
-                    questions=questions["questions"],
-                    tags=questions["tags"],
+                    {
+                        "status": "done",
+                        "questions": questions["questions"],
+                        "tags": questions["tags"],
+                    },
                 )
                 logger.info(
                     "Quiz generated and stored: %s (attempt=%d)",
@@ -71,7 +104,15 @@ async def _handle_message(message: aio_abc.AbstractIncomingMessage) -> None:
                     attempt + 1,
                 )
                 break
+            except QuizParseError as e:
+                # Resposta irreparável: repetir só gastaria mais chamadas ao LLM
+                logger.error("Quiz generation failed, unparseable reply: %s", e)
+                await run_blocking(
+                    _set_status, key, 1800, {"status": "failed", "error": str(e)}
+                )
+                return
             except Exception as e:
+                # O quiz já gerado (ou do pool) é mantido: só repete o que falhou
                 last_error = e
                 logger.warning("Quiz generation attempt %d failed: %s", attempt + 1, e)
                 await asyncio.sleep(backoff)
@@ -79,10 +120,11 @@ async def _handle_message(message: aio_abc.AbstractIncomingMessage) -> None:
         else:
             # All attempts failed
             logger.exception("Quiz generation failed after retries: %s", last_error)
-            redis_client.setex(
+            await run_blocking(
+                _set_status,
                 key,
                 1800,
-                json.dumps({"status": "failed", "error": str(last_error)}),
+                {"status": "failed", "error": str(last_error)},
             )
 
 
@@ -117,19 +159,23 @@ async def _declare_topology(channel: aio_abc.AbstractChannel) -> None:
 
 async def run_consumer(stop_event: asyncio.Event) -> None:
     # Ensure database tables exist (idempotent)
-    create_db_and_tables()
+    await run_blocking(create_db_and_tables)
     assert RABBIT_URL, "RABBITMQ_URL must be set"
-    connection = await aio_pika.connect_robust(RABBIT_URL)
-    async with connection:
-        channel = await connection.channel()
-        await channel.set_qos(prefetch_count=PREFETCH)
-        await _declare_topology(channel)
-        queue = await channel.get_queue(QUEUE_NAME, ensure=False)
-        async with queue.iterator() as queue_iter:
-            async for message in queue_iter:
-                if stop_event.is_set():
-                    break
-                await _handle_message(message)
+    loop_lag.start(threshold_ms=quizz_settings.LOOP_LAG_WARN_MS)
+    try:
+        connection = await aio_pika.connect_robust(RABBIT_URL)
+        async with connection:
+            channel = await connection.channel()
+            await channel.set_qos(prefetch_count=PREFETCH)
+            await _declare_topology(channel)
+            queue = await channel.get_queue(QUEUE_NAME, ensure=False)
+            runtime = ConsumerRuntime(
+                QUEUE_NAME, _handle_message, CONCURRENCY, DRAIN_TIMEOUT
+            )
+            async with queue.iterator() as queue_iter:
+                await runtime.run(queue_iter, stop_event)
+    finally:
+        loop_lag.stop()
 
 
 def start_consumer_task() -> asyncio.Task:
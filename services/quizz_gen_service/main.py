@@ -1,6 +1,7 @@
-from fastapi import FastAPI, Depends, HTTPException, status
-from typing import Annotated
-from .cache import redis_client
+from fastapi import FastAPI, Depends, HTTPException, Header, Query, Response, status
+from fastapi.responses import StreamingResponse
+from typing import Annotated, Optional
+from .cache import async_redis_client, redis_client
 from .model import quizz_generator
 from .data_models import QuizzRequest, User, SubmitAnswers
 import hashlib
@@ -11,10 +12,15 @@ import uuid
 from datetime import datetime
 from fastapi import BackgroundTasks
 from .quizz_settings import quizz_settings
-from typing import cast, Tuple, List
-from .persistence import store_quizz
+from typing import cast
+from .persistence import quizz_history, store_quizz
+from .history_index import read_page, record
 from .db import create_db_and_tables
 from contextlib import asynccontextmanager
+from .quizz_utils import llm_registry
+from .quiz_pool import QuizSpec, quiz_pool, serve_quiz
+from .job_events import publish_event, sse_events, wait_event
+from .quiz_parser import parse_stats
 
 
 # Initialize the logger for this module
@@ -55,17 +61,33 @@ async def health_check():
     }
 
 
+@app.get("/metrics")
+async def metrics():
+    """In-process counters (per worker)"""
+    return {
+        "llm_pool": llm_registry.as_dict(),
+        "quiz_pool": quiz_pool.stats.as_dict(),
+        "quiz_parse": parse_stats.as_dict(),
+    }
+
+
 @app.post("/generate-quiz")
 def generate_quizz(
     request: QuizzRequest,
     current_user: Annotated[User, Depends(get_current_active_user)],
 ):
     try:
-        quizz = quizz_generator(
-            request.topic,
-            request.num_questions,
-            request.difficulty,
-            request.style,
+        # Do pool (uma leitura Redis) ou, sem quiz novo para o user, gerado agora
+        quizz = serve_quiz(
+            quiz_pool,
+            current_user.username,
+            QuizSpec(
+                request.topic,
+                request.num_questions,
+                request.difficulty,
+                request.style,
+            ),
+            quizz_generator,
         )
         logger.info(f"Quizz generated: {quizz}")
         store_quizz(
@@ -85,6 +107,7 @@ def generate_quizz(
         quizz_hash = hashlib.sha256(quizz_str.encode()).hexdigest()
         cache_key = f"quizz_request:{current_user.username}:{quizz_hash}"
         redis_client.setex(cache_key, 3600, quizz_str)
+        record(redis_client, "quizz_request", current_user.username, cache_key, 3600)
         logger.info(f"Quizz cached: {quizz_str}, key: {cache_key}")
 
         return {"quizz_questions": quizz["questions"], "tags": quizz["tags"]}
@@ -103,11 +126,16 @@ def create_quiz(
     current_user: Annotated[User, Depends(get_current_active_user)],
 ):
     try:
-        questions = quizz_generator(
-            request.topic,
-            request.num_questions,
-            request.difficulty,
-            request.style,
+        questions = serve_quiz(
+            quiz_pool,
+            current_user.username,
+            QuizSpec(
+                request.topic,
+                request.num_questions,
+                request.difficulty,
+                request.style,
+            ),
+            quizz_generator,
         )
         store_quizz(
             username=current_user.username,
@@ -176,6 +204,11 @@ async def submit_answers(
             )
 
         job_id = str(uuid.uuid4())
+        publish_event(
+            redis_client,
+            f"Eval:{current_user.username}:{job_id}",
+            {"status": "queued"},
+        )
         payload_msg = {
             "job_id": job_id,
             "username": current_user.username,
@@ -225,6 +258,7 @@ def generate_quizz_async(
     key = f"Quizz:{current_user.username}:{quizz_id}"
     # marca como queued no Redis
     redis_client.setex(key, 3600, json.dumps({"status": "queued"}))
+    publish_event(redis_client, key, {"status": "queued"})
     payload = {
         "quizz_id": quizz_id,
         "username": current_user.username,
@@ -286,31 +320,84 @@ def get_quiz_job_status(
         }
 
 
+@app.get("/jobs/{quizz_id}/events")
+async def stream_quiz_job_status(
+    quizz_id: str,
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    last_event_id: Annotated[Optional[str], Header()] = None,
+):
+    """
+    Server-Sent Events with the job status transitions (queued, processing,
+    done/failed); the stream ends after a terminal status. Reconnecting
+    clients resume from `Last-Event-ID`.
+    """
+    key = f"Quizz:{current_user.username}:{quizz_id}"
+    return StreamingResponse(
+        sse_events(
+            async_redis_client,
+            key,
+            last_event_id or "0",
+            quizz_settings.JOB_SSE_MAX_SECONDS,
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/jobs/{quizz_id}/wait")
+async def wait_quiz_job_status(
+    quizz_id: str,
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    since: str = "0",
+    timeout: float = 25.0,
+):
+    """
+    Long-poll fallback: returns the first status after event `since` (the
+    current one when omitted) or 204 if none arrives within `timeout`.
+    """
+    key = f"Quizz:{current_user.username}:{quizz_id}"
+    timeout = max(0.0, min(timeout, quizz_settings.JOB_LONG_POLL_MAX_SECONDS))
+    try:
+        event = await wait_event(async_redis_client, key, since, timeout)
+    except Exception as e:
+        logger.error(f"Job wait failed: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Job wait failed: {str(e)}",
+        )
+    if event is None:
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+    return event
+
+
 @app.get("/get-quizz-questions")
-def get_questions(current_user: Annotated[User, Depends(get_current_active_user)]):
+def get_questions(
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    response: Response,
+    offset: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[int, Query(ge=1, le=500)] = 50,
+):
+    """
+    Newest-first page of the user's generated quizzes: from the per-user
+    Redis index (no keyspace SCAN), or from Postgres once it has expired.
+    Total and source go in the X-Total-Count / X-History-Source headers.
+    """
     try:
-        matching_keys = []
-        cursor = 0  # Start with cursor 0
-
-        # Executa ao menos um SCAN e termina quando o cursor voltar a 0
-        while True:
-            cursor, keys = cast(
-                Tuple[int, List[str]],
-                redis_client.scan(
-                    cursor=cursor,
-                    match=(f"quizz_request:{current_user.username}:*"),
-                    count=100,
-                ),
+        page = None
+        try:
+            page = read_page(
+                redis_client, "quizz_request", current_user.username, offset, limit
             )
-            matching_keys.extend(keys)
-            if cursor == 0:
-                break
-
-        # Retrieve all the values for the found keys
-        if matching_keys:
-            values = redis_client.mget(matching_keys)
-            logger.info(f"Values: {values}")
-            return values
+        except Exception as e:
+            logger.warning(f"History index read failed, using Postgres: {e}")
+        if page is None:
+            page = quizz_history(current_user.username, offset, limit)
+        response.headers["X-Total-Count"] = str(page.total)
+        response.headers["X-History-Source"] = page.source
+
+        if page.items:
+            logger.info(f"Values: {page.items}")
+            return page.items
         else:
             logger.info("No keys found for the pattern.")
             return "No keys found for the pattern."
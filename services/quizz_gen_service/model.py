@@ -3,10 +3,15 @@ from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
     from services.quizz_gen_service import quizz_utils as qmod
+    from services.quizz_gen_service.data_models import GeneratedQuiz
+    from services.quizz_gen_service.quiz_parser import parse_quiz, QuizParseError
 else:
     from . import quizz_utils as qmod
+    from .data_models import GeneratedQuiz
+    from .quiz_parser import parse_quiz, QuizParseError
+from langchain_core.runnables import RunnableConfig
 from opik.integrations.langchain import OpikTracer
-import ast
+from typing import Any, List
 
 opik_tracer = OpikTracer(
     tags=["langchain", "quizz"],
@@ -15,20 +20,36 @@ opik_tracer = OpikTracer(
 )
 
 
+def _raw_candidates(raw: Any) -> List[Any]:
+    # Tool call (válida ou não) primeiro, depois o texto da resposta
+    candidates: List[Any] = [tc["args"] for tc in getattr(raw, "tool_calls", [])]
+    candidates += [tc["args"] for tc in getattr(raw, "invalid_tool_calls", [])]
+    candidates.append(getattr(raw, "content", raw))
+    return [c for c in candidates if c]
+
+
 def quizz_generator(
     topic: str, num_questions: int, difficulty: str, style: str
 ) -> dict:
+    """
+    Generate a quiz ({"questions": [...], "tags": [...]}); raises
+    QuizParseError if the reply cannot be turned into one.
+    """
     llm = qmod.get_llm()
     prompt = qmod.format_quizz_prompt(topic, num_questions, difficulty, style)
-    quizz = llm.invoke(prompt, config={"callbacks": [opik_tracer]}).content
-    print(f"Quizz: {type(quizz)}")
-    quizz = ast.literal_eval(str(quizz))
-
-    if isinstance(quizz, dict):
-        if "questions" in quizz and "tags" in quizz:
-            if quizz["questions"] is not None and quizz["tags"] is not None:
-                return quizz
+    config: RunnableConfig = {"callbacks": [opik_tracer]}
+    if not qmod.quizz_cfg.QUIZ_STRUCTURED_OUTPUT:
+        reply = llm.invoke(prompt, config=config).content
+        return parse_quiz(reply).model_dump()
 
-    return {
-        "Output": "Error: LLM did not return a parseable list of questions or tags."
-    }
+    # include_raw: se a validação falhar, repara a resposta em vez de repetir
+    # a chamada ao LLM
+    result = llm.with_structured_output(GeneratedQuiz, include_raw=True).invoke(
+        prompt, config=config
+    )
+    if result.get("parsed") is not None:
+        return parse_quiz(result["parsed"]).model_dump()
+    candidates = _raw_candidates(result.get("raw"))
+    if not candidates:
+        raise QuizParseError("LLM returned an empty reply")
+    return parse_quiz(*candidates).model_dump()
@@ -0,0 +1,414 @@
+"""
+Concurrent RabbitMQ consumption with ordered acknowledgements.
+
+`ConsumerRuntime.run()` replaces the `async for message in queue_iter: await
+_handle_message(message)` loop of the consumers: up to `concurrency`
+messages are processed at once (the rest stay in the prefetch buffer), but
+acks/rejects are sent to the broker in delivery order, so a message is never
+acknowledged before the ones delivered ahead of it have been settled.
+
+Handlers are unchanged: they keep using `async with message.process(...)`
+(or `message.ack()`/`reject()`); the runtime hands them a proxy that records
+the outcome, and a handler that returns without settling its message is
+acked (rejected without requeue if it raised).
+
+On stop the runtime stops taking messages, waits up to `drain_timeout` for
+the in-flight ones, requeues whatever did not finish and flushes the acks.
+Per-queue counters are kept in `consumer_stats` for `/metrics`.
+
+Sync calls left in the handlers (SQLModel sessions, sync Redis, LLM
+clients without an async path) go through `run_blocking`, a dedicated
+bounded thread pool, so they never run on the event loop. `loop_lag`
+samples how late the loop wakes up and logs a warning when it was blocked
+longer than the configured threshold.
+"""
+
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set, TypeVar
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+Handler = Callable[[Any], Awaitable[None]]
+T = TypeVar("T")
+
+ACK = "ack"
+REJECT = "reject"
+REQUEUE = "requeue"
+
+
+@dataclass
+class QueueStats:
+    concurrency: int = 0
+    received: int = 0
+    acked: int = 0
+    rejected: int = 0
+    requeued: int = 0
+    handler_errors: int = 0
+    in_flight: int = 0
+    peak_in_flight: int = 0
+    processing_seconds: float = 0.0
+    started_at: float = field(default_factory=time.monotonic)
+
+    def as_dict(self) -> Dict[str, Any]:
+        settled = self.acked + self.rejected + self.requeued
+        uptime = max(time.monotonic() - self.started_at, 1e-9)
+        return {
+            "concurrency": self.concurrency,
+            "received": self.received,
+            "acked": self.acked,
+            "rejected": self.rejected,
+            "requeued": self.requeued,
+            "handler_errors": self.handler_errors,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "messages_per_second": round(settled / uptime, 3),
+            "avg_processing_ms": (
+                round(self.processing_seconds / settled * 1e3, 2) if settled else 0.0
+            ),
+        }
+
+
+consumer_stats: Dict[str, QueueStats] = {}
+
+
+def stats_as_dict() -> Dict[str, Dict[str, Any]]:
+    return {queue: stats.as_dict() for queue, stats in consumer_stats.items()}
+
+
+class BlockingPool:
+    """Bounded thread pool for the sync calls made from async consumers."""
+
+    def __init__(self, max_workers: int = 8) -> None:
+        self.max_workers = max_workers
+        self.calls = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.seconds = 0.0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def configure(self, max_workers: int) -> None:
+        with self._lock:
+            if max_workers != self.max_workers and self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+            self.max_workers = max(1, max_workers)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="blocking"
+                )
+            return self._executor
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        loop = asyncio.get_running_loop()
+        call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+        self.calls += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        started = time.perf_counter()
+        try:
+            return await loop.run_in_executor(self._get_executor(), call)
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self.seconds += time.perf_counter() - started
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "calls": self.calls,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "avg_call_ms": (
+                round(self.seconds / self.calls * 1e3, 2) if self.calls else 0.0
+            ),
+        }
+
+
+blocking_pool = BlockingPool()
+
+
+async def run_blocking(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a sync call on the blocking pool instead of the event loop."""
+    return await blocking_pool.run(fn, *args, **kwargs)
+
+
+class LoopLagMonitor:
+    """
+    Sleeps `interval` seconds in a loop and measures how late it wakes up:
+    that delay is the time the event loop spent running something else
+    without yielding.
+    """
+
+    def __init__(self, interval: float = 0.5, threshold_ms: float = 200.0) -> None:
+        self.interval = interval
+        self.threshold_ms = threshold_ms
+        self.samples = 0
+        self.blocked = 0
+        self.total_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self.last_lag_ms = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(
+        self, interval: Optional[float] = None, threshold_ms: Optional[float] = None
+    ) -> None:
+        if interval is not None:
+            self.interval = interval
+        if threshold_ms is not None:
+            self.threshold_ms = threshold_ms
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def record(self, lag_ms: float) -> None:
+        self.samples += 1
+        self.total_lag_ms += lag_ms
+        self.last_lag_ms = lag_ms
+        self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+        if lag_ms > self.threshold_ms:
+            self.blocked += 1
+            logger.warning(
+                f"Event loop blocked for {lag_ms:.0f} ms "
+                f"(threshold {self.threshold_ms:.0f} ms)"
+            )
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.record(max(0.0, loop.time() - started - self.interval) * 1e3)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "threshold_ms": self.threshold_ms,
+            "samples": self.samples,
+            "blocked": self.blocked,
+            "last_lag_ms": round(self.last_lag_ms, 2),
+            "max_lag_ms": round(self.max_lag_ms, 2),
+            "avg_lag_ms": (
+                round(self.total_lag_ms / self.samples, 2) if self.samples else 0.0
+            ),
+        }
+
+
+loop_lag = LoopLagMonitor()
+
+
+def runtime_as_dict() -> Dict[str, Any]:
+    return {
+        "consumers": stats_as_dict(),
+        "blocking_pool": blocking_pool.as_dict(),
+        "event_loop": loop_lag.as_dict(),
+    }
+
+
+class _ProcessContext:
+    def __init__(
+        self, message: "_OrderedMessage", requeue: bool, ignore_processed: bool
+    ) -> None:
+        self.message = message
+        self.requeue = requeue
+        self.ignore_processed = ignore_processed
+
+    async def __aenter__(self) -> "_OrderedMessage":
+        return self.message
+
+    async def __aexit__(self, exc_type, exc, tb) -> bool:
+        if self.ignore_processed and self.message.outcome is not None:
+            return False
+        if exc_type is None:
+            self.message.settle(ACK)
+        elif issubclass(exc_type, asyncio.CancelledError):
+            # Cancelada pelo drain no stop: volta à fila, não vai para a DLQ
+            self.message.settle(REQUEUE)
+        else:
+            self.message.settle(REQUEUE if self.requeue else REJECT)
+        return False
+
+
+class _OrderedMessage:
+    """Proxy of an incoming message whose ack/reject is deferred to the runtime."""
+
+    def __init__(self, message: Any) -> None:
+        self._message = message
+        self.outcome: Optional[str] = None
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._message, name)
+
+    def settle(self, outcome: str) -> None:
+        if self.outcome is None:
+            self.outcome = outcome
+
+    def process(
+        self,
+        requeue: bool = False,
+        reject_on_redelivered: bool = False,
+        ignore_processed: bool = False,
+    ) -> _ProcessContext:
+        return _ProcessContext(self, requeue, ignore_processed)
+
+    async def ack(self, multiple: bool = False) -> None:
+        self.settle(ACK)
+
+    async def reject(self, requeue: bool = False) -> None:
+        self.settle(REQUEUE if requeue else REJECT)
+
+    async def nack(self, multiple: bool = False, requeue: bool = True) -> None:
+        self.settle(REQUEUE if requeue else REJECT)
+
+
+class ConsumerRuntime:
+    def __init__(
+        self,
+        queue_name: str,
+        handler: Handler,
+        concurrency: int = 8,
+        drain_timeout: float = 30.0,
+    ) -> None:
+        self.queue_name = queue_name
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self.drain_timeout = drain_timeout
+        self.stats = QueueStats(concurrency=self.concurrency)
+        consumer_stats[queue_name] = self.stats
+        self._pending: Deque[_OrderedMessage] = deque()
+        self._tasks: Set[asyncio.Task] = set()
+        self._flush_lock = asyncio.Lock()
+
+    async def run(self, queue_iter: Any, stop_event: asyncio.Event) -> None:
+        slots = asyncio.Semaphore(self.concurrency)
+        stop = asyncio.ensure_future(stop_event.wait())
+        iterator = queue_iter.__aiter__()
+        try:
+            while not stop_event.is_set():
+                await self._wait_for(slots.acquire(), stop)
+                if stop_event.is_set():
+                    break
+                try:
+                    message = await self._wait_for(iterator.__anext__(), stop)
+                except StopAsyncIteration:
+                    slots.release()
+                    break
+                if message is None:
+                    slots.release()
+                    break
+                self._start(message, slots)
+        finally:
+            stop.cancel()
+            await self._drain()
+
+    @staticmethod
+    async def _wait_for(awaitable: Awaitable[Any], stop: "asyncio.Future") -> Any:
+        # Devolve None se o stop chegar primeiro (e cancela a espera)
+        task = asyncio.ensure_future(awaitable)
+        await asyncio.wait({task, stop}, return_when=asyncio.FIRST_COMPLETED)
+        if task.done():
+            return task.result()
+        task.cancel()
+        try:
+            await task
+        except (asyncio.CancelledError, StopAsyncIteration):
+            pass
+        return None
+
+    def _start(self, message: Any, slots: asyncio.Semaphore) -> None:
+        ordered = _OrderedMessage(message)
+        self._pending.append(ordered)
+        self.stats.received += 1
+        self.stats.in_flight += 1
+        self.stats.peak_in_flight = max(self.stats.peak_in_flight, self.stats.in_flight)
+        task = asyncio.create_task(self._process(ordered, slots))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _process(
+        self, message: _OrderedMessage, slots: asyncio.Semaphore
+    ) -> None:
+        started = time.perf_counter()
+        try:
+            await self.handler(message)
+            message.settle(ACK)
+        except asyncio.CancelledError:
+            # Não terminou dentro do drain: volta para a fila
+            message.settle(REQUEUE)
+        except Exception as e:
+            self.stats.handler_errors += 1
+            logger.error(f"Handler failed on queue {self.queue_name}: {e!r}")
+            message.settle(REJECT)
+        finally:
+            self.stats.in_flight -= 1
+            self.stats.processing_seconds += time.perf_counter() - started
+            slots.release()
+            await self._flush()
+
+    async def _flush(self) -> None:
+        # Só a cabeça da fila pode ser confirmada: acks pela ordem de entrega
+        async with self._flush_lock:
+            while self._pending and self._pending[0].outcome is not None:
+                message = self._pending.popleft()
+                try:
+                    if message.outcome == ACK:
+                        await message._message.ack()
+                        self.stats.acked += 1
+                    elif message.outcome == REQUEUE:
+                        await message._message.nack(requeue=True)
+                        self.stats.requeued += 1
+                    else:
+                        await message._message.reject(requeue=False)
+                        self.stats.rejected += 1
+                except Exception as e:
+                    logger.error(
+                        f"Could not settle message on queue {self.queue_name}: {e!r}"
+                    )
+
+    async def _drain(self) -> None:
+        if self._tasks:
+            logger.info(
+                f"Draining {len(self._tasks)} in-flight messages "
+                f"from queue {self.queue_name}"
+            )
+            _, unfinished = await asyncio.wait(
+                set(self._tasks), timeout=self.drain_timeout
+            )
+            for task in unfinished:
+                task.cancel()
+            if unfinished:
+                await asyncio.wait(unfinished)
+        await self._flush()
+
+
+async def stop_consumer_task(task: Any, timeout: float = 30.0) -> None:
+    """Signal the consumer to stop and wait for it to drain (then cancel)."""
+    stop_event = getattr(task, "stop_event", None)
+    if stop_event is not None:
+        stop_event.set()
+    if not asyncio.isfuture(task):
+        task.cancel()
+        return
+    try:
+        await asyncio.wait_for(task, timeout)
+    except (asyncio.TimeoutError, asyncio.CancelledError, Exception):
+        pass
@@ -1,6 +1,8 @@
-from sqlmodel import Session
+import json
+from sqlmodel import Session, func, select
 from .db import engine
 from .data_models import Quizz
+from .history_index import HistoryPage
 from .logging_config import get_logger
 from datetime import datetime
 
@@ -35,3 +37,26 @@ def store_quizz(
         except Exception as e:
             logger.exception("Error saving quizz: %s", e)
             return f"Error saving quizz: {e}"
+
+
+def quizz_history(username: str, offset: int, limit: int) -> HistoryPage:
+    """
+    Newest-first page of the user's quizzes from Postgres, rendered like the
+    `quizz_request:*` values cached by /generate-quiz.
+    """
+    with Session(engine) as session:
+        total = session.exec(
+            select(func.count()).select_from(Quizz).where(Quizz.username == username)
+        ).one()
+        rows = session.exec(
+            select(Quizz)
+            .where(Quizz.username == username)
+            .order_by(Quizz.created_at.desc())  # type: ignore[attr-defined]
+            .offset(offset)
+            .limit(limit)
+        ).all()
+    items = [
+        json.dumps({"questions": row.questions, "tags": row.tags}, sort_keys=True)
+        for row in rows
+    ]
+    return HistoryPage(items=items, total=total, source="postgres")
@@ -0,0 +1,121 @@
+"""
+Parsing of generated quizzes into `GeneratedQuiz`.
+
+Quizzes normally come back already validated from the structured-output
+call. When that fails (or in text mode) the raw reply goes through a
+tolerant parser that repairs the usual near-misses before giving up:
+markdown fences, text around the JSON object, smart quotes, trailing commas
+and Python literals (single quotes, None). Every outcome is counted so the
+failure rate can be followed in /metrics.
+"""
+
+import ast
+import json
+import re
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from .data_models import GeneratedQuiz
+
+
+class QuizParseError(ValueError):
+    """The LLM reply is not a quiz, even after repair."""
+
+
+@dataclass
+class QuizParseStats:
+    structured: int = 0
+    parsed: int = 0
+    repaired: int = 0
+    failed: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = asdict(self)
+        total = self.structured + self.parsed + self.repaired + self.failed
+        data["failure_rate"] = round(self.failed / total, 4) if total else 0.0
+        return data
+
+
+parse_stats = QuizParseStats()
+
+_FENCE_RE = re.compile(r"^```[a-zA-Z]*\s*|\s*```$")
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+
+
+def _validate(data: Any) -> GeneratedQuiz:
+    if isinstance(data, list):
+        # Só a lista de perguntas, sem tags
+        data = {"questions": data, "tags": []}
+    return GeneratedQuiz.model_validate(data)
+
+
+def _extract(text: str) -> str:
+    """The outermost JSON object (or list) in `text`, without fences."""
+    text = _FENCE_RE.sub("", text.strip())
+    for open_, close in (("{", "}"), ("[", "]")):
+        start, end = text.find(open_), text.rfind(close)
+        if start != -1 and end > start:
+            return text[start : end + 1]
+    return text
+
+
+def _load(text: str) -> Optional[Any]:
+    for loader in (json.loads, ast.literal_eval):
+        try:
+            return loader(text)
+        except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+            continue
+    return None
+
+
+def _parse(reply: Any) -> Tuple[Optional[GeneratedQuiz], str]:
+    if isinstance(reply, GeneratedQuiz):
+        return reply, "structured"
+    if not isinstance(reply, str):
+        try:
+            return _validate(reply), "parsed"
+        except ValidationError:
+            return None, "failed"
+
+    try:
+        return _validate(json.loads(reply)), "parsed"
+    except ValueError:  # inclui ValidationError
+        pass
+
+    # Aspas curvas só são traduzidas se o texto original não carregar: dentro
+    # de um valor ("the “pivot” row") são conteúdo, não delimitadores
+    extracted = _extract(reply)
+    texts: List[str] = []
+    for candidate in (extracted, extracted.translate(_SMART_QUOTES)):
+        for text in (candidate, _TRAILING_COMMA_RE.sub(r"\1", candidate)):
+            if text not in texts:
+                texts.append(text)
+    for text in texts:
+        data = _load(text)
+        if data is None:
+            continue
+        try:
+            return _validate(data), "repaired"
+        except ValidationError:
+            continue
+    return None, "failed"
+
+
+def parse_quiz(reply: Any, *fallbacks: Any) -> GeneratedQuiz:
+    """
+    A validated quiz from a model reply (text, dict, list or GeneratedQuiz),
+    trying `fallbacks` (other renderings of the same reply) in order.
+    """
+    for candidate in (reply, *fallbacks):
+        quiz, outcome = _parse(candidate)
+        if quiz is not None:
+            setattr(parse_stats, outcome, getattr(parse_stats, outcome) + 1)
+            return quiz
+    parse_stats.failed += 1
+    raise QuizParseError(
+        "LLM did not return a parseable list of questions or tags: "
+        f"{str(reply)[:200]!r}"
+    )
@@ -0,0 +1,627 @@
+"""
+Pool of pre-generated quizzes per (topic, num_questions, difficulty, style).
+
+Requests (`/generate-quiz`, `/create-quiz` and the generate-async worker)
+go through `serve_quiz`: a quiz the user has not seen yet is taken from the
+pool in two Redis round trips, and only when there is none the quiz is
+generated live (and added to the pool for the next users).
+
+Redis layout (`quizpool:` prefix):
+
+- `spec:{id}`           hash with the spec parameters
+- `demand:{hour}`       sorted set spec id -> requests in that hour
+- `items:{id}`          list of validated quizzes (JSON), newest first,
+                        trimmed to QUIZ_POOL_MAX_DEPTH
+- `seen:{user}:{id}`    set of quiz ids already served to the user
+- `flight:{id}`         single-flight lock (token of the request generating
+                        that spec) and `flight:{id}:result:{token}` with its
+                        quiz, so identical misses wait on one LLM call
+
+The filler (`run_filler`, started by the quiz worker) keeps the most
+requested specs of the last two hours topped up to a target depth that
+grows with their demand.
+
+Concurrent misses for the same spec (a class hitting "generate" at once) are
+coalesced: one request generates, the others wait for its quiz instead of
+calling the LLM too. With QUIZ_SINGLE_FLIGHT_SCOPE="user" only duplicate
+requests of the same user are coalesced (students never share a quiz).
+The worker waits with the async client (`agenerate_live`), so waiters never
+hold a `run_blocking` thread; the sync HTTP endpoints wait in their own
+threadpool thread, capped at QUIZ_SINGLE_FLIGHT_MAX_SYNC_WAITERS.
+"""
+
+import asyncio
+import csv
+import hashlib
+import json
+import math
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .cache import async_redis_client, redis_client
+from .logging_config import get_logger
+from .quizz_settings import quizz_settings
+
+logger = get_logger(__name__)
+
+KEY_PREFIX = "quizpool"
+DEMAND_WINDOW_HOURS = 2
+FLIGHT_RESULT_TTL_SECONDS = 60
+
+Generator = Callable[[str, int, str, str], Dict[str, Any]]
+Produced = Tuple[Dict[str, Any], Optional[Dict[str, Any]]]
+
+
+@dataclass(frozen=True)
+class QuizSpec:
+    topic: str
+    num_questions: int
+    difficulty: str
+    style: str
+
+    @property
+    def id(self) -> str:
+        normalized = "|".join(
+            [
+                " ".join(self.topic.split()).casefold(),
+                str(self.num_questions),
+                self.difficulty.strip().casefold(),
+                self.style.strip().casefold(),
+            ]
+        )
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass
+class QuizPoolStats:
+    hits: int = 0
+    empty: int = 0
+    exhausted: int = 0
+    live_generated: int = 0
+    filled: int = 0
+    invalid: int = 0
+    flights: int = 0
+    coalesced: int = 0
+    flight_timeouts: int = 0
+    # Pedidos síncronos que não esperaram (limite de threads à espera)
+    flight_waiters_capped: int = 0
+    errors: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = asdict(self)
+        served = self.hits + self.empty + self.exhausted
+        data["hit_rate"] = round(self.hits / served, 4) if served else 0.0
+        return data
+
+
+def validate_quiz(quiz: Any, num_questions: int) -> bool:
+    if not isinstance(quiz, dict):
+        return False
+    questions, tags = quiz.get("questions"), quiz.get("tags")
+    return (
+        isinstance(questions, list)
+        and len(questions) == num_questions
+        and all(isinstance(q, str) and q.strip() for q in questions)
+        and isinstance(tags, list)
+    )
+
+
+class QuizPool:
+    def __init__(
+        self,
+        client: Any,
+        min_depth: int = 3,
+        max_depth: int = 20,
+        depth_per_request: float = 0.5,
+        seen_ttl_seconds: int = 30 * 24 * 3600,
+        enabled: bool = True,
+        single_flight: bool = True,
+        flight_scope: str = "spec",
+        flight_lock_ttl_seconds: int = 120,
+        flight_wait_seconds: float = 90.0,
+        flight_poll_seconds: float = 0.1,
+        max_sync_waiters: int = 8,
+        aclient: Any = None,
+    ) -> None:
+        self.client = client
+        self.aclient = aclient
+        self.min_depth = min_depth
+        self.max_depth = max_depth
+        self.depth_per_request = depth_per_request
+        self.seen_ttl_seconds = seen_ttl_seconds
+        self.enabled = enabled
+        self.single_flight = single_flight
+        self.flight_scope = flight_scope
+        self.flight_lock_ttl_seconds = flight_lock_ttl_seconds
+        self.flight_wait_seconds = flight_wait_seconds
+        self.flight_poll_seconds = flight_poll_seconds
+        self._sync_waiters = threading.BoundedSemaphore(max(1, max_sync_waiters))
+        self.stats = QuizPoolStats()
+
+    @staticmethod
+    def _hour(now: Optional[float] = None) -> int:
+        return int((now if now is not None else time.time()) // 3600)
+
+    def _items_key(self, spec_id: str) -> str:
+        return f"{KEY_PREFIX}:items:{spec_id}"
+
+    def _seen_key(self, username: str, spec_id: str) -> str:
+        return f"{KEY_PREFIX}:seen:{username}:{spec_id}"
+
+    def take(self, username: str, spec: QuizSpec) -> Optional[Dict[str, Any]]:
+        """A pooled quiz `username` has not seen yet (records the demand)."""
+        if not self.enabled:
+            return None
+        sid = spec.id
+        demand_key = f"{KEY_PREFIX}:demand:{self._hour()}"
+        seen_key = self._seen_key(username, sid)
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.hset(f"{KEY_PREFIX}:spec:{sid}", mapping=asdict(spec))
+            pipe.zincrby(demand_key, 1, sid)
+            pipe.expire(demand_key, (DEMAND_WINDOW_HOURS + 1) * 3600)
+            pipe.lrange(self._items_key(sid), 0, -1)
+            pipe.smembers(seen_key)
+            *_, raws, seen = pipe.execute()
+            for raw in raws:
+                entry = json.loads(raw)
+                if entry["id"] in seen:
+                    continue
+                # SADD devolve 0 se outro pedido do mesmo user o levou entretanto
+                pipe = self.client.pipeline(transaction=False)
+                pipe.sadd(seen_key, entry["id"])
+                pipe.expire(seen_key, self.seen_ttl_seconds)
+                added, _ = pipe.execute()
+                if added:
+                    self.stats.hits += 1
+                    return entry
+        except Exception as e:
+            self.stats.errors += 1
+            logger.warning(f"Quiz pool take failed: {e}")
+            return None
+        if raws:
+            self.stats.exhausted += 1
+        else:
+            self.stats.empty += 1
+        return None
+
+    def offer(
+        self, spec: QuizSpec, quiz: Dict[str, Any], username: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Add a validated quiz to the pool (marked as seen by `username`)."""
+        if not validate_quiz(quiz, spec.num_questions):
+            self.stats.invalid += 1
+            return None
+        entry = {
+            "id": uuid.uuid4().hex,
+            "questions": quiz["questions"],
+            "tags": quiz["tags"],
+            "created_at": int(time.time()),
+        }
+        if not self.enabled:
+            return entry
+        sid = spec.id
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.hset(f"{KEY_PREFIX}:spec:{sid}", mapping=asdict(spec))
+            pipe.lpush(self._items_key(sid), json.dumps(entry))
+            pipe.ltrim(self._items_key(sid), 0, self.max_depth - 1)
+            if username:
+                seen_key = self._seen_key(username, sid)
+                pipe.sadd(seen_key, entry["id"])
+                pipe.expire(seen_key, self.seen_ttl_seconds)
+            pipe.execute()
+        except Exception as e:
+            self.stats.errors += 1
+            logger.warning(f"Quiz pool offer failed: {e}")
+        return entry
+
+    def mark_seen(self, username: str, spec: QuizSpec, quiz_id: str) -> None:
+        seen_key = self._seen_key(username, spec.id)
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.sadd(seen_key, quiz_id)
+            pipe.expire(seen_key, self.seen_ttl_seconds)
+            pipe.execute()
+        except Exception as e:
+            self.stats.errors += 1
+            logger.warning(f"Quiz pool mark_seen failed: {e}")
+
+    async def amark_seen(self, username: str, spec: QuizSpec, quiz_id: str) -> None:
+        seen_key = self._seen_key(username, spec.id)
+        try:
+            pipe = self.aclient.pipeline(transaction=False)
+            pipe.sadd(seen_key, quiz_id)
+            pipe.expire(seen_key, self.seen_ttl_seconds)
+            await pipe.execute()
+        except Exception as e:
+            self.stats.errors += 1
+            logger.warning(f"Quiz pool mark_seen failed: {e}")
+
+    def _flight_lock_key(self, username: str, spec: QuizSpec) -> str:
+        flight = spec.id if self.flight_scope == "spec" else f"{spec.id}:{username}"
+        return f"{KEY_PREFIX}:flight:{flight}"
+
+    def coalesce(
+        self,
+        username: str,
+        spec: QuizSpec,
+        produce: Callable[[], Produced],
+    ) -> Dict[str, Any]:
+        """
+        Run `produce` (returns the quiz and its pool entry) at most once at a
+        time per flight; concurrent callers get the leader's pooled quiz.
+        Without Redis, when the leader takes longer than `flight_wait_seconds`
+        or when `max_sync_waiters` threads are already waiting, the caller
+        produces its own quiz.
+        """
+        if not (self.enabled and self.single_flight):
+            return produce()[0]
+        lock_key = self._flight_lock_key(username, spec)
+        deadline = time.monotonic() + self.flight_wait_seconds
+        while time.monotonic() < deadline:
+            token = uuid.uuid4().hex
+            try:
+                leader = self.client.set(
+                    lock_key, token, nx=True, ex=self.flight_lock_ttl_seconds
+                )
+                owner = token if leader else self.client.get(lock_key)
+            except Exception as e:
+                self.stats.errors += 1
+                logger.warning(f"Quiz single-flight lock failed: {e}")
+                return produce()[0]
+            if leader:
+                self.stats.flights += 1
+                return self._lead(lock_key, token, produce)
+            if owner is None:
+                # O líder acabou entre o SET NX e o GET: nova eleição
+                continue
+            if not self._sync_waiters.acquire(blocking=False):
+                # Threads do servidor a esgotar: gera em vez de esperar
+                self.stats.flight_waiters_capped += 1
+                return produce()[0]
+            try:
+                entry = self._wait_flight(lock_key, owner, deadline)
+            finally:
+                self._sync_waiters.release()
+            if entry is not None:
+                self.stats.coalesced += 1
+                self.mark_seen(username, spec, entry["id"])
+                return entry
+            # Líder falhou sem resultado: nova eleição até ao deadline
+        self.stats.flight_timeouts += 1
+        return produce()[0]
+
+    def _lead(
+        self,
+        lock_key: str,
+        token: str,
+        produce: Callable[[], Produced],
+    ) -> Dict[str, Any]:
+        try:
+            quiz, entry = produce()
+            if entry is not None:
+                try:
+                    self.client.set(
+                        f"{lock_key}:result:{token}",
+                        json.dumps(entry),
+                        ex=FLIGHT_RESULT_TTL_SECONDS,
+                    )
+                except Exception as e:
+                    self.stats.errors += 1
+                    logger.warning(f"Quiz single-flight publish failed: {e}")
+            return quiz
+        finally:
+            try:
+                # Só liberta o lock se ainda for nosso (pode ter expirado)
+                if self.client.get(lock_key) == token:
+                    self.client.delete(lock_key)
+            except Exception as e:
+                logger.warning(f"Quiz single-flight release failed: {e}")
+
+    def _wait_flight(
+        self, lock_key: str, owner: str, deadline: float
+    ) -> Optional[Dict[str, Any]]:
+        result_key = f"{lock_key}:result:{owner}"
+        try:
+            while time.monotonic() < deadline:
+                pipe = self.client.pipeline(transaction=False)
+                pipe.get(result_key)
+                pipe.get(lock_key)
+                raw, current = pipe.execute()
+                if raw is None and current != owner:
+                    # O resultado pode ter sido escrito entre as duas leituras
+                    raw = self.client.get(result_key)
+                    return json.loads(raw) if raw else None
+                if raw is not None:
+                    return json.loads(raw)
+                time.sleep(self.flight_poll_seconds)
+        except Exception as e:
+            self.stats.errors += 1
+            logger.warning(f"Quiz single-flight wait failed: {e}")
+        return None
+
+    async def acoalesce(
+        self,
+        username: str,
+        spec: QuizSpec,
+        produce: Callable[[], Awaitable[Produced]],
+    ) -> Dict[str, Any]:
+        """
+        `coalesce` for the event loop: lock and wait go through the async
+        client and `asyncio.sleep`, so a waiter holds no thread.
+        """
+        if not (self.enabled and self.single_flight and self.aclient is not None):
+            return (await produce())[0]
+        lock_key = self._flight_lock_key(username, spec)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flight_wait_seconds
+        while loop.time() < deadline:
+            token = uuid.uuid4().hex
+            try:
+                leader = await self.aclient.set(
+                    lock_key, token, nx=True, ex=self.flight_lock_ttl_seconds
+                )
+                owner = token if leader else await self.aclient.get(lock_key)
+            except Exception as e:
+                self.stats.errors += 1
+                logger.warning(f"Quiz single-flight lock failed: {e}")
+                return (await produce())[0]
+            if leader:
+                self.stats.flights += 1
+                return await self._alead(lock_key, token, produce)
+            if owner is None:
+                continue
+            entry = await self._await_flight(lock_key, owner, deadline)
+            if entry is not None:
+                self.stats.coalesced += 1
+                await self.amark_seen(username, spec, entry["id"])
+                return entry
+        self.stats.flight_timeouts += 1
+        return (await produce())[0]
+
+    async def _alead(
+        self,
+        lock_key: str,
+        token: str,
+        produce: Callable[[], Awaitable[Produced]],
+    ) -> Dict[str, Any]:
+        try:
+            quiz, entry = await produce()
+            if entry is not None:
+                try:
+                    await self.aclient.set(
+                        f"{lock_key}:result:{token}",
+                        json.dumps(entry),
+                        ex=FLIGHT_RESULT_TTL_SECONDS,
+                    )
+                except Exception as e:
+                    self.stats.errors += 1
+                    logger.warning(f"Quiz single-flight publish failed: {e}")
+            return quiz
+        finally:
+            try:
+                if await self.aclient.get(lock_key) == token:
+                    await self.aclient.delete(lock_key)
+            except Exception as e:
+                logger.warning(f"Quiz single-flight release failed: {e}")
+
+    async def _await_flight(
+        self, lock_key: str, owner: str, deadline: float
+    ) -> Optional[Dict[str, Any]]:
+        result_key = f"{lock_key}:result:{owner}"
+        loop = asyncio.get_running_loop()
+        try:
+            while loop.time() < deadline:
+                pipe = self.aclient.pipeline(transaction=False)
+                pipe.get(result_key)
+                pipe.get(lock_key)
+                raw, current = await pipe.execute()
+                if raw is None and current != owner:
+                    raw = await self.aclient.get(result_key)
+                    return json.loads(raw) if raw else None
+                if raw is not None:
+                    return json.loads(raw)
+                await asyncio.sleep(self.flight_poll_seconds)
+        except Exception as e:
+            self.stats.errors += 1
+            logger.warning(f"Quiz single-flight wait failed: {e}")
+        return None
+
+    def target_depth(self, demand: float) -> int:
+        target = math.ceil(demand * self.depth_per_request)
+        return max(self.min_depth, min(self.max_depth, target))
+
+    def hot_specs(
+        self, limit: int, now: Optional[float] = None
+    ) -> List[Tuple[QuizSpec, float]]:
+        """Most requested specs over the demand window, with their demand."""
+        hour = self._hour(now)
+        demand: Dict[str, float] = {}
+        for h in range(hour - DEMAND_WINDOW_HOURS + 1, hour + 1):
+            rows = self.client.zrevrange(
+                f"{KEY_PREFIX}:demand:{h}", 0, -1, withscores=True
+            )
+            for sid, score in rows:
+                demand[sid] = demand.get(sid, 0.0) + float(score)
+        ranked = sorted(demand.items(), key=lambda kv: kv[1], reverse=True)[:limit]
+        specs: List[Tuple[QuizSpec, float]] = []
+        for sid, score in ranked:
+            data = self.client.hgetall(f"{KEY_PREFIX}:spec:{sid}")
+            if data:
+                specs.append(
+                    (
+                        QuizSpec(
+                            topic=data["topic"],
+                            num_questions=int(data["num_questions"]),
+                            difficulty=data["difficulty"],
+                            style=data["style"],
+                        ),
+                        score,
+                    )
+                )
+        return specs
+
+    def depth(self, spec: QuizSpec) -> int:
+        return int(self.client.llen(self._items_key(spec.id)))
+
+    def seed(self, specs: List[QuizSpec], demand: float = 1.0) -> None:
+        """Register specs as requested once (cold start before real demand)."""
+        demand_key = f"{KEY_PREFIX}:demand:{self._hour()}"
+        pipe = self.client.pipeline(transaction=False)
+        for spec in specs:
+            pipe.hset(f"{KEY_PREFIX}:spec:{spec.id}", mapping=asdict(spec))
+            pipe.zincrby(demand_key, demand, spec.id)
+        pipe.expire(demand_key, (DEMAND_WINDOW_HOURS + 1) * 3600)
+        pipe.execute()
+
+
+def load_seed_specs(path: str) -> List[QuizSpec]:
+    """Specs from a CSV with topic,num_questions,difficulty,style columns."""
+    with open(path, newline="", encoding="utf-8") as f:
+        specs = {
+            QuizSpec(
+                row["topic"],
+                int(row["num_questions"]),
+                row["difficulty"],
+                row["style"],
+            )
+            for row in csv.DictReader(f)
+        }
+    return sorted(specs, key=lambda s: s.id)
+
+
+def generate_live(
+    pool: QuizPool, username: str, spec: QuizSpec, generate: Generator
+) -> Dict[str, Any]:
+    """
+    Generate now (pool miss) and offer the quiz to the pool; identical
+    concurrent misses share one generation (see QuizPool.coalesce).
+    """
+
+    def _produce() -> Produced:
+        quiz = generate(spec.topic, spec.num_questions, spec.difficulty, spec.style)
+        pool.stats.live_generated += 1
+        return quiz, pool.offer(spec, quiz, username)
+
+    return pool.coalesce(username, spec, _produce)
+
+
+async def agenerate_live(
+    pool: QuizPool,
+    username: str,
+    spec: QuizSpec,
+    generate: Generator,
+    run_blocking: Callable[..., Any],
+) -> Dict[str, Any]:
+    """
+    `generate_live` for the worker: only the LLM call and the pool write use
+    `run_blocking` threads, waiting on another flight does not.
+    """
+
+    async def _produce() -> Produced:
+        quiz = await run_blocking(
+            generate, spec.topic, spec.num_questions, spec.difficulty, spec.style
+        )
+        pool.stats.live_generated += 1
+        return quiz, await run_blocking(pool.offer, spec, quiz, username)
+
+    return await pool.acoalesce(username, spec, _produce)
+
+
+def serve_quiz(
+    pool: QuizPool, username: str, spec: QuizSpec, generate: Generator
+) -> Dict[str, Any]:
+    """Pooled quiz for `username`, or a live one (then offered to the pool)."""
+    entry = pool.take(username, spec)
+    if entry is not None:
+        return entry
+    return generate_live(pool, username, spec, generate)
+
+
+async def fill_once(
+    pool: QuizPool,
+    generate: Generator,
+    run_blocking: Callable[..., Any],
+    hot_specs: int = 20,
+    batch: int = 4,
+    stop_event: Optional[asyncio.Event] = None,
+) -> int:
+    """One filler pass; returns the number of quizzes added."""
+    added = 0
+    for spec, demand in await run_blocking(pool.hot_specs, hot_specs):
+        missing = pool.target_depth(demand) - await run_blocking(pool.depth, spec)
+        for _ in range(min(missing, batch)):
+            if stop_event is not None and stop_event.is_set():
+                return added
+            try:
+                quiz = await run_blocking(
+                    generate,
+                    spec.topic,
+                    spec.num_questions,
+                    spec.difficulty,
+                    spec.style,
+                )
+            except Exception as e:
+                pool.stats.errors += 1
+                logger.warning(f"Quiz pool fill failed for {spec}: {e}")
+                break
+            if await run_blocking(pool.offer, spec, quiz) is not None:
+                added += 1
+                pool.stats.filled += 1
+    return added
+
+
+async def run_filler(
+    pool: QuizPool,
+    generate: Generator,
+    run_blocking: Callable[..., Any],
+    stop_event: asyncio.Event,
+) -> None:
+    if quizz_settings.QUIZ_POOL_SEED_FILE:
+        try:
+            specs = load_seed_specs(quizz_settings.QUIZ_POOL_SEED_FILE)
+            await run_blocking(pool.seed, specs)
+            logger.info(f"Quiz pool seeded with {len(specs)} specs")
+        except Exception as e:
+            logger.warning(f"Quiz pool seeding failed: {e}")
+    while not stop_event.is_set():
+        try:
+            added = await fill_once(
+                pool,
+                generate,
+                run_blocking,
+                quizz_settings.QUIZ_POOL_HOT_SPECS,
+                quizz_settings.QUIZ_POOL_FILL_BATCH,
+                stop_event,
+            )
+            if added:
+                logger.info(f"Quiz pool filler added {added} quizzes")
+        except Exception as e:
+            pool.stats.errors += 1
+            logger.warning(f"Quiz pool filler pass failed: {e}")
+        try:
+            await asyncio.wait_for(
+                stop_event.wait(), quizz_settings.QUIZ_POOL_FILL_INTERVAL_SECONDS
+            )
+        except asyncio.TimeoutError:
+            pass
+
+
+quiz_pool = QuizPool(
+    redis_client,
+    aclient=async_redis_client,
+    min_depth=quizz_settings.QUIZ_POOL_MIN_DEPTH,
+    max_depth=quizz_settings.QUIZ_POOL_MAX_DEPTH,
+    depth_per_request=quizz_settings.QUIZ_POOL_DEPTH_PER_REQUEST,
+    seen_ttl_seconds=quizz_settings.QUIZ_POOL_SEEN_TTL_SECONDS,
+    enabled=quizz_settings.QUIZ_POOL_ENABLED,
+    single_flight=quizz_settings.QUIZ_SINGLE_FLIGHT_ENABLED,
+    flight_scope=quizz_settings.QUIZ_SINGLE_FLIGHT_SCOPE,
+    flight_lock_ttl_seconds=quizz_settings.QUIZ_SINGLE_FLIGHT_LOCK_TTL_SECONDS,
+    flight_wait_seconds=quizz_settings.QUIZ_SINGLE_FLIGHT_WAIT_SECONDS,
+    max_sync_waiters=quizz_settings.QUIZ_SINGLE_FLIGHT_MAX_SYNC_WAITERS,
+)
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -26,11 +28,58 @@ class Settings(BaseSettings):
     RABBITMQ_DLX_NAME: str = "app.dlx"
     RABBITMQ_DLQ_NAME: str = "quiz.create.dlq"
     RABBITMQ_PREFETCH: int = 16
+    # Messages processed concurrently per process (<= prefetch) and how long
+    # shutdown waits for them before requeueing
+    RABBITMQ_CONSUMER_CONCURRENCY: int = 8
+    RABBITMQ_DRAIN_TIMEOUT_SECONDS: float = 30.0
+    # Threads for the sync calls left in the consumers (DB, sync Redis, LLM)
+    # and event loop lag above which a warning is logged
+    BLOCKING_POOL_SIZE: int = 8
+    LOOP_LAG_WARN_MS: float = 200.0
     DB_NAME: str = "Quizz"
     DB_PORT: int
     PG_PASSWORD: str
     USERNAME: str
     HOST: str
 
+    # Shared LLM HTTP pool, per model: max concurrent requests + keep-alive
+    LLM_MAX_CONNECTIONS: int = 32
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 16
+    LLM_KEEPALIVE_EXPIRY_SECONDS: float = 60.0
+    # Generate quizzes with structured output (GeneratedQuiz schema); False
+    # parses the plain-text reply. Both go through the tolerant parser.
+    QUIZ_STRUCTURED_OUTPUT: bool = True
+
+    # Pool of pre-generated quizzes per (topic, num_questions, difficulty,
+    # style): target depth = demand of the last 2h * DEPTH_PER_REQUEST,
+    # clamped to [MIN_DEPTH, MAX_DEPTH]; the worker tops up the HOT_SPECS
+    # most requested specs every FILL_INTERVAL (at most FILL_BATCH each)
+    QUIZ_POOL_ENABLED: bool = True
+    QUIZ_POOL_MIN_DEPTH: int = 3
+    QUIZ_POOL_MAX_DEPTH: int = 20
+    QUIZ_POOL_DEPTH_PER_REQUEST: float = 0.5
+    QUIZ_POOL_HOT_SPECS: int = 20
+    QUIZ_POOL_FILL_INTERVAL_SECONDS: float = 30.0
+    QUIZ_POOL_FILL_BATCH: int = 4
+    # How long a user is not served a quiz they already got
+    QUIZ_POOL_SEEN_TTL_SECONDS: int = 30 * 24 * 3600
+    # Optional CSV (topic,num_questions,difficulty,style) warmed at startup
+    QUIZ_POOL_SEED_FILE: str | None = None
+    # Single-flight for live generation: identical concurrent misses wait on
+    # one LLM call. Scope "spec" shares that quiz between users asking the
+    # same spec; "user" only coalesces a user's duplicate requests
+    QUIZ_SINGLE_FLIGHT_ENABLED: bool = True
+    QUIZ_SINGLE_FLIGHT_SCOPE: Literal["spec", "user"] = "spec"
+    QUIZ_SINGLE_FLIGHT_LOCK_TTL_SECONDS: int = 120
+    QUIZ_SINGLE_FLIGHT_WAIT_SECONDS: float = 90.0
+    # Sync HTTP requests waiting on a flight hold a threadpool thread each;
+    # past this many waiters a request generates on its own instead
+    QUIZ_SINGLE_FLIGHT_MAX_SYNC_WAITERS: int = 8
+
+    # Push job status: max lifetime of a /jobs/{id}/events SSE stream and max
+    # server-side wait of the /jobs/{id}/wait long-poll
+    JOB_SSE_MAX_SECONDS: float = 300.0
+    JOB_LONG_POLL_MAX_SECONDS: float = 30.0
+
 
 quizz_settings = Settings()
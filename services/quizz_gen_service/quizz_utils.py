@@ -6,13 +6,16 @@ from typing import TYPE_CHECKING
 # Compat imports para pytest/CI e execuçāo em contentores
 if TYPE_CHECKING:
     from services.quizz_gen_service.quizz_settings import quizz_settings as quizz_cfg
+    from services.quizz_gen_service.llm_registry import LLMClientRegistry
 else:
     try:
         from services.quizz_gen_service.quizz_settings import (
             quizz_settings as quizz_cfg,
         )
+        from services.quizz_gen_service.llm_registry import LLMClientRegistry
     except Exception:  # pragma: no cover
         from quizz_settings import quizz_settings as quizz_cfg
+        from llm_registry import LLMClientRegistry
 from fastapi import HTTPException, status
 
 
@@ -87,6 +90,13 @@ Now generate the quiz:
 )
 
 
+llm_registry = LLMClientRegistry(
+    max_connections=quizz_cfg.LLM_MAX_CONNECTIONS,
+    max_keepalive_connections=quizz_cfg.LLM_MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry=quizz_cfg.LLM_KEEPALIVE_EXPIRY_SECONDS,
+)
+
+
 def get_llm(
     model_name: str = "gpt-4o-mini",
     temperature: float = 0.2,
@@ -99,14 +109,14 @@ def get_llm(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="OPENAI_API_KEY is not configured in the environment.",
         )
-    llm = ChatOpenAI(
-        model=model_name,
-        temperature=temperature,
-        api_key=api_key,
+    # Cliente partilhado (pool HTTP keep-alive) em vez de um novo por pedido
+    return llm_registry.get(
+        model_name,
+        temperature,
         timeout=timeout,
         max_retries=max_retries,
+        api_key=api_key,
     )
-    return llm
 
 
 def format_quizz_prompt(
@@ -6,6 +6,7 @@ from fastapi.testclient import TestClient
 from services.quizz_gen_service import main as q_main
 from services.quizz_gen_service.quizz_settings import quizz_settings
 from services.quizz_gen_service.data_models import User
+from services.quizz_gen_service.history_index import index_key, record
 
 pytestmark = pytest.mark.integration
 
@@ -25,10 +26,12 @@ def _redis_client(monkeypatch):
     # clean any test keys
     for k in list(r.scan_iter("quizz_request:u:*")):
         r.delete(k)
+    r.delete(index_key("quizz_request", "u"))
     monkeypatch.setattr(q_main, "redis_client", r, raising=True)
     yield
     for k in list(r.scan_iter("quizz_request:u:*")):
         r.delete(k)
+    r.delete(index_key("quizz_request", "u"))
 
 
 @pytest.fixture()
@@ -56,6 +59,8 @@ def test_get_quizz_questions_lists_values(client):
     r: redis.Redis = q_main.redis_client
     r.set("quizz_request:u:1", json.dumps(["Q1", "Q2"]))
     r.set("quizz_request:u:2", json.dumps(["Q3"]))
+    record(r, "quizz_request", "u", "quizz_request:u:1", 3600)
+    record(r, "quizz_request", "u", "quizz_request:u:2", 3600)
 
     res = client.get("/get-quizz-questions", headers={"Authorization": "Bearer dummy"})
     assert res.status_code == 200
@@ -1,15 +1,34 @@
 import json
 import pytest
 from fastapi.testclient import TestClient
+from fnmatch import fnmatch
 
 from services.quizz_gen_service import main as main_mod
 from services.quizz_gen_service.data_models import User
-from fnmatch import fnmatch
+from services.quizz_gen_service import history_index
+from services.quizz_gen_service.history_index import HistoryPage, backfill, record
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, name):
+        def _queue(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+
+        return _queue
+
+    def execute(self):
+        return [getattr(self.redis, n)(*a, **k) for n, a, k in self.calls]
 
 
 class FakeRedis:
     def __init__(self):
         self.store = {}
+        self.zsets = {}
 
     def get(self, key):
         return self.store.get(key)
@@ -17,13 +36,37 @@ class FakeRedis:
     def setex(self, key, ttl, value):
         self.store[key] = value
 
-    def scan(self, cursor=0, match=None, count=10):
-        keys = [k for k in self.store.keys() if match is None or fnmatch(k, match)]
-        return 0, keys[:count]
-
     def mget(self, keys):
         return [self.store.get(k) for k in keys]
 
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def zadd(self, key, mapping, nx=False):
+        z = self.zsets.setdefault(key, {})
+        z.update({k: v for k, v in mapping.items() if not (nx and k in z)})
+
+    def scan_iter(self, match=None, count=None):
+        return [k for k in self.store if match is None or fnmatch(k, match)]
+
+    def zremrangebyrank(self, key, start, end):
+        return 0
+
+    def expire(self, key, ttl):
+        return True
+
+    def zcard(self, key):
+        return len(self.zsets.get(key, {}))
+
+    def zrevrange(self, key, start, end):
+        z = self.zsets.get(key, {})
+        ordered = sorted(z, key=z.get, reverse=True)
+        return ordered[start : end + 1]
+
+    def zrem(self, key, *members):
+        for m in members:
+            self.zsets.get(key, {}).pop(m, None)
+
 
 @pytest.fixture(autouse=True)
 def client_with_user(monkeypatch):
@@ -117,9 +160,10 @@ def test_submit_answers_success_publishes(client_with_user, fake_redis, monkeypa
 
 
 def test_get_quizz_questions_returns_values(client_with_user, fake_redis, monkeypatch):
-    # simula duas entradas cacheadas
-    fake_redis.setex("quizz_request:u:hash1", 10, json.dumps(["Q1"]))
-    fake_redis.setex("quizz_request:u:hash2", 10, json.dumps(["Q2"]))
+    # simula duas entradas cacheadas (e indexadas, como em /generate-quiz)
+    for i, key in enumerate(["quizz_request:u:hash1", "quizz_request:u:hash2"]):
+        fake_redis.setex(key, 10, json.dumps([f"Q{i + 1}"]))
+        record(fake_redis, "quizz_request", "u", key, 10, created_at=i)
 
     resp = client_with_user.get(
         "/get-quizz-questions", headers={"Authorization": "Bearer t"}
@@ -130,3 +174,63 @@ def test_get_quizz_questions_returns_values(client_with_user, fake_redis, monkey
     assert isinstance(values, list)
     assert any('"Q1"' in v for v in values if v)
     assert any('"Q2"' in v for v in values if v)
+
+
+def test_get_quizz_questions_paginates_index_newest_first(client_with_user, fake_redis):
+    for i in range(5):
+        key = f"quizz_request:u:hash{i}"
+        fake_redis.setex(key, 10, json.dumps([f"Q{i}"]))
+        record(fake_redis, "quizz_request", "u", key, 10, created_at=i)
+    # Outro user e uma entrada já expirada não aparecem
+    fake_redis.setex("quizz_request:other:x", 10, json.dumps(["X"]))
+    record(fake_redis, "quizz_request", "other", "quizz_request:other:x", 10)
+    record(fake_redis, "quizz_request", "u", "quizz_request:u:gone", 10, 9)
+
+    resp = client_with_user.get(
+        "/get-quizz-questions",
+        params={"offset": 0, "limit": 3},
+        headers={"Authorization": "Bearer t"},
+    )
+
+    assert resp.status_code == 200
+    # A expirada sai do índice e a página é completada com a seguinte
+    assert resp.json() == [json.dumps([f"Q{i}"]) for i in (4, 3, 2)]
+    assert resp.headers["X-History-Source"] == "redis"
+    assert resp.headers["X-Total-Count"] == "5"
+
+
+def test_get_quizz_questions_past_a_trimmed_index_reads_postgres(
+    client_with_user, fake_redis, monkeypatch
+):
+    monkeypatch.setattr(history_index, "HISTORY_MAX_ENTRIES", 3)
+    for i in range(3):
+        key = f"quizz_request:u:hash{i}"
+        fake_redis.setex(key, 10, json.dumps([f"Q{i}"]))
+        record(fake_redis, "quizz_request", "u", key, 10, created_at=i)
+    older = HistoryPage([json.dumps(["old"])], 4, "postgres")
+    monkeypatch.setattr(main_mod, "quizz_history", lambda *a: older)
+
+    def _page(offset, limit):
+        return client_with_user.get(
+            "/get-quizz-questions",
+            params={"offset": offset, "limit": limit},
+            headers={"Authorization": "Bearer t"},
+        )
+
+    assert _page(0, 3).headers["X-History-Source"] == "redis"
+    resp = _page(3, 1)
+    assert resp.headers["X-History-Source"] == "postgres"
+    assert resp.json() == [json.dumps(["old"])]
+
+
+def test_backfill_indexes_keys_cached_before_the_index(fake_redis):
+    fake_redis.setex("quizz_request:u:old", 10, json.dumps(["Q0"]))
+    fake_redis.setex("quizz_request:v:old", 10, json.dumps(["X"]))
+    fake_redis.setex("quizz_request:u:new", 10, json.dumps(["Q1"]))
+    record(fake_redis, "quizz_request", "u", "quizz_request:u:new", 10, created_at=5)
+
+    assert backfill(fake_redis, "quizz_request") == {"u": 2, "v": 1}
+
+    page = history_index.read_page(fake_redis, "quizz_request", "u", 0, 10)
+    # As antigas ficam atrás das já indexadas, que mantêm o score
+    assert page.items == [json.dumps(["Q1"]), json.dumps(["Q0"])]
@@ -4,6 +4,12 @@ from fastapi.testclient import TestClient
 
 from services.quizz_gen_service import main as main_mod
 from services.quizz_gen_service.data_models import User
+from services.quizz_gen_service.quiz_pool import QuizPool
+
+
+@pytest.fixture(autouse=True)
+def no_quiz_pool(monkeypatch):
+    monkeypatch.setattr(main_mod, "quiz_pool", QuizPool(None, enabled=False))
 
 
 class FailingRedis:
@@ -2,6 +2,13 @@ import json
 import pytest
 
 from services.quizz_gen_service import generator_consumer as gc
+from services.quizz_gen_service.quiz_parser import QuizParseError
+from services.quizz_gen_service.quiz_pool import QuizPool
+
+
+@pytest.fixture(autouse=True)
+def no_quiz_pool(monkeypatch):
+    monkeypatch.setattr(gc, "quiz_pool", QuizPool(None, enabled=False))
 
 
 class FakeRedis:
@@ -60,3 +67,82 @@ async def test_handle_message_updates_quizz_job_key(monkeypatch):
     data = json.loads(fake_redis.store["Quizz:u:job-123"])
     assert data["status"] == "done"
     assert data["questions"] == ["Q1", "Q2"]
+
+
+@pytest.mark.asyncio
+async def test_unparseable_reply_fails_the_job_without_retrying(monkeypatch):
+    fake_redis = FakeRedis()
+    monkeypatch.setattr(gc, "redis_client", fake_redis, raising=True)
+    calls = []
+
+    def unparseable(*args):
+        calls.append(args)
+        raise QuizParseError("no quiz in reply")
+
+    monkeypatch.setattr(gc, "quizz_generator", unparseable, raising=True)
+    monkeypatch.setattr(gc, "store_quizz", lambda **kwargs: None, raising=True)
+
+    message = FakeMessage(
+        {
+            "quizz_id": "job-9",
+            "username": "u",
+            "topic": "t",
+            "num_questions": 2,
+            "difficulty": "easy",
+            "style": "conceptual",
+        }
+    )
+
+    await gc._handle_message(message)
+
+    assert len(calls) == 1
+    data = json.loads(fake_redis.store["Quizz:u:job-9"])
+    assert data == {"status": "failed", "error": "no quiz in reply"}
+
+
+@pytest.mark.asyncio
+async def test_invalid_payload_fails_the_job(monkeypatch):
+    fake_redis = FakeRedis()
+    monkeypatch.setattr(gc, "redis_client", fake_redis, raising=True)
+
+    await gc._handle_message(FakeMessage({"quizz_id": "job-7", "username": "u"}))
+
+    data = json.loads(fake_redis.store["Quizz:u:job-7"])
+    assert data["status"] == "failed"
+
+
+@pytest.mark.asyncio
+async def test_store_failure_retries_the_store_with_the_same_quiz(monkeypatch):
+    fake_redis = FakeRedis()
+    monkeypatch.setattr(gc, "redis_client", fake_redis, raising=True)
+    generated, stored = [], []
+
+    def generate(*args):
+        generated.append(args)
+        return {"questions": [f"Q{len(generated)}"], "tags": []}
+
+    def store(**kwargs):
+        if not stored:
+            stored.append(None)
+            raise RuntimeError("db down")
+        stored.append(kwargs["questions"])
+
+    monkeypatch.setattr(gc, "quizz_generator", generate, raising=True)
+    monkeypatch.setattr(gc, "store_quizz", store, raising=True)
+
+    await gc._handle_message(
+        FakeMessage(
+            {
+                "quizz_id": "job-8",
+                "username": "u",
+                "topic": "t",
+                "num_questions": 1,
+                "difficulty": "easy",
+                "style": "conceptual",
+            }
+        )
+    )
+
+    assert len(generated) == 1
+    assert stored == [None, ["Q1"]]
+    assert json.loads(fake_redis.store["Quizz:u:job-8"])["questions"] == ["Q1"]
\ No newline at end of file
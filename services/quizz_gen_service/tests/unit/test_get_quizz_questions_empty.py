@@ -3,14 +3,21 @@ from fastapi.testclient import TestClient
 
 from services.quizz_gen_service import main as main_mod
 from services.quizz_gen_service.data_models import User
+from services.quizz_gen_service.history_index import HistoryPage
 
 
 class FakeRedisEmpty:
-    def scan(self, cursor=0, match=None, count=10):
-        return 0, []
+    def pipeline(self, transaction=True):
+        return self
 
-    def mget(self, keys):
-        return []
+    def zcard(self, key):
+        return self
+
+    def zrevrange(self, key, start, end):
+        return self
+
+    def execute(self):
+        return [0, []]
 
 
 @pytest.fixture(autouse=True)
@@ -26,8 +33,38 @@ def client_with_user(monkeypatch):
 
 def test_get_quizz_questions_empty_returns_message(client_with_user, monkeypatch):
     monkeypatch.setattr(main_mod, "redis_client", FakeRedisEmpty())
+    monkeypatch.setattr(
+        main_mod, "quizz_history", lambda *a: HistoryPage([], 0, "postgres")
+    )
     resp = client_with_user.get(
         "/get-quizz-questions", headers={"Authorization": "Bearer t"}
     )
     assert resp.status_code == 200
     assert resp.json() == "No keys found for the pattern."
+
+
+def test_get_quizz_questions_falls_back_to_postgres(client_with_user, monkeypatch):
+    class RedisDown:
+        def pipeline(self, transaction=True):
+            raise ConnectionError("redis down")
+
+    calls = []
+
+    def _history(username, offset, limit):
+        calls.append((username, offset, limit))
+        return HistoryPage(['{"questions": ["Q1"], "tags": []}'], 7, "postgres")
+
+    monkeypatch.setattr(main_mod, "redis_client", RedisDown())
+    monkeypatch.setattr(main_mod, "quizz_history", _history)
+
+    resp = client_with_user.get(
+        "/get-quizz-questions",
+        params={"offset": 5, "limit": 2},
+        headers={"Authorization": "Bearer t"},
+    )
+
+    assert resp.status_code == 200
+    assert resp.json() == ['{"questions": ["Q1"], "tags": []}']
+    assert calls == [("u", 5, 2)]
+    assert resp.headers["X-History-Source"] == "postgres"
+    assert resp.headers["X-Total-Count"] == "7"
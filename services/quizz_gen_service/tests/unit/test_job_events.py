@@ -0,0 +1,178 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from services.quizz_gen_service import generator_consumer as gc
+from services.quizz_gen_service import job_events
+from services.quizz_gen_service import main as main_mod
+from services.quizz_gen_service.data_models import User
+from services.quizz_gen_service.quiz_pool import QuizPool
+
+
+class StreamStore:
+    """Streams partilhados pelos clientes sync e async falsos."""
+
+    def __init__(self):
+        self.streams = {}
+        self.seq = 0
+
+    def xadd(self, key, fields):
+        self.seq += 1
+        event_id = f"{self.seq}-0"
+        self.streams.setdefault(key, []).append((event_id, dict(fields)))
+        return event_id
+
+    def after(self, key, last_id):
+        last = int(last_id.split("-")[0])
+        return [e for e in self.streams.get(key, []) if int(e[0].split("-")[0]) > last]
+
+
+class _SyncPipeline:
+    def __init__(self, store):
+        self.store = store
+        self.ops = []
+
+    def xadd(self, key, fields, maxlen=None, approximate=True):
+        self.ops.append(lambda: self.store.xadd(key, fields))
+        return self
+
+    def expire(self, key, ttl):
+        return self
+
+    def execute(self):
+        return [op() for op in self.ops]
+
+
+class SyncRedis:
+    def __init__(self, store):
+        self.store = store
+        self.values = {}
+
+    def pipeline(self, transaction=True):
+        return _SyncPipeline(self.store)
+
+    def setex(self, key, ttl, value):
+        self.values[key] = value
+
+
+class AsyncRedis:
+    def __init__(self, store):
+        self.store = store
+
+    async def xread(self, streams, count=None, block=None):
+        ((key, last_id),) = streams.items()
+        waited = 0.0
+        while True:
+            entries = self.store.after(key, last_id)
+            if entries or block is None or waited * 1000 >= block:
+                return [[key, entries]] if entries else []
+            await asyncio.sleep(0.01)
+            waited += 0.01
+
+
+KEY = "Quizz:u:job-1"
+
+
+@pytest.fixture
+def store():
+    return StreamStore()
+
+
+def test_publish_never_raises_without_redis():
+    job_events.publish_event(object(), KEY, {"status": "queued"})
+
+
+@pytest.mark.asyncio
+async def test_wait_event_returns_current_then_next_status(store):
+    sync, client = SyncRedis(store), AsyncRedis(store)
+    job_events.publish_event(sync, KEY, {"status": "queued"})
+
+    current = await job_events.wait_event(client, KEY, "0", timeout=1)
+    assert current["status"] == "queued"
+
+    async def _later():
+        await asyncio.sleep(0.05)
+        job_events.publish_event(sync, KEY, {"status": "processing"})
+
+    task = asyncio.create_task(_later())
+    nxt = await job_events.wait_event(client, KEY, current["event_id"], timeout=2)
+    await task
+    assert nxt["status"] == "processing"
+
+    assert await job_events.wait_event(client, KEY, nxt["event_id"], 0.05) is None
+
+
+@pytest.mark.asyncio
+async def test_sse_stream_ends_after_terminal_status(store):
+    sync, client = SyncRedis(store), AsyncRedis(store)
+    for status in ("queued", "processing", "done"):
+        job_events.publish_event(sync, KEY, {"status": status})
+
+    chunks = [c async for c in job_events.sse_events(client, KEY, max_seconds=2)]
+
+    statuses = [json.loads(c.split("data: ")[1])["status"] for c in chunks]
+    assert statuses == ["queued", "processing", "done"]
+    assert chunks[0].startswith("id: 1-0\nevent: status\n")
+
+    # Retoma a partir do Last-Event-ID sem repetir eventos
+    resumed = [c async for c in job_events.sse_events(client, KEY, "2-0", 2)]
+    assert len(resumed) == 1 and '"done"' in resumed[0]
+
+
+@pytest.mark.asyncio
+async def test_consumer_publishes_status_transitions(store, monkeypatch):
+    sync = SyncRedis(store)
+    monkeypatch.setattr(gc, "redis_client", sync)
+    monkeypatch.setattr(gc, "quiz_pool", QuizPool(None, enabled=False))
+    monkeypatch.setattr(
+        gc, "quizz_generator", lambda *a: {"questions": ["Q1"], "tags": ["t"]}
+    )
+    monkeypatch.setattr(gc, "store_quizz", lambda **kwargs: None)
+
+    class _Ctx:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+    class Message:
+        body = json.dumps(
+            {
+                "quizz_id": "job-1",
+                "username": "u",
+                "topic": "t",
+                "num_questions": 1,
+                "difficulty": "easy",
+                "style": "conceptual",
+            }
+        ).encode()
+
+        def process(self, requeue=False):
+            return _Ctx()
+
+    await gc._handle_message(Message())
+
+    events = [json.loads(f["event"]) for _, f in store.streams["jobs:" + KEY]]
+    assert [e["status"] for e in events] == ["processing", "done"]
+    assert events[-1]["questions"] == ["Q1"]
+
+
+def test_wait_endpoint_returns_204_without_news(store, monkeypatch):
+    monkeypatch.setattr(main_mod, "async_redis_client", AsyncRedis(store))
+
+    async def _fake_user():
+        return User(username="u", email="e", disabled=False)
+
+    main_mod.app.dependency_overrides[main_mod.get_current_active_user] = _fake_user
+    client = TestClient(main_mod.app)
+
+    resp = client.get("/jobs/job-1/wait", params={"timeout": 0.05})
+    assert resp.status_code == 204
+
+    job_events.publish_event(SyncRedis(store), KEY, {"status": "queued"})
+    resp = client.get("/jobs/job-1/wait", params={"timeout": 0.05})
+    assert resp.status_code == 200
+    assert resp.json() == {"event_id": "1-0", "status": "queued"}
@@ -0,0 +1,100 @@
+from types import SimpleNamespace
+
+import pytest
+
+from services.quizz_gen_service import model as model_mod
+from services.quizz_gen_service import quiz_parser
+from services.quizz_gen_service.data_models import GeneratedQuiz
+from services.quizz_gen_service.quiz_parser import (
+    QuizParseError,
+    QuizParseStats,
+    parse_quiz,
+)
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch):
+    stats = QuizParseStats()
+    monkeypatch.setattr(quiz_parser, "parse_stats", stats)
+    return stats
+
+
+@pytest.mark.parametrize(
+    "reply",
+    [
+        '{"questions": ["1. Q1", "2. Q2"], "tags": ["calculus"]}',
+        '```json\n{"questions": ["1. Q1", "2. Q2"], "tags": ["calculus"]}\n```',
+        'Here is your quiz:\n{"questions": ["1. Q1", "2. Q2"], "tags": ["calculus"]}',
+        "{'questions': ['1. Q1', '2. Q2'], 'tags': ['calculus']}",
+        '{"questions": ["1. Q1", "2. Q2",], "tags": ["calculus",],}',
+        "{“questions”: [“1. Q1”, “2. Q2”], “tags”: [“calculus”]}",
+    ],
+)
+def test_parse_quiz_repairs_near_misses(reply):
+    quiz = parse_quiz(reply)
+    assert quiz.questions == ["1. Q1", "2. Q2"]
+    assert quiz.tags == ["calculus"]
+
+
+def test_parse_quiz_keeps_curly_quotes_inside_values():
+    reply = '```json\n{"questions": ["1. What is the “pivot” row?"], "tags": []}\n```'
+    quiz = parse_quiz(reply)
+    assert quiz.questions == ["1. What is the “pivot” row?"]
+
+
+def test_parse_quiz_accepts_a_bare_question_list(fresh_stats):
+    quiz = parse_quiz('["1. Q1", "  ", "2. Q2"]')
+    assert quiz.questions == ["1. Q1", "2. Q2"]
+    assert quiz.tags == []
+    assert fresh_stats.parsed == 1
+
+
+@pytest.mark.parametrize(
+    "reply", ["Sorry, I cannot help with that.", '{"questions": [], "tags": []}']
+)
+def test_parse_quiz_rejects_non_quizzes(reply, fresh_stats):
+    with pytest.raises(QuizParseError):
+        parse_quiz(reply)
+    assert fresh_stats.as_dict()["failure_rate"] == 1.0
+
+
+class FakeStructuredLLM:
+    def __init__(self, result):
+        self.result = result
+        self.schema = None
+
+    def with_structured_output(self, schema, include_raw=False):
+        self.schema = schema
+        assert include_raw
+        return SimpleNamespace(invoke=lambda prompt, config=None: self.result)
+
+
+def test_generator_uses_structured_output(monkeypatch, fresh_stats):
+    llm = FakeStructuredLLM(
+        {"parsed": GeneratedQuiz(questions=["1. Q1"], tags=["t"]), "raw": None}
+    )
+    monkeypatch.setattr(model_mod.qmod, "get_llm", lambda: llm)
+
+    quiz = model_mod.quizz_generator("t", 1, "easy", "conceptual")
+
+    assert quiz == {"questions": ["1. Q1"], "tags": ["t"]}
+    assert llm.schema is GeneratedQuiz
+    assert fresh_stats.structured == 1
+
+
+def test_generator_repairs_raw_reply_without_calling_again(monkeypatch, fresh_stats):
+    raw = SimpleNamespace(
+        tool_calls=[],
+        invalid_tool_calls=[
+            {"args": '{"questions": ["1. Q1", "2. Q2",], "tags": ["t"]}'}
+        ],
+        content="",
+    )
+    llm = FakeStructuredLLM({"parsed": None, "raw": raw, "parsing_error": "bad"})
+    monkeypatch.setattr(model_mod.qmod, "get_llm", lambda: llm)
+
+    quiz = model_mod.quizz_generator("t", 2, "easy", "conceptual")
+
+    assert quiz["questions"] == ["1. Q1", "2. Q2"]
+    assert fresh_stats.repaired == 1
+    assert fresh_stats.failed == 0
@@ -0,0 +1,379 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from services.quizz_gen_service import generator_consumer as gc
+from services.quizz_gen_service import quiz_pool as qp
+from services.quizz_gen_service.quiz_pool import QuizPool, QuizSpec
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, name):
+        def _queue(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+
+        return _queue
+
+    def execute(self):
+        return [getattr(self.redis, n)(*a, **k) for n, a, k in self.calls]
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self._lock = threading.Lock()
+
+    def set(self, key, value, nx=False, ex=None):
+        with self._lock:
+            if nx and key in self.data:
+                return None
+            self.data[key] = value
+            return True
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def delete(self, *keys):
+        return sum(self.data.pop(k, None) is not None for k in keys)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def hset(self, key, mapping):
+        self.data.setdefault(key, {}).update({k: str(v) for k, v in mapping.items()})
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    def zincrby(self, key, amount, member):
+        z = self.data.setdefault(key, {})
+        z[member] = z.get(member, 0.0) + amount
+
+    def zrevrange(self, key, start, end, withscores=False):
+        z = self.data.get(key, {})
+        return sorted(z.items(), key=lambda kv: kv[1], reverse=True)
+
+    def expire(self, key, ttl):
+        return True
+
+    def lpush(self, key, value):
+        self.data.setdefault(key, []).insert(0, value)
+
+    def ltrim(self, key, start, end):
+        self.data[key] = self.data.get(key, [])[start : end + 1]
+
+    def lrange(self, key, start, end):
+        return list(self.data.get(key, []))
+
+    def llen(self, key):
+        return len(self.data.get(key, []))
+
+    def sadd(self, key, member):
+        s = self.data.setdefault(key, set())
+        if member in s:
+            return 0
+        s.add(member)
+        return 1
+
+    def smembers(self, key):
+        return set(self.data.get(key, set()))
+
+
+class FakeAsyncPipeline(FakePipeline):
+    async def execute(self):
+        return super().execute()
+
+
+class FakeAsyncRedis:
+    """Async view over a FakeRedis (same data as the sync client)."""
+
+    def __init__(self, redis):
+        self.redis = redis
+
+    def pipeline(self, transaction=True):
+        return FakeAsyncPipeline(self.redis)
+
+    def __getattr__(self, name):
+        async def _call(*args, **kwargs):
+            return getattr(self.redis, name)(*args, **kwargs)
+
+        return _call
+
+
+SPEC = QuizSpec("Linear Algebra", 2, "easy", "conceptual")
+
+
+def _quiz(n=2, tag="t"):
+    return {"questions": [f"Q{i}" for i in range(n)], "tags": [tag]}
+
+
+async def _inline(fn, *args, **kwargs):
+    return fn(*args, **kwargs)
+
+
+def test_spec_id_ignores_case_and_spacing():
+    other = QuizSpec("  linear   algebra ", 2, "Easy", "conceptual ")
+    assert other.id == SPEC.id
+    assert QuizSpec("Linear Algebra", 3, "easy", "conceptual").id != SPEC.id
+
+
+def test_take_serves_unseen_quizzes_once_per_user():
+    pool = QuizPool(FakeRedis())
+    first = pool.offer(SPEC, _quiz(tag="a"))
+    second = pool.offer(SPEC, _quiz(tag="b"))
+
+    got = [pool.take("u", SPEC)["id"] for _ in range(2)]
+    assert sorted(got) == sorted([first["id"], second["id"]])
+    assert pool.take("u", SPEC) is None
+    # Outro user continua a ter os dois disponíveis
+    assert pool.take("v", SPEC) is not None
+    assert pool.stats.hits == 3
+    assert pool.stats.exhausted == 1
+
+
+def test_offer_rejects_invalid_quizzes_and_trims_depth():
+    pool = QuizPool(FakeRedis(), max_depth=3)
+    assert pool.offer(SPEC, {"Output": "Error generating quiz"}) is None
+    assert pool.offer(SPEC, _quiz(n=3)) is None
+    assert pool.stats.invalid == 2
+    for _ in range(5):
+        pool.offer(SPEC, _quiz())
+    assert pool.depth(SPEC) == 3
+
+
+def test_serve_quiz_falls_back_to_live_generation():
+    pool = QuizPool(FakeRedis())
+    calls = []
+
+    def generate(topic, num_questions, difficulty, style):
+        calls.append(topic)
+        return _quiz()
+
+    quiz = qp.serve_quiz(pool, "u", SPEC, generate)
+    assert quiz["questions"] == ["Q0", "Q1"]
+    assert calls == ["Linear Algebra"]
+    # O quiz gerado fica no pool para outros users, mas não volta para "u"
+    assert pool.take("v", SPEC)["questions"] == ["Q0", "Q1"]
+    assert pool.take("u", SPEC) is None
+    assert pool.stats.live_generated == 1
+
+
+def test_take_degrades_when_redis_fails():
+    class Down:
+        def pipeline(self, transaction=True):
+            raise ConnectionError("redis down")
+
+    pool = QuizPool(Down())
+    assert pool.take("u", SPEC) is None
+    assert pool.stats.errors == 1
+
+
+def test_fill_once_tops_up_hot_specs_to_target_depth():
+    redis = FakeRedis()
+    pool = QuizPool(redis, min_depth=2, max_depth=10, depth_per_request=0.5)
+    cold = QuizSpec("Calculus", 2, "hard", "computational")
+    for _ in range(8):
+        pool.take("u", SPEC)
+    pool.take("u", cold)
+
+    added = asyncio.run(
+        qp.fill_once(pool, lambda *a: _quiz(), _inline, hot_specs=5, batch=10)
+    )
+
+    # demand 8 * 0.5 = 4 para a spec quente, mínimo 2 para a fria
+    assert pool.depth(SPEC) == 4
+    assert pool.depth(cold) == 2
+    assert added == 6
+    assert pool.stats.filled == 6
+
+
+def _concurrent(pool, users, generate):
+    results = {}
+
+    def _run(user):
+        results[user] = qp.generate_live(pool, user, SPEC, generate)
+
+    threads = [threading.Thread(target=_run, args=(u,)) for u in users]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def _slow_generator(calls):
+    def generate(topic, num_questions, difficulty, style):
+        calls.append(topic)
+        time.sleep(0.2)
+        return _quiz(tag=f"gen{len(calls)}")
+
+    return generate
+
+
+def test_identical_concurrent_misses_share_one_generation():
+    pool = QuizPool(FakeRedis(), flight_poll_seconds=0.01)
+    calls = []
+
+    results = _concurrent(pool, ["a", "b", "c", "d", "e"], _slow_generator(calls))
+
+    assert len(calls) == 1
+    assert {r["tags"][0] for r in results.values()} == {"gen1"}
+    assert pool.stats.flights == 1
+    assert pool.stats.coalesced == 4
+    # Nenhum dos cinco volta a receber o mesmo quiz do pool
+    assert all(pool.take(u, SPEC) is None for u in results)
+
+
+def test_user_scope_only_coalesces_the_same_user():
+    pool = QuizPool(FakeRedis(), flight_scope="user", flight_poll_seconds=0.01)
+    calls = []
+
+    _concurrent(pool, ["a", "b"], _slow_generator(calls))
+
+    assert len(calls) == 2
+    assert pool.stats.coalesced == 0
+
+
+def test_followers_take_over_when_the_leader_fails():
+    pool = QuizPool(FakeRedis(), flight_poll_seconds=0.01)
+    calls = []
+
+    def generate(*args):
+        calls.append(args)
+        time.sleep(0.1)
+        if len(calls) == 1:
+            raise RuntimeError("llm down")
+        return _quiz()
+
+    results = {}
+
+    def _run(user):
+        try:
+            results[user] = qp.generate_live(pool, user, SPEC, generate)
+        except RuntimeError as e:
+            results[user] = e
+
+    threads = [threading.Thread(target=_run, args=(u,)) for u in ("a", "b", "c")]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sum(isinstance(r, RuntimeError) for r in results.values()) == 1
+    assert len(calls) == 2
+    assert pool.stats.coalesced == 1
+
+
+@pytest.mark.asyncio
+async def test_async_waiters_share_one_generation_without_holding_threads():
+    redis = FakeRedis()
+    pool = QuizPool(redis, aclient=FakeAsyncRedis(redis), flight_poll_seconds=0.01)
+    calls = []
+    # Um só thread: se os seguidores esperassem em threads, o líder não corria
+    executor = ThreadPoolExecutor(max_workers=1)
+
+    async def run_blocking(fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+
+    try:
+        results = await asyncio.wait_for(
+            asyncio.gather(
+                *(
+                    qp.agenerate_live(
+                        pool, u, SPEC, _slow_generator(calls), run_blocking
+                    )
+                    for u in ("a", "b", "c", "d")
+                )
+            ),
+            timeout=5,
+        )
+    finally:
+        executor.shutdown()
+
+    assert len(calls) == 1
+    assert {r["tags"][0] for r in results} == {"gen1"}
+    assert pool.stats.coalesced == 3
+    assert all(pool.take(u, SPEC) is None for u in ("a", "b", "c", "d"))
+
+
+def test_sync_waiters_are_capped():
+    pool = QuizPool(FakeRedis(), flight_poll_seconds=0.01, max_sync_waiters=1)
+    calls = []
+    results = {}
+    generate = _slow_generator(calls)
+
+    def _run(user):
+        results[user] = qp.generate_live(pool, user, SPEC, generate)
+
+    leader = threading.Thread(target=_run, args=("a",))
+    leader.start()
+    time.sleep(0.05)
+    followers = [threading.Thread(target=_run, args=(u,)) for u in ("b", "c")]
+    for t in followers:
+        t.start()
+    for t in [leader, *followers]:
+        t.join()
+
+    # Um seguidor espera pelo líder, o outro excede o limite e gera
+    assert len(calls) == 2
+    assert pool.stats.coalesced == 1
+    assert pool.stats.flight_waiters_capped == 1
+
+
+@pytest.mark.asyncio
+async def test_consumer_serves_pooled_quiz_without_generating(monkeypatch):
+    redis = FakeRedis()
+    pool = QuizPool(redis)
+    pooled = pool.offer(SPEC, _quiz(tag="pooled"))
+    stored = {}
+
+    class JobRedis:
+        def setex(self, key, ttl, value):
+            stored[key] = value
+
+    def no_generation(*a, **k):
+        raise AssertionError("should be served from the pool")
+
+    class _Ctx:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+    class Message:
+        body = json.dumps(
+            {
+                "quizz_id": "job-1",
+                "username": "u",
+                "topic": SPEC.topic,
+                "num_questions": SPEC.num_questions,
+                "difficulty": SPEC.difficulty,
+                "style": SPEC.style,
+            }
+        ).encode()
+
+        def process(self, requeue=False):
+            return _Ctx()
+
+    monkeypatch.setattr(gc, "quiz_pool", pool)
+    monkeypatch.setattr(gc, "redis_client", JobRedis())
+    monkeypatch.setattr(gc, "quizz_generator", no_generation)
+    monkeypatch.setattr(gc, "store_quizz", lambda **kwargs: None)
+
+    await gc._handle_message(Message())
+
+    data = json.loads(stored["Quizz:u:job-1"])
+    assert data["status"] == "done"
+    assert data["tags"] == ["pooled"]
+    assert pool.take("u", SPEC) is None
+    assert pooled["id"] in redis.smembers(f"quizpool:seen:u:{SPEC.id}")
@@ -1,9 +1,10 @@
 import pytest
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 from fastapi import HTTPException
 
 # Import the functions to be tested
 from services.quizz_gen_service.quizz_utils import format_quizz_prompt, get_llm
+from services.quizz_gen_service.llm_registry import LLMClientRegistry
 
 # --- Test for Prompt Formatting ---
 
@@ -32,18 +33,21 @@ def test_format_quizz_prompt():
 
 
 @patch("services.quizz_gen_service.quizz_utils.quizz_cfg")
-@patch("services.quizz_gen_service.quizz_utils.ChatOpenAI")
-def test_get_llm_success(MockChatOpenAI, mock_quizz_settings):
+def test_get_llm_success(mock_quizz_settings):
     """
     Tests if get_llm successfully initializes ChatOpenAI
-    when an API key is present.
+    when an API key is present, and reuses it afterwards.
     """
     # Arrange: Mock the settings to provide an API key
     mock_quizz_settings.OPENAI_API_KEY = "fake-api-key"
+    MockChatOpenAI = MagicMock()
     mock_llm_instance = MockChatOpenAI.return_value
+    registry = LLMClientRegistry(factory=MockChatOpenAI)
 
     # Act
-    llm = get_llm(model_name="test-model", temperature=0.5)
+    with patch("services.quizz_gen_service.quizz_utils.llm_registry", registry):
+        llm = get_llm(model_name="test-model", temperature=0.5)
+        assert get_llm(model_name="test-model", temperature=0.5) is llm
 
     # Assert
     mock_quizz_settings.configure_mock(OPENAI_API_KEY="fake-api-key")
@@ -1,5 +1,6 @@
 # utils/redis_config.py
 import redis
+import redis.asyncio as aioredis
 from .rag_settings import rag_settings
 
 
@@ -24,5 +25,21 @@ class RedisConfig:
             health_check_interval=30,
         )
 
+    def get_async_client(self, decode_responses: bool = True) -> aioredis.Redis:
+        return aioredis.Redis(
+            host=self.host,
+            username=self.username,
+            password=self.password,
+            ssl=False,
+            port=self.port,
+            decode_responses=decode_responses,
+            socket_connect_timeout=2,
+            socket_timeout=2,
+            health_check_interval=30,
+        )
+
 
 redis_client = RedisConfig().get_client()
+async_redis_client = RedisConfig().get_async_client()
+# Valores binários (embeddings empacotados): sem decode para str
+async_redis_bytes_client = RedisConfig().get_async_client(decode_responses=False)
@@ -0,0 +1,248 @@
+"""
+Context assembly for the tutor prompt.
+
+Retrieved chunks are turned into the `{context}` block in three steps:
+
+1. near-duplicates are dropped (word shingle Jaccard/containment against the
+   better-ranked chunks already kept), since overlapping SemanticChunker
+   chunks often repeat the same text;
+2. chunks of the same lesson with consecutive `chunk_index` are merged into
+   one passage (overlapping text at the seam is written once);
+3. passages are packed in rank order into a token budget counted with the
+   tokenizer of the answering model, so `top_k` no longer controls the prompt
+   size directly.
+"""
+
+import re
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence
+
+from .logging_config import get_logger
+from .rag_settings import rag_settings
+
+logger = get_logger(__name__)
+
+SHINGLE_SIZE = 3
+# Sobreposição mínima (em caracteres) para colar dois chunks vizinhos
+MIN_SEAM_OVERLAP = 20
+MAX_SEAM_OVERLAP = 1000
+PASSAGE_SEPARATOR = "\n\n"
+
+
+class Tokenizer:
+    """tiktoken counts for `model`, or ~4 chars/token if the encoding is unavailable."""
+
+    def __init__(self, model: str) -> None:
+        self.model = model
+        self.encoding: Any = None
+        try:
+            import tiktoken
+
+            try:
+                self.encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self.encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            # Sem rede o tiktoken não consegue descarregar o BPE
+            logger.warning(f"tiktoken unavailable for {model}, estimating: {e}")
+
+    def count(self, text: str) -> int:
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return (len(text) + 3) // 4
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if max_tokens <= 0:
+            return ""
+        if self.encoding is not None:
+            tokens = self.encoding.encode(text, disallowed_special=())
+            return self.encoding.decode(tokens[:max_tokens])
+        return text[: max_tokens * 4]
+
+
+@lru_cache(maxsize=4)
+def get_tokenizer(model: str = rag_settings.RAG_TOKENIZER_MODEL) -> Tokenizer:
+    return Tokenizer(model)
+
+
+@dataclass
+class AssembledContext:
+    passages: List[str]
+    chunk_ids: List[str]
+    context_tokens: int
+    chunks_in: int = 0
+    chunks_deduped: int = 0
+    chunks_merged: int = 0
+    chunks_dropped: int = 0
+
+
+@dataclass
+class ContextStats:
+    requests: int = 0
+    chunks_in: int = 0
+    chunks_deduped: int = 0
+    chunks_merged: int = 0
+    chunks_dropped: int = 0
+    context_tokens: int = 0
+    prompt_tokens: int = 0
+
+    def record(self, assembled: AssembledContext, prompt_tokens: int) -> None:
+        self.requests += 1
+        self.chunks_in += assembled.chunks_in
+        self.chunks_deduped += assembled.chunks_deduped
+        self.chunks_merged += assembled.chunks_merged
+        self.chunks_dropped += assembled.chunks_dropped
+        self.context_tokens += assembled.context_tokens
+        self.prompt_tokens += prompt_tokens
+
+    def as_dict(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = asdict(self)
+        data["avg_prompt_tokens"] = (
+            round(self.prompt_tokens / self.requests, 1) if self.requests else 0.0
+        )
+        return data
+
+
+@dataclass
+class _Passage:
+    rank: int
+    lesson_id: str
+    first_index: int
+    last_index: int
+    text: str
+    chunk_ids: List[str] = field(default_factory=list)
+
+
+def _shingles(text: str) -> FrozenSet[str]:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return frozenset([" ".join(words)])
+    return frozenset(
+        " ".join(words[i : i + SHINGLE_SIZE])
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    )
+
+
+def _near_duplicate(a: FrozenSet[str], b: FrozenSet[str], threshold: float) -> bool:
+    if not a or not b:
+        return a == b
+    common = len(a & b)
+    jaccard = common / len(a | b)
+    # Um chunk contido noutro (chunk curto dentro de um maior) também é duplicado
+    containment = common / min(len(a), len(b))
+    return jaccard >= threshold or containment >= threshold
+
+
+def _join(left: str, right: str) -> str:
+    # Escreve uma só vez o texto repetido na junção de chunks sobrepostos
+    limit = min(len(left), len(right), MAX_SEAM_OVERLAP)
+    for size in range(limit, MIN_SEAM_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return f"{left}\n{right}"
+
+
+def _dedup(chunks: Sequence[Any], threshold: float) -> List[Any]:
+    kept: List[Any] = []
+    kept_shingles: List[FrozenSet[str]] = []
+    for chunk in chunks:
+        shingles = _shingles(chunk.content)
+        if any(_near_duplicate(shingles, s, threshold) for s in kept_shingles):
+            continue
+        kept.append(chunk)
+        kept_shingles.append(shingles)
+    return kept
+
+
+def _merge_neighbours(chunks: Sequence[Any]) -> List[_Passage]:
+    by_lesson: Dict[str, List[Any]] = {}
+    ranks = {id(chunk): rank for rank, chunk in enumerate(chunks)}
+    for chunk in chunks:
+        by_lesson.setdefault(str(chunk.lesson_id), []).append(chunk)
+
+    passages: List[_Passage] = []
+    for lesson_id, items in by_lesson.items():
+        items.sort(key=lambda c: c.chunk_index)
+        current: Optional[_Passage] = None
+        for chunk in items:
+            if current is not None and chunk.chunk_index == current.last_index + 1:
+                current.text = _join(current.text, chunk.content)
+                current.last_index = chunk.chunk_index
+                current.rank = min(current.rank, ranks[id(chunk)])
+                current.chunk_ids.append(str(chunk.id))
+                continue
+            current = _Passage(
+                rank=ranks[id(chunk)],
+                lesson_id=lesson_id,
+                first_index=chunk.chunk_index,
+                last_index=chunk.chunk_index,
+                text=chunk.content,
+                chunk_ids=[str(chunk.id)],
+            )
+            passages.append(current)
+    # O passo herda a melhor posição de ranking dos chunks que junta
+    passages.sort(key=lambda p: p.rank)
+    return passages
+
+
+def assemble_context(
+    chunks: Sequence[Any],
+    max_tokens: int = rag_settings.RAG_CONTEXT_MAX_TOKENS,
+    dedup_threshold: float = rag_settings.RAG_CONTEXT_DEDUP_THRESHOLD,
+    merge_neighbours: bool = rag_settings.RAG_CONTEXT_MERGE_NEIGHBOURS,
+    tokenizer: Optional[Tokenizer] = None,
+) -> AssembledContext:
+    """
+    Build the prompt context from ranked chunks (best first). Chunks need
+    `id`, `lesson_id`, `chunk_index` and `content`. `max_tokens` <= 0
+    disables the budget.
+    """
+    tokenizer = tokenizer or get_tokenizer()
+    unique = _dedup(chunks, dedup_threshold) if dedup_threshold < 1 else list(chunks)
+    if merge_neighbours:
+        passages = _merge_neighbours(unique)
+    else:
+        passages = [
+            _Passage(
+                rank=rank,
+                lesson_id=str(c.lesson_id),
+                first_index=c.chunk_index,
+                last_index=c.chunk_index,
+                text=c.content,
+                chunk_ids=[str(c.id)],
+            )
+            for rank, c in enumerate(unique)
+        ]
+
+    packed: List[str] = []
+    chunk_ids: List[str] = []
+    used = 0
+    dropped = 0
+    separator = tokenizer.count(PASSAGE_SEPARATOR)
+    for passage in passages:
+        cost = tokenizer.count(passage.text) + (separator if packed else 0)
+        if max_tokens > 0 and used + cost > max_tokens:
+            if packed:
+                # Não cabe: tenta os seguintes (mais curtos) antes de desistir
+                dropped += len(passage.chunk_ids)
+                continue
+            # Nem o melhor passo cabe sozinho: entra truncado
+            passage.text = tokenizer.truncate(passage.text, max_tokens)
+            cost = tokenizer.count(passage.text)
+        packed.append(passage.text)
+        chunk_ids.extend(passage.chunk_ids)
+        used += cost
+
+    return AssembledContext(
+        passages=packed,
+        chunk_ids=chunk_ids,
+        context_tokens=used,
+        chunks_in=len(chunks),
+        chunks_deduped=len(chunks) - len(unique),
+        chunks_merged=len(unique) - len(passages),
+        chunks_dropped=dropped,
+    )
+
+
+context_stats = ContextStats()
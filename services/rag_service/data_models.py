@@ -7,16 +7,26 @@ from typing import Any
 from pgvector.sqlalchemy import Vector
 from datetime import datetime
 
+# Limite de top_k por pedido: também fixa o hnsw.ef_search mínimo da consulta
+MAX_TOP_K = 50
+
 
 class QueryRequest(BaseModel):
     question: str
-    top_k: int = 5
+    top_k: int = Field(default=5, ge=1, le=MAX_TOP_K)
+    # Ignora a cache semântica de respostas (leitura e escrita)
+    bypass_cache: bool = False
+    # Pesos do RRF (vetorial vs full-text); None usa RAG_HYBRID_LEXICAL_WEIGHT
+    vector_weight: float = Field(default=1.0, ge=0)
+    lexical_weight: float | None = Field(default=None, ge=0)
 
 
 class QueryResponse(BaseModel):
     answer: str
     context: List[str]
     sources: List[str]
+    cached: bool = False
+    prompt_tokens: int | None = None
 
 
 class EmbeddingRequest(BaseModel):
@@ -27,6 +37,19 @@ class EmbeddingResponse(BaseModel):
     embedding: List[float]
 
 
+class BatchEmbeddingRequest(BaseModel):
+    texts: List[str] = Field(min_length=1)
+
+
+class BatchEmbeddingResponse(BaseModel):
+    embeddings: List[List[float]]
+
+
+class BatchSearchRequest(BaseModel):
+    texts: List[str] = Field(min_length=1)
+    top_k: int = Field(default=5, ge=1, le=MAX_TOP_K)
+
+
 class Lesson_Embeddings(SQLModel, table=True):
     id: UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     lesson_id: UUID = Field(foreign_key="khan_academy_lesson.id")
@@ -43,6 +66,17 @@ class Khan_Academy_Lesson(SQLModel, table=True):
     date: datetime
 
 
+class Lesson_Ingest_Manifest(SQLModel, table=True):
+    # Estado da última ingestão de cada ficheiro de transcrição
+    lesson_id: UUID = Field(foreign_key="khan_academy_lesson.id", primary_key=True)
+    file_name: str = Field(index=True, unique=True)
+    file_hash: str
+    chunker_version: str
+    embedding_model: str
+    chunk_count: int = 0
+    updated_at: datetime
+
+
 class User(BaseModel):
     username: str
     email: str | None = None
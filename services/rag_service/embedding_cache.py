@@ -0,0 +1,187 @@
+"""
+Redis cache for text embeddings.
+
+Vectors are stored as packed little-endian float32 (or float16) bytes rather
+than JSON text: a 1536-d vector takes 6 KB (3 KB in float16) instead of
+~30 KB and is decoded with `numpy.frombuffer`. Keys are namespaced by the
+embedding model and dtype and use a hash of the text, so switching models
+never serves stale vectors and the same text hits the same key whichever
+endpoint or user asked for it.
+"""
+
+import hashlib
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, cast
+
+import numpy as np
+
+from .cache import async_redis_bytes_client
+from .logging_config import get_logger
+from .rag_settings import rag_settings
+
+logger = get_logger(__name__)
+
+KEY_PREFIX = "rag:emb"
+# Caracteres médios por componente em json.dumps de um embedding OpenAI
+# ("-0.012345678901234567, "); só para a métrica bytes_saved
+JSON_CHARS_PER_FLOAT = 22
+
+
+@dataclass
+class EmbeddingCacheStats:
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    errors: int = 0
+    bytes_stored: int = 0
+    # Estimativa da diferença face ao formato antigo (json.dumps da lista)
+    bytes_saved: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = asdict(self)
+        lookups = self.hits + self.misses
+        data["hit_rate"] = round(self.hits / lookups, 4) if lookups else 0.0
+        return data
+
+
+def pack(vector: Sequence[float], dtype: str = "float32") -> bytes:
+    return np.asarray(vector, dtype=np.dtype(dtype).newbyteorder("<")).tobytes()
+
+
+def unpack(raw: bytes, dtype: str = "float32") -> List[float]:
+    return np.frombuffer(raw, dtype=np.dtype(dtype).newbyteorder("<")).tolist()
+
+
+def _json_size_estimate(vector: Sequence[float]) -> int:
+    return len(vector) * JSON_CHARS_PER_FLOAT
+
+
+class EmbeddingCache:
+    def __init__(
+        self,
+        client: Any,
+        model: str = rag_settings.model,
+        dtype: str = "float32",
+        ttl_seconds: Optional[int] = None,
+    ) -> None:
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"Unsupported embedding cache dtype: {dtype!r}")
+        self.client = client
+        self.model = model
+        self.dtype = dtype
+        self.ttl_seconds = ttl_seconds
+        self.stats = EmbeddingCacheStats()
+
+    def key(self, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{KEY_PREFIX}:{self.model}:{self.dtype}:{digest}"
+
+    async def get(self, text: str) -> Optional[List[float]]:
+        try:
+            raw = await self.client.get(self.key(text))
+        except Exception as e:
+            self.stats.errors += 1
+            logger.warning(f"Embedding cache get failed: {e}")
+            return None
+        if raw is None:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        return unpack(raw, self.dtype)
+
+    async def set(self, text: str, vector: Sequence[float]) -> None:
+        payload = pack(vector, self.dtype)
+        try:
+            await self.client.set(self.key(text), payload, ex=self.ttl_seconds)
+        except Exception as e:
+            self.stats.errors += 1
+            logger.warning(f"Embedding cache set failed: {e}")
+            return
+        self.stats.stores += 1
+        self.stats.bytes_stored += len(payload)
+        self.stats.bytes_saved += _json_size_estimate(vector) - len(payload)
+
+    async def get_or_embed(
+        self, text: str, embed: Callable[[str], Awaitable[List[float]]]
+    ) -> List[float]:
+        vector = await self.get(text)
+        if vector is not None:
+            return vector
+        vector = await embed(text)
+        logger.info(f"Embedding generated ({len(vector)} dims)")
+        await self.set(text, vector)
+        return vector
+
+    async def get_many(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        if not texts:
+            return []
+        try:
+            raws = await self.client.mget([self.key(t) for t in texts])
+        except Exception as e:
+            self.stats.errors += 1
+            logger.warning(f"Embedding cache mget failed: {e}")
+            return [None] * len(texts)
+        vectors = [None if raw is None else unpack(raw, self.dtype) for raw in raws]
+        hits = sum(v is not None for v in vectors)
+        self.stats.hits += hits
+        self.stats.misses += len(texts) - hits
+        return vectors
+
+    async def set_many(
+        self, texts: Sequence[str], vectors: Sequence[Sequence[float]]
+    ) -> None:
+        if not texts:
+            return
+        payloads = [pack(v, self.dtype) for v in vectors]
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for text, payload in zip(texts, payloads):
+                pipe.set(self.key(text), payload, ex=self.ttl_seconds)
+            await pipe.execute()
+        except Exception as e:
+            self.stats.errors += 1
+            logger.warning(f"Embedding cache pipeline set failed: {e}")
+            return
+        self.stats.stores += len(texts)
+        for vector, payload in zip(vectors, payloads):
+            self.stats.bytes_stored += len(payload)
+            self.stats.bytes_saved += _json_size_estimate(vector) - len(payload)
+
+    async def get_or_embed_many(
+        self,
+        texts: Sequence[str],
+        embed_documents: Callable[[List[str]], Awaitable[List[List[float]]]],
+    ) -> List[List[float]]:
+        """
+        Embeddings for `texts` in input order: duplicates are resolved once,
+        cached vectors come from one MGET and all misses go to a single
+        `embed_documents` call.
+        """
+        unique = list(dict.fromkeys(texts))
+        found = dict(zip(unique, await self.get_many(unique)))
+        missing = [t for t in unique if found[t] is None]
+        if missing:
+            vectors = await embed_documents(missing)
+            logger.info(f"Embeddings generated for {len(missing)} texts")
+            await self.set_many(missing, vectors)
+            found.update(zip(missing, vectors))
+        return [cast(List[float], found[t]) for t in texts]
+
+    async def apply_eviction_policy(self, policy: str) -> None:
+        """
+        Best effort `CONFIG SET maxmemory-policy` (managed Redis often
+        disallows CONFIG; the policy should then be set on the instance).
+        """
+        try:
+            await self.client.config_set("maxmemory-policy", policy)
+            logger.info(f"Redis maxmemory-policy set to {policy}")
+        except Exception as e:
+            logger.warning(f"Could not set Redis maxmemory-policy={policy}: {e}")
+
+
+embedding_cache = EmbeddingCache(
+    async_redis_bytes_client,
+    model=rag_settings.model,
+    dtype=rag_settings.RAG_EMBEDDING_CACHE_DTYPE,
+    ttl_seconds=rag_settings.RAG_EMBEDDING_CACHE_TTL_SECONDS or None,
+)
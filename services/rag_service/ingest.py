@@ -1,17 +1,40 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
 from datetime import datetime
+import hashlib
 import re
-from sqlmodel import Session, select, Index
-from .db import engine
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from sqlalchemy import delete, insert, text
+from sqlmodel import Session, select
+from .db import create_db_and_tables, engine
+from langchain_core.embeddings import Embeddings
 from langchain_openai.embeddings import OpenAIEmbeddings
 from langchain_experimental.text_splitter import SemanticChunker
 from .rag_settings import rag_settings
-from .data_models import Khan_Academy_Lesson, Lesson_Embeddings
+from .data_models import (
+    Khan_Academy_Lesson,
+    Lesson_Embeddings,
+    Lesson_Ingest_Manifest,
+)
+from .logging_config import get_logger
+from .retrieval import fts_index, vector_index
 from pathlib import Path
 
+logger = get_logger(__name__)
+
 embeddings = OpenAIEmbeddings(model=rag_settings.model)
-text_splitter = SemanticChunker(embeddings)
 BASE_DIR = Path(__file__).resolve().parent
 DATA_DIR = BASE_DIR / "data"
+# Incrementar quando a forma de fazer chunking mudar (força re-embedding)
+CHUNKER_VERSION = "semantic-v1"
+# pg advisory lock: só um processo (worker, pod ou job) ingere de cada vez
+INGEST_LOCK_KEY = 7_281_001
+
+ProgressCallback = Callable[[int, int], None]
 
 
 def clean_transcript(text: str) -> str:
@@ -22,81 +45,378 @@ def clean_transcript(text: str) -> str:
     return text
 
 
-def add_classes_and_embeddings():
+def _log_progress(stage: str) -> ProgressCallback:
+    def _report(done: int, total: int) -> None:
+        logger.info(f"[ingest] {stage}: {done}/{total}")
+
+    return _report
+
+
+def embed_in_batches(
+    texts: Sequence[str],
+    embedder: Any = None,
+    batch_size: int = rag_settings.RAG_INGEST_EMBED_BATCH_SIZE,
+    max_concurrency: int = rag_settings.RAG_INGEST_EMBED_CONCURRENCY,
+    on_progress: Optional[ProgressCallback] = None,
+) -> List[List[float]]:
+    """
+    Embed `texts` with `embed_documents`, `batch_size` texts per call and at
+    most `max_concurrency` calls in flight. Vectors are returned in input order.
+    """
+    embedder = embedder or embeddings
+    batches = [
+        list(texts[i : i + batch_size]) for i in range(0, len(texts), batch_size)
+    ]
+    results: List[List[List[float]]] = [[] for _ in batches]
+    done = 0
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as pool:
+        futures = {
+            pool.submit(embedder.embed_documents, batch): idx
+            for idx, batch in enumerate(batches)
+        }
+        for future in as_completed(futures):
+            idx = futures[future]
+            results[idx] = future.result()
+            done += len(batches[idx])
+            if on_progress:
+                on_progress(done, len(texts))
+    return [vector for batch in results for vector in batch]
+
+
+class MemoizedEmbeddings(Embeddings):
+    """
+    Embeddings for the SemanticChunker, which embeds every sentence window
+    of a lesson to find the split points. Windows already embedded in this
+    process (repeated within a lesson or across the lessons of a run) are
+    not sent again, and the rest go through `embed_in_batches`.
+    """
+
+    def __init__(
+        self,
+        base: Any,
+        batch_size: int = rag_settings.RAG_INGEST_EMBED_BATCH_SIZE,
+        max_entries: int = 100_000,
+    ) -> None:
+        self.base = base
+        self.batch_size = batch_size
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._vectors: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self._lock:
+            found = {t: self._vectors[t] for t in texts if t in self._vectors}
+        missing = [t for t in dict.fromkeys(texts) if t not in found]
+        if missing:
+            # Uma chamada de cada vez: chunk_lessons já corre lições em paralelo
+            vectors = embed_in_batches(
+                missing, self.base, self.batch_size, max_concurrency=1
+            )
+            found.update(zip(missing, vectors))
+            with self._lock:
+                if len(self._vectors) + len(missing) > self.max_entries:
+                    self._vectors.clear()
+                self._vectors.update(zip(missing, vectors))
+        with self._lock:
+            self.misses += len(missing)
+            self.hits += len(texts) - len(missing)
+        return [found[t] for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+sentence_embeddings = MemoizedEmbeddings(embeddings)
+text_splitter = SemanticChunker(sentence_embeddings)
+
+
+def chunk_lessons(
+    texts: Sequence[str],
+    splitter: Any = None,
+    max_concurrency: int = rag_settings.RAG_INGEST_CHUNK_CONCURRENCY,
+    on_progress: Optional[ProgressCallback] = None,
+) -> List[List[str]]:
+    """Split each lesson text into chunks, several lessons at a time."""
+    splitter = splitter or text_splitter
+    results: List[List[str]] = [[] for _ in texts]
+    done = 0
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as pool:
+        futures = {
+            pool.submit(splitter.create_documents, [text]): idx
+            for idx, text in enumerate(texts)
+        }
+        for future in as_completed(futures):
+            results[futures[future]] = [doc.page_content for doc in future.result()]
+            done += 1
+            if on_progress:
+                on_progress(done, len(texts))
+    return results
+
+
+def bulk_insert_embeddings(
+    session: Session,
+    rows: Sequence[Dict[str, Any]],
+    batch_size: int = rag_settings.RAG_INGEST_WRITE_BATCH_SIZE,
+) -> int:
+    """
+    Insert Lesson_Embeddings rows with one executemany per `batch_size` rows
+    instead of one ORM flush per object. Does not commit.
+    """
+    for i in range(0, len(rows), batch_size):
+        session.execute(insert(Lesson_Embeddings), list(rows[i : i + batch_size]))
+    return len(rows)
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def lesson_metadata(file_name: str) -> Dict[str, str]:
+    # Extrair módulo de forma robusta
+    if "test" in file_name:
+        after = file_name.split("test", 1)[1].lstrip("_")
+        module = after[:-4] if after.lower().endswith(".txt") else after
+    else:
+        module = Path(file_name).stem
+    # Guardar apenas o nome do ficheiro no caminho persistido
+    return {"content_path": f"data/{file_name}", "module": module, "topic": "Calculus"}
+
+
+def _file_name(content_path: str) -> str:
+    # Normalizar caminho: usar sempre o nome do ficheiro
+    return Path(str(content_path).replace("\\", "/")).name
+
+
+@dataclass
+class IngestPlan:
+    new: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+
+    def as_dict(self) -> Dict[str, int]:
+        return {name: len(files) for name, files in asdict(self).items()}
+
+
+def plan_ingest(
+    file_hashes: Dict[str, str],
+    lessons: Dict[str, Any],
+    manifests: Dict[str, Any],
+    force: bool = False,
+    chunker_version: str = CHUNKER_VERSION,
+    embedding_model: str = rag_settings.model,
+) -> IngestPlan:
+    """
+    Decide what to do with each transcript file.
+
+    `file_hashes` maps file name -> sha256 of the file on disk, `lessons`
+    maps file name -> existing lesson row and `manifests` maps file name ->
+    manifest row. A lesson is re-embedded when its file hash, the chunker
+    version or the embedding model differ from the manifest, or when it has
+    no manifest yet (lessons ingested before manifests existed).
+    """
+    plan = IngestPlan()
+    for name in sorted(file_hashes):
+        if name not in lessons:
+            plan.new.append(name)
+            continue
+        entry = manifests.get(name)
+        stale = (
+            entry is None
+            or entry.file_hash != file_hashes[name]
+            or entry.chunker_version != chunker_version
+            or entry.embedding_model != embedding_model
+        )
+        (plan.changed if force or stale else plan.unchanged).append(name)
+    plan.removed = sorted(name for name in lessons if name not in file_hashes)
+    return plan
+
+
+def ensure_vector_index() -> None:
+    # Índice ANN (HNSW ou IVFFlat, conforme RAG_VECTOR_INDEX_TYPE)
+    vector_index().create(bind=engine, checkfirst=True)
+    print(f"{rag_settings.RAG_VECTOR_INDEX_TYPE} index created or already exists.")
+    # GIN sobre to_tsvector(content) para a parte lexical da pesquisa híbrida
+    fts_index().create(bind=engine, checkfirst=True)
+    print("Full-text index created or already exists.")
+
+
+def sync_corpus(
+    data_dir: Path = DATA_DIR, force: bool = False, dry_run: bool = False
+) -> IngestPlan:
+    """
+    Bring the lesson tables in line with the transcripts in `data_dir`.
+
+    New and changed files are (re-)chunked and embedded, their previous
+    chunks are replaced and the manifest is updated; lessons whose file is
+    gone are deleted together with their chunks. Everything is written in a
+    single transaction.
+    """
+    file_paths = {p.name: p for p in sorted(data_dir.iterdir()) if p.is_file()}
+    file_hashes = {name: file_sha256(path) for name, path in file_paths.items()}
+
     with Session(engine) as session:
-        # First, add lessons if they don't exist
-        if session.exec(select(Khan_Academy_Lesson)).first() is None:
-            print("Adding lessons to the database...")
-            for lesson in DATA_DIR.iterdir():
-                if not lesson.is_file():
-                    continue
-                name = lesson.name
-                # Guardar apenas o nome do ficheiro no caminho persistido
-                content_path = f"data/{name}"
-                # Extrair módulo de forma robusta
-                if "test" in name:
-                    after = name.split("test", 1)[1].lstrip("_")
-                    module = after[:-4] if after.lower().endswith(".txt") else after
-                else:
-                    module = Path(name).stem
-                topic = "Calculus"
-                date = datetime.now()
-
-                class_contents = Khan_Academy_Lesson(
-                    content_path=content_path, module=module, topic=topic, date=date
+        lessons: Dict[str, Khan_Academy_Lesson] = {}
+        duplicate_ids = []
+        for lesson in session.exec(select(Khan_Academy_Lesson)).all():
+            name = _file_name(lesson.content_path)
+            if name in lessons:
+                # Lições repetidas para o mesmo ficheiro só deixam chunks órfãos
+                duplicate_ids.append(lesson.id)
+            else:
+                lessons[name] = lesson
+        manifests = {
+            entry.file_name: entry
+            for entry in session.exec(select(Lesson_Ingest_Manifest)).all()
+        }
+
+        plan = plan_ingest(file_hashes, lessons, manifests, force=force)
+        print(f"Ingest plan: {plan.as_dict()}")
+        if dry_run:
+            return plan
+        targets = plan.new + plan.changed
+
+        # Ficheiros removidos: apagar chunks, manifesto e a própria lição
+        removed_ids = [lessons[name].id for name in plan.removed] + duplicate_ids
+        if removed_ids:
+            _delete_chunks(session, removed_ids)
+            session.execute(
+                delete(Lesson_Ingest_Manifest).where(
+                    Lesson_Ingest_Manifest.lesson_id.in_(removed_ids)  # type: ignore[attr-defined]
+                )
+            )
+            session.execute(
+                delete(Khan_Academy_Lesson).where(
+                    Khan_Academy_Lesson.id.in_(removed_ids)  # type: ignore[attr-defined]
+                )
+            )
+
+        for name in plan.new:
+            lesson = Khan_Academy_Lesson(**lesson_metadata(name), date=datetime.now())
+            session.add(lesson)
+            lessons[name] = lesson
+        session.flush()
+
+        # Chunks antigos das lições alteradas deixam de ser válidos
+        _delete_chunks(session, [lessons[name].id for name in plan.changed])
+
+        if targets:
+            started = time.perf_counter()
+            texts = [
+                clean_transcript(file_paths[name].read_text(encoding="utf-8"))
+                for name in targets
+            ]
+            lesson_chunks = chunk_lessons(
+                texts, on_progress=_log_progress("lessons chunked")
+            )
+            logger.info(
+                f"[ingest] sentence embeddings: {sentence_embeddings.misses} "
+                f"embedded, {sentence_embeddings.hits} reused"
+            )
+            all_chunks = [chunk for chunks in lesson_chunks for chunk in chunks]
+            vectors = iter(
+                embed_in_batches(
+                    all_chunks, on_progress=_log_progress("chunks embedded")
                 )
-                session.add(class_contents)
-            session.commit()
-            print("Lessons added.")
-
-        # Now, create embeddings for lessons that don't have them yet
-        lessons_without_embeddings = session.exec(
-            select(Khan_Academy_Lesson).where(
-                ~select(Lesson_Embeddings.lesson_id)
-                .where(Lesson_Embeddings.lesson_id == Khan_Academy_Lesson.id)
-                .exists()
             )
-        ).all()
-
-        if not lessons_without_embeddings:
-            print("All lessons already have embeddings. Skipping.")
-            return
-
-        print("Creating embeddings for new lessons...")
-        for row in lessons_without_embeddings:
-            # Normalizar caminho: usar sempre BASE_DIR/data + nome do ficheiro
-            file_name = Path(str(row.content_path).replace("\\", "/")).name
-            file_path = (DATA_DIR / file_name).resolve()
-            if not file_path.exists():
-                raise FileNotFoundError(f"Data file not found: {file_path}")
-            with open(file_path, "r", encoding="utf-8") as lesson_file:
-                clean_text = clean_transcript(lesson_file.read())
-
-            chunks = text_splitter.create_documents([clean_text])
-
-            for ii, doc in enumerate(chunks):
-                emb_lesson = Lesson_Embeddings(
-                    lesson_id=row.id,
-                    chunk_index=ii,
-                    content=doc.page_content,
-                    embeddings=embeddings.embed_query(doc.page_content),
+            rows = [
+                {
+                    # Core insert: o default_factory do SQLModel não se aplica aqui
+                    "id": uuid.uuid4(),
+                    "lesson_id": lessons[name].id,
+                    "chunk_index": ii,
+                    "content": chunk,
+                    "embeddings": next(vectors),
+                }
+                for name, chunks in zip(targets, lesson_chunks)
+                for ii, chunk in enumerate(chunks)
+            ]
+            bulk_insert_embeddings(session, rows)
+
+            now = datetime.now()
+            for name, chunks in zip(targets, lesson_chunks):
+                entry = manifests.get(name) or Lesson_Ingest_Manifest(
+                    lesson_id=lessons[name].id, file_name=name
                 )
-                session.add(emb_lesson)
-
-            session.commit()
-            print("Embeddings created successfully.")
-
-        # Create HNSW index for faster similarity search
-        index = Index(
-            "class_data_index",
-            Lesson_Embeddings.embeddings,
-            postgresql_using="hnsw",
-            postgresql_with={"m": 16, "ef_construction": 64},
-            postgresql_ops={"embeddings": "vector_cosine_ops"},
+                entry.file_hash = file_hashes[name]
+                entry.chunker_version = CHUNKER_VERSION
+                entry.embedding_model = rag_settings.model
+                entry.chunk_count = len(chunks)
+                entry.updated_at = now
+                session.add(entry)
+            print(
+                f"Embeddings created successfully: {len(rows)} chunks for "
+                f"{len(targets)} lessons in {time.perf_counter() - started:.1f}s."
+            )
+        session.commit()
+
+    ensure_vector_index()
+    return plan
+
+
+def _delete_chunks(session: Session, lesson_ids: Sequence[Any]) -> None:
+    if not lesson_ids:
+        return
+    session.execute(
+        delete(Lesson_Embeddings).where(
+            Lesson_Embeddings.lesson_id.in_(lesson_ids)  # type: ignore[attr-defined]
         )
-        index.create(bind=engine, checkfirst=True)
-        print("HNSW index created or already exists.")
+    )
+
+
+def add_classes_and_embeddings():
+    sync_corpus()
+
+
+def run_ingest_if_leader(
+    data_dir: Path = DATA_DIR, force: bool = False, wait: bool = False
+) -> bool:
+    """
+    Create the tables and sync the corpus while holding a Postgres advisory
+    lock, so that only one of the replicas/workers starting together does
+    the work. Returns False (without ingesting) when another process holds
+    the lock and `wait` is False.
+    """
+    with engine.connect() as conn:
+        params = {"key": INGEST_LOCK_KEY}
+        if wait:
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), params)
+        elif not conn.execute(
+            text("SELECT pg_try_advisory_lock(:key)"), params
+        ).scalar():
+            logger.info("[ingest] another process is ingesting; skipping")
+            return False
+        try:
+            create_db_and_tables()
+            sync_corpus(data_dir, force=force)
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), params)
+    return True
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Sync lesson transcripts into pgvector (incremental)."
+    )
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR)
+    parser.add_argument("--force", action="store_true", help="re-embed every lesson")
+    parser.add_argument(
+        "--dry-run", action="store_true", help="only print the ingest plan"
+    )
+    args = parser.parse_args(argv)
+
+    if args.dry_run:
+        create_db_and_tables()
+        sync_corpus(args.data_dir, dry_run=True)
+    else:
+        run_ingest_if_leader(args.data_dir, force=args.force, wait=True)
 
 
 if __name__ == "__main__":
-    add_classes_and_embeddings()
+    main()
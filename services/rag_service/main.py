@@ -1,13 +1,36 @@
-from fastapi import FastAPI, HTTPException, Depends
-from sqlmodel import Session, select
+from fastapi import FastAPI, HTTPException, Depends, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import text
+from sqlmodel.ext.asyncio.session import AsyncSession
+import asyncio
 import json
-from typing import Annotated, TYPE_CHECKING
+from typing import (
+    Annotated,
+    Any,
+    AsyncIterator,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    TYPE_CHECKING,
+)
 from contextlib import asynccontextmanager
 
 if TYPE_CHECKING:
-    from services.rag_service.model import question_answer
-    from services.rag_service.cache import redis_client
+    from services.rag_service.model import aquestion_answer, astream_question_answer
+    from services.rag_service.rag_utils import format_question_prompt, llm_registry
+    from services.rag_service.context import (
+        AssembledContext,
+        assemble_context,
+        context_stats,
+        get_tokenizer,
+    )
+    from services.rag_service.embedding_cache import embedding_cache
     from services.rag_service.data_models import (
+        MAX_TOP_K,
+        BatchEmbeddingRequest,
+        BatchEmbeddingResponse,
+        BatchSearchRequest,
         QueryRequest,
         QueryResponse,
         EmbeddingRequest,
@@ -16,13 +39,36 @@ if TYPE_CHECKING:
         Lesson_Embeddings,
     )
     from services.rag_service.auth_client import get_current_active_user
-    from services.rag_service.db import create_db_and_tables, engine
-    from services.rag_service.ingest import add_classes_and_embeddings, embeddings
+    from services.rag_service.db import async_engine
+    from services.rag_service.ingest import run_ingest_if_leader, embeddings
     from services.rag_service.logging_config import get_logger
+    from services.rag_service.semantic_cache import semantic_cache
+    from services.rag_service.retrieval import (
+        BATCH_VECTOR_SQL,
+        ann_search_setting,
+        batch_vector_params,
+        hybrid_query,
+        lexical_query,
+        reciprocal_rank_fusion,
+        vector_index_name,
+    )
+    from services.rag_service.memory_index import memory_index
+    from services.rag_service.rag_settings import rag_settings
 else:
-    from .model import question_answer
-    from .cache import redis_client
+    from .model import aquestion_answer, astream_question_answer
+    from .rag_utils import format_question_prompt, llm_registry
+    from .context import (
+        AssembledContext,
+        assemble_context,
+        context_stats,
+        get_tokenizer,
+    )
+    from .embedding_cache import embedding_cache
     from .data_models import (
+        MAX_TOP_K,
+        BatchEmbeddingRequest,
+        BatchEmbeddingResponse,
+        BatchSearchRequest,
         QueryRequest,
         QueryResponse,
         EmbeddingRequest,
@@ -31,112 +77,341 @@ else:
         Lesson_Embeddings,
     )
     from .auth_client import get_current_active_user
-    from .db import create_db_and_tables, engine
-    from .ingest import add_classes_and_embeddings, embeddings
+    from .db import async_engine
+    from .ingest import run_ingest_if_leader, embeddings
     from .logging_config import get_logger
+    from .semantic_cache import semantic_cache
+    from .retrieval import (
+        BATCH_VECTOR_SQL,
+        ann_search_setting,
+        batch_vector_params,
+        hybrid_query,
+        lexical_query,
+        reciprocal_rank_fusion,
+        vector_index_name,
+    )
+    from .memory_index import memory_index
+    from .rag_settings import rag_settings
 
 # Initialize the logger for this module
 logger = get_logger(__name__)
 
 
+# Estado da ingestão em background deste worker (reportado em /health/ready)
+ingest_state: Dict[str, Any] = {"state": "disabled"}
+_index_ready = False
+
+
+async def _background_ingest() -> None:
+    ingest_state["state"] = "running"
+    try:
+        leader = await asyncio.to_thread(run_ingest_if_leader)
+        ingest_state["state"] = "done" if leader else "follower"
+    except Exception as e:
+        logger.exception(f"Background ingestion failed: {e}")
+        ingest_state["state"] = "failed"
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    logger.info("Creating RAG tables...")
-    create_db_and_tables()
-    add_classes_and_embeddings()
-    logger.info("RAG tables created. Service is ready.")
+    # A ingestão não bloqueia o arranque: a readiness só passa com o índice pronto
+    tasks: List["asyncio.Task[Any]"] = []
+    if rag_settings.RAG_REDIS_MAXMEMORY_POLICY:
+        await embedding_cache.apply_eviction_policy(
+            rag_settings.RAG_REDIS_MAXMEMORY_POLICY
+        )
+    if rag_settings.RAG_INGEST_ON_STARTUP:
+        tasks.append(asyncio.create_task(_background_ingest()))
+    if rag_settings.RAG_RETRIEVAL_BACKEND == "memory":
+        tasks.append(
+            asyncio.create_task(
+                memory_index.refresh_forever(
+                    rag_settings.RAG_MEMORY_INDEX_REFRESH_SECONDS
+                )
+            )
+        )
+    # Carrega o BPE do tiktoken fora do event loop (pode descarregar da rede)
+    tasks.append(asyncio.create_task(asyncio.to_thread(lambda: get_tokenizer())))
+    logger.info("RAG service started.")
     yield
+    for task in tasks:
+        if not task.done():
+            task.cancel()
 
 
 app = FastAPI(title="RAG Service", lifespan=lifespan)
 
 
+async def _check_index_ready() -> bool:
+    async with async_engine.connect() as conn:
+        tables = await conn.execute(
+            text(
+                "SELECT to_regclass('lesson_embeddings') IS NOT NULL "
+                "AND to_regclass(:index_name) IS NOT NULL"
+            ),
+            {"index_name": vector_index_name()},
+        )
+        if not tables.scalar():
+            return False
+        chunks = await conn.execute(
+            text("SELECT EXISTS (SELECT 1 FROM lesson_embeddings)")
+        )
+        return bool(chunks.scalar())
+
+
 @app.get("/health")
+@app.get("/health/live")
 async def health_check():
-    """Health check endpoint"""
+    """Liveness: the process is up (no dependency checks)"""
     return {"status": "healthy", "service": "RAG Service"}
 
 
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness: the vector index exists and holds lesson chunks"""
+    global _index_ready
+    if not _index_ready:
+        try:
+            _index_ready = await _check_index_ready()
+        except Exception as e:
+            logger.warning(f"Readiness check failed: {e}")
+    body = {
+        "status": "ready" if _index_ready else "not_ready",
+        "index": _index_ready,
+        "ingest": ingest_state["state"],
+    }
+    return JSONResponse(status_code=200 if _index_ready else 503, content=body)
+
+
+@app.get("/metrics")
+async def metrics():
+    """In-process counters (per worker)"""
+    return {
+        "embedding_cache": embedding_cache.stats.as_dict(),
+        "semantic_cache": semantic_cache.stats.as_dict(),
+        "memory_index": memory_index.as_dict(),
+        "context": context_stats.as_dict(),
+        "llm_pool": llm_registry.as_dict(),
+    }
+
+
+async def _get_question_embedding(question: str) -> List[float]:
+    return await embedding_cache.get_or_embed(question, embeddings.aembed_query)
+
+
+def _lexical_weight(requested: Optional[float]) -> float:
+    if requested is None:
+        return rag_settings.RAG_HYBRID_LEXICAL_WEIGHT
+    return requested
+
+
+async def _retrieve_context(
+    question: str,
+    question_emb: List[float],
+    top_k: int,
+    vector_weight: float = 1.0,
+    lexical_weight: Optional[float] = None,
+    request_class: str = "qa",
+) -> List[Lesson_Embeddings]:
+    weight = _lexical_weight(lexical_weight)
+    if rag_settings.RAG_RETRIEVAL_BACKEND == "memory" and len(memory_index):
+        return await _retrieve_from_memory(
+            question, question_emb, top_k, vector_weight, weight
+        )
+    # Nº de linhas que o índice ANN tem de devolver (candidatos do RRF ou top_k)
+    limit = rag_settings.RAG_HYBRID_CANDIDATES if weight > 0 else top_k
+    async with AsyncSession(async_engine) as session:
+        # SET LOCAL: vale só para a transação desta consulta
+        await session.execute(ann_search_setting(request_class, limit))
+        context = await session.exec(
+            hybrid_query(
+                question,
+                question_emb,
+                top_k,
+                vector_weight=vector_weight,
+                lexical_weight=weight,
+            )
+        )
+        return list(context)
+
+
+async def _retrieve_from_memory(
+    question: str,
+    question_emb: List[float],
+    top_k: int,
+    vector_weight: float,
+    lexical_weight: float,
+) -> List[Any]:
+    # Ranking vetorial em-processo; o full-text (se pedido) continua no Postgres
+    candidates = rag_settings.RAG_HYBRID_CANDIDATES if lexical_weight > 0 else top_k
+    # Hits e mapa do mesmo snapshot: um refresh entretanto não os mistura
+    results, by_id = memory_index.search_with_lookup([question_emb], candidates)
+    hits = results[0]
+    if lexical_weight <= 0:
+        return [chunk for chunk, _ in hits[:top_k]]
+
+    async with AsyncSession(async_engine) as session:
+        lexical_ids = [str(i) for i in await session.exec(lexical_query(question))]
+    fused = reciprocal_rank_fusion(
+        [[chunk.id for chunk, _ in hits], lexical_ids],
+        [vector_weight, lexical_weight],
+        limit=top_k,
+    )
+    return [by_id[i] for i, _ in fused if i in by_id]
+
+
+def _assemble_sync(question: str, chunks: List[Any]) -> Tuple[AssembledContext, int]:
+    assembled = assemble_context(
+        chunks,
+        max_tokens=rag_settings.RAG_CONTEXT_MAX_TOKENS,
+        dedup_threshold=rag_settings.RAG_CONTEXT_DEDUP_THRESHOLD,
+        merge_neighbours=rag_settings.RAG_CONTEXT_MERGE_NEIGHBOURS,
+    )
+    prompt_tokens = get_tokenizer().count(
+        format_question_prompt(question, assembled.passages)
+    )
+    return assembled, prompt_tokens
+
+
+async def _assemble(question: str, chunks: List[Any]) -> Tuple[AssembledContext, int]:
+    # Contagem de tokens (e o 1.º carregamento do BPE) fora do event loop
+    assembled, prompt_tokens = await asyncio.to_thread(_assemble_sync, question, chunks)
+    context_stats.record(assembled, prompt_tokens)
+    logger.info(
+        f"Context: {len(assembled.passages)} passages from "
+        f"{assembled.chunks_in} chunks, {prompt_tokens} prompt tokens"
+    )
+    return assembled, prompt_tokens
+
+
+async def _lookup_cached_answer(
+    request: QueryRequest, question_emb: List[float], chunk_ids: List[str]
+) -> Optional[str]:
+    if request.bypass_cache:
+        semantic_cache.stats.bypassed += 1
+        return None
+    return await semantic_cache.lookup(question_emb, chunk_ids)
+
+
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
 @app.post("/question-answer")
-def query(
+async def query(
     request: QueryRequest,
     current_user: Annotated[User, Depends(get_current_active_user)],
 ) -> QueryResponse:
     try:
         logger.info(f"request.question: {request.question}")
-        # Normalizar valor do Redis para str antes de json.loads
-        from typing import Optional, Union, cast
-
-        raw_q = cast(
-            "Optional[Union[str, bytes, bytearray]]", redis_client.get(request.question)
-        )
-        question_emb = None
-        if raw_q is not None:
-            q_text = (
-                raw_q.decode("utf-8")
-                if isinstance(raw_q, (bytes, bytearray))
-                else raw_q
-            )
-            question_emb = json.loads(q_text)
-            logger.info(f"question_emb: {question_emb}")
-        else:
-            logger.info("No redis")
-            question_emb = embeddings.embed_query(request.question)
-            logger.info("Embeddings generated")
-            logger.info(f"embeddings: {question_emb}")
-            redis_client.set(request.question, json.dumps(question_emb))
-            logger.info("Redis set")
-
-        with Session(engine) as session:
-            logger.info("Session")
-            context = session.exec(
-                select(Lesson_Embeddings)
-                .order_by(Lesson_Embeddings.embeddings.cosine_distance(question_emb))
-                .limit(request.top_k)
-            )
-            logger.info(f"Context: {context}")
-
-            content = [text.content for text in context]
-            logger.info(f"Content: {content}")
+        question_emb = await _get_question_embedding(request.question)
+        chunks = await _retrieve_context(
+            request.question,
+            question_emb,
+            request.top_k,
+            request.vector_weight,
+            request.lexical_weight,
+        )
+        assembled, prompt_tokens = await _assemble(request.question, chunks)
+        content = assembled.passages
+        chunk_ids = assembled.chunk_ids
 
-        response = question_answer(request.question, content)
-        answer_str = getattr(response, "content", str(response))
+        cached_answer = await _lookup_cached_answer(request, question_emb, chunk_ids)
+        if cached_answer is not None:
+            answer_str = cached_answer
+        else:
+            response = await aquestion_answer(request.question, content)
+            answer_str = getattr(response, "content", str(response))
+            if not request.bypass_cache:
+                await semantic_cache.store(
+                    request.question, question_emb, chunk_ids, answer_str
+                )
 
         return QueryResponse(
             answer=answer_str,
             context=content,
             sources=[f"chunk_{i}" for i in range(len(content))],
+            cached=cached_answer is not None,
+            prompt_tokens=prompt_tokens,
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"RAG error: {str(e)}")
 
 
-@app.post("/embed", response_model=EmbeddingResponse)
-async def generate_embedding(
-    request: EmbeddingRequest,
+@app.post("/question-answer/stream")
+async def query_stream(
+    request: QueryRequest,
     current_user: Annotated[User, Depends(get_current_active_user)],
-):
+) -> StreamingResponse:
+    """
+    Server-Sent Events variant of /question-answer.
+
+    Emits one `context` event as soon as retrieval finishes, then `token`
+    events as the LLM produces them and a final `done` event. Failures after
+    the stream has started are reported as an `error` event.
+    """
     try:
-        from typing import Optional, Union, cast
+        logger.info(f"request.question (stream): {request.question}")
+        question_emb = await _get_question_embedding(request.question)
+        chunks = await _retrieve_context(
+            request.question,
+            question_emb,
+            request.top_k,
+            request.vector_weight,
+            request.lexical_weight,
+        )
+        assembled, prompt_tokens = await _assemble(request.question, chunks)
+        content = assembled.passages
+        chunk_ids = assembled.chunk_ids
+        cached_answer = await _lookup_cached_answer(request, question_emb, chunk_ids)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"RAG error: {str(e)}")
 
-        raw = cast(
-            "Optional[Union[str, bytes, bytearray]]", redis_client.get(request.text)
+    async def _events() -> AsyncIterator[str]:
+        yield _sse_event(
+            "context",
+            {
+                "context": content,
+                "sources": [f"chunk_{i}" for i in range(len(content))],
+                "prompt_tokens": prompt_tokens,
+            },
         )
+        if cached_answer is not None:
+            yield _sse_event("token", {"token": cached_answer})
+            yield _sse_event("done", {"cached": True})
+            return
 
-        if raw is not None:
-            text_val = (
-                raw.decode("utf-8") if isinstance(raw, (bytes, bytearray)) else raw
-            )
-            embedding = json.loads(text_val)
-            logger.info(f"embedding found: {embedding}")
-        else:
-            embedding = embeddings.embed_query(request.text)
-            logger.info(f"New embedding generated: {embedding}")
-            redis_client.set(
-                f"{current_user.username}_{request.text}", json.dumps(embedding)
+        tokens: List[str] = []
+        try:
+            async for token in astream_question_answer(request.question, content):
+                tokens.append(token)
+                yield _sse_event("token", {"token": token})
+        except Exception as e:
+            logger.error(f"RAG stream error: {str(e)}")
+            yield _sse_event("error", {"detail": f"RAG error: {str(e)}"})
+            return
+
+        if not request.bypass_cache:
+            await semantic_cache.store(
+                request.question, question_emb, chunk_ids, "".join(tokens)
             )
-            logger.info(f"Embedding cached: {embedding}")
+        yield _sse_event("done", {"cached": False})
+
+    return StreamingResponse(
+        _events(),
+        media_type="text/event-stream",
+        # Evita buffering no NGINX/Ingress para o primeiro byte chegar já
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
+
+@app.post("/embed", response_model=EmbeddingResponse)
+async def generate_embedding(
+    request: EmbeddingRequest,
+    current_user: Annotated[User, Depends(get_current_active_user)],
+):
+    try:
+        embedding = await _get_question_embedding(request.text)
         return EmbeddingResponse(embedding=embedding)
     except Exception as e:
         raise HTTPException(
@@ -148,47 +423,117 @@ async def generate_embedding(
 async def search_similar(
     text: str,
     current_user: Annotated[User, Depends(get_current_active_user)],
-    top_k: int = 5,
+    top_k: int = Query(default=5, ge=1, le=MAX_TOP_K),
+    vector_weight: float = Query(default=1.0, ge=0),
+    lexical_weight: Optional[float] = Query(default=None, ge=0),
 ):
     try:
-        from typing import Optional, Union, cast
+        text_embedding = await _get_question_embedding(text)
+        results = await _retrieve_context(
+            text,
+            text_embedding,
+            top_k,
+            vector_weight,
+            lexical_weight,
+            request_class="search",
+        )
+        logger.info(f"Search results: {len(results)}")
 
-        raw = cast("Optional[Union[str, bytes, bytearray]]", redis_client.get(text))
+        return {
+            "query": text,
+            "results": [
+                {
+                    "content": result.content,
+                    "chunk_index": result.chunk_index,
+                    "lesson_id": str(result.lesson_id),
+                }
+                for result in results
+            ],
+        }
 
-        if raw is not None:
-            text_val = (
-                raw.decode("utf-8") if isinstance(raw, (bytes, bytearray)) else raw
-            )
-            text_embedding = json.loads(text_val)
-            logger.info(f"text_embedding: {text_embedding}")
-        else:
-            text_embedding = embeddings.embed_query(text)
-            logger.info(f"New embedding generated: {text_embedding}")
-            redis_client.set(
-                f"{current_user.username}_{text}", json.dumps(text_embedding)
-            )
-            logger.info(f"Embedding cached: {text_embedding}")
+    except Exception as e:
+        logger.error(f"Search error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Search error: {str(e)}")
 
-        with Session(engine) as session:
-            results = session.exec(
-                select(Lesson_Embeddings)
-                .order_by(Lesson_Embeddings.embeddings.cosine_distance(text_embedding))
-                .limit(top_k)
-            )
-            logger.info(f"Search results: {results}")
-
-            return {
-                "query": text,
-                "results": [
-                    {
-                        "content": result.content,
-                        "chunk_index": result.chunk_index,
-                        "lesson_id": str(result.lesson_id),
-                    }
-                    for result in results
-                ],
-            }
 
+def _check_batch_size(texts: List[str]) -> None:
+    if len(texts) > rag_settings.RAG_BATCH_MAX_TEXTS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"At most {rag_settings.RAG_BATCH_MAX_TEXTS} texts per request",
+        )
+
+
+@app.post("/embed/batch", response_model=BatchEmbeddingResponse)
+async def generate_embeddings_batch(
+    request: BatchEmbeddingRequest,
+    current_user: Annotated[User, Depends(get_current_active_user)],
+):
+    """Embeddings for many texts (input order, duplicates embedded once)"""
+    _check_batch_size(request.texts)
+    try:
+        vectors = await embedding_cache.get_or_embed_many(
+            request.texts, embeddings.aembed_documents
+        )
+        return BatchEmbeddingResponse(embeddings=vectors)
     except Exception as e:
-        logger.error(f"Search error: {str(e)}")
+        raise HTTPException(
+            status_code=500, detail=f"Error while generating embeddings: {str(e)}"
+        )
+
+
+async def _batch_vector_search(
+    vectors: List[List[float]], top_k: int
+) -> List[List[Any]]:
+    if rag_settings.RAG_RETRIEVAL_BACKEND == "memory" and len(memory_index):
+        hits = memory_index.search(vectors, top_k)
+        return [[chunk for chunk, _ in row] for row in hits]
+
+    grouped: List[List[Any]] = [[] for _ in vectors]
+    async with AsyncSession(async_engine) as session:
+        await session.execute(ann_search_setting("search", top_k))
+        rows = await session.execute(
+            BATCH_VECTOR_SQL, batch_vector_params(vectors, top_k)
+        )
+        for row in rows:
+            # ord do unnest começa em 1
+            grouped[row.ord - 1].append(row)
+    return grouped
+
+
+@app.post("/search/batch")
+async def search_similar_batch(
+    request: BatchSearchRequest,
+    current_user: Annotated[User, Depends(get_current_active_user)],
+):
+    """
+    Vector search for many queries: one embedding call for the cache misses
+    and one SQL round trip for all (distinct) queries. Results follow the
+    input order.
+    """
+    _check_batch_size(request.texts)
+    try:
+        unique = list(dict.fromkeys(request.texts))
+        vectors = await embedding_cache.get_or_embed_many(
+            unique, embeddings.aembed_documents
+        )
+        found = dict(zip(unique, await _batch_vector_search(vectors, request.top_k)))
+        return {
+            "results": [
+                {
+                    "query": text,
+                    "results": [
+                        {
+                            "content": result.content,
+                            "chunk_index": result.chunk_index,
+                            "lesson_id": str(result.lesson_id),
+                        }
+                        for result in found[text]
+                    ],
+                }
+                for text in request.texts
+            ]
+        }
+    except Exception as e:
+        logger.error(f"Batch search error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Search error: {str(e)}")
@@ -0,0 +1,402 @@
+"""
+In-process replica of the lesson vector index (RAG_RETRIEVAL_BACKEND=memory).
+
+Lesson_Embeddings are copied into a normalised float32/float16 matrix saved
+as a .npy file under RAG_MEMORY_INDEX_DIR and opened with mmap, so every
+uvicorn worker on the host shares the same pages. Top-k is a chunked
+matrix-vector product in NumPy.
+
+The snapshot is tied to an ingest version: a fingerprint of
+lesson_ingest_manifest (row count + last updated_at), which changes whenever
+ingestion adds, re-embeds or removes a lesson. On a version change one
+worker (file lock) rebuilds the snapshot incrementally: rows of unchanged
+lessons are copied from the previous matrix and only changed lessons are
+read from Postgres. The others pick the new snapshot up on their next refresh.
+
+A loaded snapshot (matrix, chunks, lookup maps) is one immutable object
+swapped in with a single assignment, so a search on the event loop never
+mixes the matrix of one version with the chunks of another while `refresh`
+runs in a thread.
+"""
+
+import asyncio
+import fcntl
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Protocol,
+    Sequence,
+    Tuple,
+    cast,
+)
+from uuid import UUID
+
+import numpy as np
+import sqlalchemy as sa
+from sqlmodel import Session, select
+
+from .data_models import Lesson_Embeddings, Lesson_Ingest_Manifest
+from .db import engine
+from .logging_config import get_logger
+from .rag_settings import rag_settings
+
+logger = get_logger(__name__)
+
+POINTER_FILE = "CURRENT"
+LOCK_FILE = ".lock"
+# Linhas por bloco no produto matriz-vetor (limita a memória temporária)
+SCORE_BLOCK = 16384
+
+
+@dataclass
+class IndexedChunk:
+    # Mesmos atributos de Lesson_Embeddings usados pelos endpoints
+    id: str
+    lesson_id: str
+    chunk_index: int
+    content: str
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    version: Optional[str] = None
+    matrix: Optional[np.ndarray] = None
+    chunks: Sequence[IndexedChunk] = ()
+    by_id: Dict[str, IndexedChunk] = field(default_factory=dict)
+    # lesson_id -> [versão do manifesto, início, fim] no snapshot
+    lessons: Dict[str, List[Any]] = field(default_factory=dict)
+
+
+class ChunkSource(Protocol):
+    def version(self) -> str: ...
+
+    def lesson_versions(self) -> Dict[str, str]: ...
+
+    def load_chunks(
+        self, lesson_ids: Sequence[str]
+    ) -> List[Tuple[IndexedChunk, Sequence[float]]]: ...
+
+
+class PostgresChunkSource:
+    def version(self) -> str:
+        with Session(engine) as session:
+            count, last = session.exec(
+                select(
+                    sa.func.count(),
+                    sa.func.max(Lesson_Ingest_Manifest.updated_at),
+                )
+            ).one()
+        return f"{count}:{last.isoformat() if last else '-'}"
+
+    def lesson_versions(self) -> Dict[str, str]:
+        with Session(engine) as session:
+            rows = session.exec(
+                select(
+                    Lesson_Ingest_Manifest.lesson_id, Lesson_Ingest_Manifest.updated_at
+                )
+            ).all()
+        return {str(lesson_id): updated.isoformat() for lesson_id, updated in rows}
+
+    def load_chunks(
+        self, lesson_ids: Sequence[str]
+    ) -> List[Tuple[IndexedChunk, Sequence[float]]]:
+        if not lesson_ids:
+            return []
+        with Session(engine) as session:
+            rows = session.exec(
+                select(Lesson_Embeddings)
+                .where(
+                    Lesson_Embeddings.lesson_id.in_(  # type: ignore[attr-defined]
+                        [UUID(i) for i in lesson_ids]
+                    )
+                )
+                .order_by(
+                    cast(Any, Lesson_Embeddings.lesson_id),
+                    cast(Any, Lesson_Embeddings.chunk_index),
+                )
+            ).all()
+        return [
+            (
+                IndexedChunk(
+                    id=str(row.id),
+                    lesson_id=str(row.lesson_id),
+                    chunk_index=row.chunk_index,
+                    content=row.content,
+                ),
+                row.embeddings,
+            )
+            for row in rows
+        ]
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class MemoryVectorIndex:
+    def __init__(
+        self,
+        directory: Path,
+        source: Optional[ChunkSource] = None,
+        dtype: str = "float32",
+    ) -> None:
+        self.directory = Path(directory)
+        self.source = source or PostgresChunkSource()
+        self.dtype = np.dtype(dtype)
+        self._snapshot = _Snapshot()
+        self.stats = {"refreshes": 0, "rebuilds": 0, "rows_reused": 0, "rows_loaded": 0}
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._snapshot.version
+
+    @property
+    def matrix(self) -> Optional[np.ndarray]:
+        return self._snapshot.matrix
+
+    @property
+    def chunks(self) -> Sequence[IndexedChunk]:
+        return self._snapshot.chunks
+
+    @property
+    def by_id(self) -> Dict[str, IndexedChunk]:
+        return self._snapshot.by_id
+
+    @property
+    def lessons(self) -> Dict[str, List[Any]]:
+        return self._snapshot.lessons
+
+    @property
+    def loaded(self) -> bool:
+        return self.matrix is not None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {**self.stats, "version": self.version, "rows": len(self.chunks)}
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    # --- consulta -------------------------------------------------------
+
+    def search(
+        self, queries: Sequence[Sequence[float]], k: int
+    ) -> List[List[Tuple[IndexedChunk, float]]]:
+        """Cosine top-k for a batch of query vectors (best first)."""
+        return self._search(self._snapshot, queries, k)
+
+    def search_with_lookup(
+        self, queries: Sequence[Sequence[float]], k: int
+    ) -> Tuple[List[List[Tuple[IndexedChunk, float]]], Dict[str, IndexedChunk]]:
+        """
+        `search` plus the id -> chunk map of the same snapshot, for callers
+        that resolve other ids (e.g. full-text hits) next to the vector hits.
+        """
+        snapshot = self._snapshot
+        return self._search(snapshot, queries, k), snapshot.by_id
+
+    @staticmethod
+    def _search(
+        snapshot: _Snapshot, queries: Sequence[Sequence[float]], k: int
+    ) -> List[List[Tuple[IndexedChunk, float]]]:
+        matrix, chunks = snapshot.matrix, snapshot.chunks
+        if matrix is None or not len(chunks):
+            return [[] for _ in queries]
+        q = _normalize(np.asarray(queries, dtype=np.float32))
+        n = matrix.shape[0]
+        k = min(k, n)
+        scores = np.empty((len(q), n), dtype=np.float32)
+        for start in range(0, n, SCORE_BLOCK):
+            block = np.asarray(matrix[start : start + SCORE_BLOCK], np.float32)
+            scores[:, start : start + len(block)] = q @ block.T
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, idx in zip(scores, top):
+            order = idx[np.argsort(-row[idx])]
+            results.append([(chunks[i], float(row[i])) for i in order])
+        return results
+
+    # --- refresh --------------------------------------------------------
+
+    def refresh(self) -> bool:
+        """
+        Make the loaded snapshot match the current ingest version. Returns
+        True when a new snapshot was loaded.
+        """
+        self.stats["refreshes"] += 1
+        version = self.source.version()
+        if version == self.version:
+            return False
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        name = _snapshot_name(version, self.dtype)
+        if self._current_pointer() != name:
+            with open(self.directory / LOCK_FILE, "w") as lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # outro worker está a reconstruir; fica para o próximo ciclo
+                    return False
+                try:
+                    if self._current_pointer() != name:
+                        self._build(name)
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+        self._load(name, version)
+        return True
+
+    def _current_pointer(self) -> Optional[str]:
+        pointer = self.directory / POINTER_FILE
+        return pointer.read_text().strip() if pointer.exists() else None
+
+    def _load(self, name: str, version: str) -> None:
+        meta = json.loads((self.directory / f"{name}.json").read_text())
+        chunks = tuple(IndexedChunk(*row) for row in meta["chunks"])
+        # Uma única atribuição: search() vê o snapshot antigo ou o novo, nunca os dois
+        self._snapshot = _Snapshot(
+            version=version,
+            matrix=np.load(self.directory / f"{name}.npy", mmap_mode="r"),
+            chunks=chunks,
+            by_id={chunk.id: chunk for chunk in chunks},
+            lessons=meta["lessons"],
+        )
+        logger.info(f"Memory index loaded: {name} ({len(chunks)} chunks)")
+
+    def _build(self, name: str) -> None:
+        self.stats["rebuilds"] += 1
+        previous = self._previous_snapshot()
+        lesson_versions = self.source.lesson_versions()
+
+        reused = {
+            lesson_id: span
+            for lesson_id, span in previous["lessons"].items()
+            if lesson_versions.get(lesson_id) == span[0]
+        }
+        fetched = self.source.load_chunks(
+            [lesson_id for lesson_id in lesson_versions if lesson_id not in reused]
+        )
+
+        by_lesson: Dict[str, List[Tuple[IndexedChunk, Sequence[float]]]] = {}
+        for chunk, vector in fetched:
+            by_lesson.setdefault(chunk.lesson_id, []).append((chunk, vector))
+        total = sum(end - start for _, start, end in reused.values()) + len(fetched)
+        dim = (
+            previous["matrix"].shape[1]
+            if previous["matrix"] is not None
+            else len(fetched[0][1])
+            if fetched
+            else 0
+        )
+
+        tmp = self.directory / f"{name}.npy.tmp"
+        matrix = np.lib.format.open_memmap(
+            tmp, mode="w+", dtype=self.dtype, shape=(total, dim)
+        )
+        chunks: List[IndexedChunk] = []
+        lessons: Dict[str, List[Any]] = {}
+        row = 0
+        for lesson_id in sorted(lesson_versions):
+            start = row
+            if lesson_id in reused:
+                _, old_start, old_end = reused[lesson_id]
+                matrix[row : row + old_end - old_start] = previous["matrix"][
+                    old_start:old_end
+                ]
+                chunks.extend(previous["chunks"][old_start:old_end])
+                row += old_end - old_start
+            elif lesson_id in by_lesson:
+                items = by_lesson[lesson_id]
+                vectors = np.asarray([v for _, v in items], dtype=np.float32)
+                matrix[row : row + len(items)] = _normalize(vectors)
+                chunks.extend(chunk for chunk, _ in items)
+                row += len(items)
+            if row > start:
+                lessons[lesson_id] = [lesson_versions[lesson_id], start, row]
+        matrix.flush()
+        del matrix
+
+        os.replace(tmp, self.directory / f"{name}.npy")
+        _write_atomic(
+            self.directory / f"{name}.json",
+            json.dumps(
+                {
+                    "chunks": [
+                        [c.id, c.lesson_id, c.chunk_index, c.content] for c in chunks
+                    ],
+                    "lessons": lessons,
+                }
+            ),
+        )
+        old = self._current_pointer()
+        _write_atomic(self.directory / POINTER_FILE, name)
+        self._cleanup(keep={name, old})
+
+        rows_reused = sum(end - start for _, start, end in reused.values())
+        self.stats["rows_reused"] += rows_reused
+        self.stats["rows_loaded"] += len(fetched)
+        logger.info(
+            f"Memory index rebuilt: {name} ({rows_reused} rows reused, "
+            f"{len(fetched)} loaded from Postgres)"
+        )
+
+    def _previous_snapshot(self) -> Dict[str, Any]:
+        empty: Dict[str, Any] = {"matrix": None, "chunks": [], "lessons": {}}
+        snapshot = self._snapshot
+        if snapshot.matrix is not None:
+            return {
+                "matrix": snapshot.matrix,
+                "chunks": list(snapshot.chunks),
+                "lessons": snapshot.lessons,
+            }
+        name = self._current_pointer()
+        if name is None or not (self.directory / f"{name}.npy").exists():
+            return empty
+        matrix = np.load(self.directory / f"{name}.npy", mmap_mode="r")
+        if matrix.dtype != self.dtype:
+            return empty
+        meta = json.loads((self.directory / f"{name}.json").read_text())
+        return {
+            "matrix": matrix,
+            "chunks": [IndexedChunk(*row) for row in meta["chunks"]],
+            "lessons": meta["lessons"],
+        }
+
+    def _cleanup(self, keep: Iterable[Optional[str]]) -> None:
+        # Mantém o snapshot anterior: outros workers podem ainda tê-lo mapeado
+        keep_names = {name for name in keep if name}
+        for path in self.directory.glob("v*.*"):
+            if path.name.split(".", 1)[0] not in keep_names:
+                path.unlink(missing_ok=True)
+
+    async def refresh_forever(self, interval: float) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                logger.warning(f"Memory index refresh failed: {e}")
+            await asyncio.sleep(interval)
+
+
+def _snapshot_name(version: str, dtype: np.dtype) -> str:
+    digest = hashlib.sha256(f"{version}|{dtype.name}".encode("utf-8")).hexdigest()
+    return f"v{digest[:16]}"
+
+
+def _write_atomic(path: Path, content: str) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(content)
+    os.replace(tmp, path)
+
+
+memory_index = MemoryVectorIndex(
+    Path(rag_settings.RAG_MEMORY_INDEX_DIR), dtype=rag_settings.RAG_MEMORY_INDEX_DTYPE
+)
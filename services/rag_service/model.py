@@ -1,5 +1,5 @@
 # Compatibilidade de import para pytest/CI e runtime em contentores
-from typing import List, TYPE_CHECKING
+from typing import AsyncIterator, List, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from services.rag_service import rag_utils as rag_mod
@@ -27,3 +27,22 @@ def question_answer(question: str, context: List[str]) -> Union[str, BaseMessage
     result = llm.invoke(prompt, config={"callbacks": [opik_tracer]})
     content = getattr(result, "content", "")
     return str(content)
+
+
+async def aquestion_answer(question: str, context: List[str]) -> str:
+    llm = rag_mod.get_llm()
+    prompt = rag_mod.format_question_prompt(question, context)
+    result = await llm.ainvoke(prompt, config={"callbacks": [opik_tracer]})
+    content = getattr(result, "content", "")
+    return str(content)
+
+
+async def astream_question_answer(
+    question: str, context: List[str]
+) -> AsyncIterator[str]:
+    llm = rag_mod.get_llm()
+    prompt = rag_mod.format_question_prompt(question, context)
+    async for chunk in llm.astream(prompt, config={"callbacks": [opik_tracer]}):
+        content = getattr(chunk, "content", "")
+        if content:
+            yield str(content)
@@ -24,5 +24,70 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     OPIK_API_KEY: str
 
+    # Async request path (pool shared by all in-flight requests of a worker)
+    RAG_DB_POOL_SIZE: int = 20
+    RAG_DB_MAX_OVERFLOW: int = 40
+
+    # Embedding cache (packed float32/float16 bytes in Redis); TTL 0 = no TTL
+    RAG_EMBEDDING_CACHE_DTYPE: str = "float32"
+    RAG_EMBEDDING_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    # Max texts per /embed/batch and /search/batch request
+    RAG_BATCH_MAX_TEXTS: int = 256
+    # Optional: applied with CONFIG SET on startup (e.g. "allkeys-lru")
+    RAG_REDIS_MAXMEMORY_POLICY: str = ""
+
+    # Semantic answer cache for /question-answer (opt-in: questions that
+    # retrieve the same chunks are told apart only by the threshold)
+    RAG_SEMANTIC_CACHE_ENABLED: bool = False
+    RAG_SEMANTIC_CACHE_THRESHOLD: float = 0.98
+    RAG_SEMANTIC_CACHE_TTL_SECONDS: int = 86400
+    RAG_SEMANTIC_CACHE_MAX_CONTEXTS: int = 10000
+    RAG_SEMANTIC_CACHE_MAX_PER_CONTEXT: int = 20
+
+    # Corpus ingestion (embed_documents batching and bulk writes)
+    RAG_INGEST_EMBED_BATCH_SIZE: int = 64
+    RAG_INGEST_EMBED_CONCURRENCY: int = 4
+    RAG_INGEST_CHUNK_CONCURRENCY: int = 4
+    RAG_INGEST_WRITE_BATCH_SIZE: int = 500
+    # Sync the corpus in the background after startup (one leader per
+    # cluster via pg advisory lock); disable when the ingest Job is used
+    RAG_INGEST_ON_STARTUP: bool = True
+
+    # Hybrid retrieval (pgvector + Postgres full-text, fused with RRF)
+    RAG_HYBRID_LEXICAL_WEIGHT: float = 1.0  # 0 disables the lexical ranking
+    RAG_HYBRID_CANDIDATES: int = 50
+    RAG_RRF_K: int = 60
+    RAG_FTS_CONFIG: str = "english"
+
+    # ANN index: "hnsw" (default) or "ivfflat", plus per request class search
+    # parameters (SET LOCAL per transaction). "qa" = /question-answer[/stream]
+    RAG_VECTOR_INDEX_TYPE: str = "hnsw"
+    RAG_HNSW_M: int = 16
+    RAG_HNSW_EF_CONSTRUCTION: int = 64
+    RAG_HNSW_EF_SEARCH_QA: int = 100
+    RAG_HNSW_EF_SEARCH_SEARCH: int = 40
+    RAG_IVFFLAT_LISTS: int = 100
+    RAG_IVFFLAT_PROBES_QA: int = 10
+    RAG_IVFFLAT_PROBES_SEARCH: int = 4
+
+    # Retrieval backend: "pgvector" or "memory" (mmap'ed NumPy replica of the
+    # vector index, shared by the workers of a pod and refreshed on ingest)
+    RAG_RETRIEVAL_BACKEND: str = "pgvector"
+    RAG_MEMORY_INDEX_DIR: str = "/tmp/rag_memory_index"
+    RAG_MEMORY_INDEX_DTYPE: str = "float32"
+    RAG_MEMORY_INDEX_REFRESH_SECONDS: float = 30.0
+
+    # Tutor prompt context: token budget for the retrieved passages (0 = no
+    # budget), near-duplicate threshold (1 disables) and neighbour merging
+    RAG_CONTEXT_MAX_TOKENS: int = 3000
+    RAG_CONTEXT_DEDUP_THRESHOLD: float = 0.85
+    RAG_CONTEXT_MERGE_NEIGHBOURS: bool = True
+    RAG_TOKENIZER_MODEL: str = "gpt-4o-mini"
+
+    # Shared LLM HTTP pool, per model: max concurrent requests + keep-alive
+    LLM_MAX_CONNECTIONS: int = 32
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 16
+    LLM_KEEPALIVE_EXPIRY_SECONDS: float = 60.0
+
 
 rag_settings = Settings()
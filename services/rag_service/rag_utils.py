@@ -4,11 +4,14 @@ from typing import List, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from services.rag_service.rag_settings import rag_settings as rag_cfg
+    from services.rag_service.llm_registry import LLMClientRegistry
 else:
     try:
         from services.rag_service.rag_settings import rag_settings as rag_cfg
+        from services.rag_service.llm_registry import LLMClientRegistry
     except Exception:
         from .rag_settings import rag_settings as rag_cfg
+        from .llm_registry import LLMClientRegistry
 
 OPIK_API_KEY = rag_cfg.OPIK_API_KEY
 if OPIK_API_KEY:
@@ -111,10 +114,20 @@ Now go ahead and respond to the student's question.
 )
 
 
+llm_registry = LLMClientRegistry(
+    max_connections=rag_cfg.LLM_MAX_CONNECTIONS,
+    max_keepalive_connections=rag_cfg.LLM_MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry=rag_cfg.LLM_KEEPALIVE_EXPIRY_SECONDS,
+)
+
+
 def get_llm(model_name: str = "gpt-4o-mini", temperature: float = 0.7) -> ChatOpenAI:
-    llm = ChatOpenAI(model=model_name, temperature=temperature)
-    return llm
+    # Cliente partilhado (pool HTTP keep-alive) em vez de um novo por pedido
+    return llm_registry.get(model_name, temperature)
 
 
 def format_question_prompt(question: str, context: List[str]) -> str:
-    return QUESTION_PROMPT.prompt.format(question=question, context=context)
+    # Um passo por bloco, em vez da repr da lista
+    return QUESTION_PROMPT.prompt.format(
+        question=question, context="\n\n".join(context)
+    )
@@ -0,0 +1,226 @@
+"""
+Hybrid lexical + vector retrieval over Lesson_Embeddings.
+
+Vector candidates come from pgvector (cosine distance) and lexical candidates
+from Postgres full-text search over the chunk content (GIN expression index).
+Both rankings are fused with Reciprocal Rank Fusion (RRF) in a single SQL
+statement, so a hybrid query costs one round trip like the vector-only one.
+"""
+
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import sqlalchemy as sa
+from sqlmodel import Index, func, select
+
+from .data_models import Lesson_Embeddings
+from .rag_settings import rag_settings
+
+FTS_INDEX_NAME = "lesson_embeddings_content_fts"
+VECTOR_INDEX_NAMES = {"hnsw": "class_data_index", "ivfflat": "class_data_ivfflat_index"}
+REQUEST_CLASSES = ("qa", "search")
+
+
+def _regconfig(config: str) -> sa.ColumnElement:
+    # O nome da configuração vai literal no SQL: tem de bater certo com o índice
+    if not re.fullmatch(r"[a-z_]+", config):
+        raise ValueError(f"Invalid text search config: {config!r}")
+    return sa.literal_column(f"'{config}'::regconfig")
+
+
+def fts_document(config: str = rag_settings.RAG_FTS_CONFIG) -> sa.ColumnElement:
+    return func.to_tsvector(_regconfig(config), Lesson_Embeddings.content)
+
+
+def fts_index(config: str = rag_settings.RAG_FTS_CONFIG) -> Index:
+    return Index(FTS_INDEX_NAME, fts_document(config), postgresql_using="gin")
+
+
+def _index_type(index_type: str) -> str:
+    if index_type not in VECTOR_INDEX_NAMES:
+        raise ValueError(f"Unknown vector index type: {index_type!r}")
+    return index_type
+
+
+def vector_index_name(index_type: str = rag_settings.RAG_VECTOR_INDEX_TYPE) -> str:
+    return VECTOR_INDEX_NAMES[_index_type(index_type)]
+
+
+def vector_index(index_type: str = rag_settings.RAG_VECTOR_INDEX_TYPE) -> Index:
+    if _index_type(index_type) == "ivfflat":
+        params = {"lists": rag_settings.RAG_IVFFLAT_LISTS}
+    else:
+        params = {
+            "m": rag_settings.RAG_HNSW_M,
+            "ef_construction": rag_settings.RAG_HNSW_EF_CONSTRUCTION,
+        }
+    return Index(
+        vector_index_name(index_type),
+        Lesson_Embeddings.embeddings,
+        postgresql_using=index_type,
+        postgresql_with=params,
+        postgresql_ops={"embeddings": "vector_cosine_ops"},
+    )
+
+
+def ann_search_setting(
+    request_class: str,
+    limit: int,
+    index_type: str = rag_settings.RAG_VECTOR_INDEX_TYPE,
+) -> sa.TextClause:
+    """
+    `SET LOCAL` statement with the search parameter of the active index for a
+    request class. For HNSW, ef_search also caps how many rows the index scan
+    returns, so it is never set below the number of candidates requested.
+    """
+    if request_class not in REQUEST_CLASSES:
+        raise ValueError(f"Unknown request class: {request_class!r}")
+    suffix = request_class.upper()
+    if _index_type(index_type) == "ivfflat":
+        probes = getattr(rag_settings, f"RAG_IVFFLAT_PROBES_{suffix}")
+        return sa.text(f"SET LOCAL ivfflat.probes = {int(probes)}")
+    ef_search = getattr(rag_settings, f"RAG_HNSW_EF_SEARCH_{suffix}")
+    return sa.text(f"SET LOCAL hnsw.ef_search = {max(int(ef_search), int(limit))}")
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[str]],
+    weights: Sequence[float],
+    k: int = rag_settings.RAG_RRF_K,
+    limit: Optional[int] = None,
+) -> List[Tuple[str, float]]:
+    """
+    Fuse ranked id lists: score(d) = sum_i weight_i / (k + rank_i(d)), with
+    1-based ranks. Ties are broken by the order in which ids were first seen.
+    """
+    scores: Dict[str, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + weight / (k + rank)
+    fused = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    return fused[:limit] if limit is not None else fused
+
+
+def vector_query(question_emb: Sequence[float], top_k: int):
+    return (
+        select(Lesson_Embeddings)
+        .order_by(Lesson_Embeddings.embeddings.cosine_distance(question_emb))
+        .limit(top_k)
+    )
+
+
+def _text_match(question: str, config: str):
+    document = fts_document(config)
+    tsquery = func.websearch_to_tsquery(_regconfig(config), question)
+    return document.op("@@")(tsquery), func.ts_rank_cd(document, tsquery)
+
+
+def lexical_query(
+    question: str,
+    candidates: int = rag_settings.RAG_HYBRID_CANDIDATES,
+    config: str = rag_settings.RAG_FTS_CONFIG,
+):
+    """Ids of the best full-text matches (used with the in-memory backend)."""
+    match, text_rank = _text_match(question, config)
+    return (
+        select(Lesson_Embeddings.id)
+        .where(match)
+        .order_by(text_rank.desc())
+        .limit(candidates)
+    )
+
+
+def hybrid_query(
+    question: str,
+    question_emb: Sequence[float],
+    top_k: int,
+    vector_weight: float = 1.0,
+    lexical_weight: float = rag_settings.RAG_HYBRID_LEXICAL_WEIGHT,
+    candidates: int = rag_settings.RAG_HYBRID_CANDIDATES,
+    rrf_k: int = rag_settings.RAG_RRF_K,
+    config: str = rag_settings.RAG_FTS_CONFIG,
+):
+    """
+    Build the retrieval statement. With `lexical_weight <= 0` this is the
+    plain vector query; otherwise the top `candidates` of each ranking are
+    fused with RRF in SQL and the best `top_k` chunks are returned.
+    """
+    if lexical_weight <= 0:
+        return vector_query(question_emb, top_k)
+
+    distance = Lesson_Embeddings.embeddings.cosine_distance(question_emb)
+    vec = (
+        select(
+            Lesson_Embeddings.id.label("id"),  # type: ignore[attr-defined]
+            func.row_number().over(order_by=distance).label("rank"),
+        )
+        .order_by(distance)
+        .limit(candidates)
+        .cte("vec")
+    )
+
+    match, text_rank = _text_match(question, config)
+    lex = (
+        select(
+            Lesson_Embeddings.id.label("id"),  # type: ignore[attr-defined]
+            func.row_number().over(order_by=text_rank.desc()).label("rank"),
+        )
+        .where(match)
+        .order_by(text_rank.desc())
+        .limit(candidates)
+        .cte("lex")
+    )
+
+    scores = sa.union_all(
+        sa.select(
+            vec.c.id,
+            (sa.literal(float(vector_weight)) / (rrf_k + vec.c.rank)).label("score"),
+        ),
+        sa.select(
+            lex.c.id,
+            (sa.literal(float(lexical_weight)) / (rrf_k + lex.c.rank)).label("score"),
+        ),
+    ).subquery("scores")
+    fused = (
+        sa.select(scores.c.id, func.sum(scores.c.score).label("score"))
+        .group_by(scores.c.id)
+        .order_by(sa.desc("score"))
+        .limit(top_k)
+        .subquery("fused")
+    )
+    return (
+        select(Lesson_Embeddings)
+        .join(fused, fused.c.id == Lesson_Embeddings.id)
+        .order_by(fused.c.score.desc())
+    )
+
+
+# Uma única ida ao Postgres para N consultas: cada embedding da lista é
+# expandido com unnest (mantendo a posição) e pesquisado num LATERAL
+BATCH_VECTOR_SQL = sa.text(
+    """
+    SELECT q.ord, le.id, le.lesson_id, le.chunk_index, le.content
+    FROM unnest(CAST(:queries AS text[])) WITH ORDINALITY AS q(emb, ord)
+    CROSS JOIN LATERAL (
+        SELECT e.id, e.lesson_id, e.chunk_index, e.content,
+               e.embeddings <=> CAST(q.emb AS vector) AS distance
+        FROM lesson_embeddings AS e
+        ORDER BY e.embeddings <=> CAST(q.emb AS vector)
+        LIMIT :top_k
+    ) AS le
+    ORDER BY q.ord, le.distance
+    """
+)
+
+
+def vector_literal(vector: Sequence[float]) -> str:
+    return "[" + ",".join(repr(float(v)) for v in vector) + "]"
+
+
+def batch_vector_params(
+    question_embs: Sequence[Sequence[float]], top_k: int
+) -> Dict[str, object]:
+    return {
+        "queries": [vector_literal(emb) for emb in question_embs],
+        "top_k": top_k,
+    }
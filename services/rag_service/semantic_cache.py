@@ -0,0 +1,216 @@
+"""
+Semantic answer cache for /question-answer.
+
+Answers are grouped by the set of chunks retrieved for the question
+(one Redis hash per context set). A new question is served from the cache
+when it retrieves exactly the same chunks and its embedding is within the
+configured cosine similarity of a previously answered question.
+
+Each entry is two hash fields: `<id>:emb` with the question embedding as
+packed little-endian float32 and `<id>:meta` with the JSON answer. A lookup
+scores the whole bucket with one NumPy matrix product and only decodes the
+JSON of the best match. Entry ids start with the creation time in ns, so the
+oldest entries are trimmed without reading them.
+
+Eviction is TTL per context bucket plus an LRU sorted set that caps the
+number of buckets kept in Redis.
+
+Off by default (RAG_SEMANTIC_CACHE_ENABLED): two different questions that
+retrieve the same chunks share a bucket, and only the threshold tells them
+apart.
+"""
+
+import hashlib
+import json
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .cache import async_redis_bytes_client
+from .rag_settings import rag_settings
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+KEY_PREFIX = "rag:semcache"
+LRU_KEY = f"{KEY_PREFIX}:lru"
+_EMB_DTYPE = np.dtype("<f4")
+
+
+@dataclass
+class SemanticCacheStats:
+    hits: int = 0
+    misses: int = 0
+    bypassed: int = 0
+    stores: int = 0
+    evictions: int = 0
+    errors: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = asdict(self)
+        lookups = self.hits + self.misses
+        data["hit_rate"] = round(self.hits / lookups, 4) if lookups else 0.0
+        return data
+
+
+def cosine_similarity(a: Sequence[float], b: Sequence[float]) -> float:
+    va = np.asarray(a, dtype=np.float32)
+    vb = np.asarray(b, dtype=np.float32)
+    norm = float(np.linalg.norm(va) * np.linalg.norm(vb))
+    return float(va @ vb) / norm if norm else 0.0
+
+
+def _text(value: Any) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def _split_fields(entries: Dict[Any, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """(entry id -> packed embedding, entry id -> meta JSON) of a bucket."""
+    embs: Dict[str, Any] = {}
+    metas: Dict[str, Any] = {}
+    for field, value in entries.items():
+        entry_id, _, kind = _text(field).rpartition(":")
+        if kind == "emb":
+            embs[entry_id] = value
+        elif kind == "meta":
+            metas[entry_id] = value
+    return embs, metas
+
+
+def context_key(chunk_ids: Sequence[str]) -> str:
+    # A ordem do ranking não importa: o contexto é o mesmo conjunto de chunks
+    joined = ",".join(sorted(chunk_ids))
+    digest = hashlib.sha256(joined.encode("utf-8")).hexdigest()
+    return f"{KEY_PREFIX}:ctx:{digest}"
+
+
+class SemanticAnswerCache:
+    def __init__(
+        self,
+        client: Any,
+        threshold: float = 0.98,
+        ttl_seconds: int = 86400,
+        max_contexts: int = 10000,
+        max_per_context: int = 20,
+        enabled: bool = True,
+    ) -> None:
+        self.client = client
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_contexts = max_contexts
+        self.max_per_context = max_per_context
+        self.enabled = enabled
+        self.stats = SemanticCacheStats()
+
+    async def lookup(
+        self, question_emb: Sequence[float], chunk_ids: Sequence[str]
+    ) -> Optional[str]:
+        if not self.enabled or not chunk_ids:
+            return None
+        bucket = context_key(chunk_ids)
+        try:
+            embs, metas = _split_fields(await self.client.hgetall(bucket))
+            query = np.asarray(question_emb, dtype=np.float32)
+            ids = [
+                i for i, raw in embs.items() if i in metas and len(raw) == query.nbytes
+            ]
+            query_norm = float(np.linalg.norm(query))
+            if ids and query_norm:
+                matrix = np.frombuffer(
+                    b"".join(embs[i] for i in ids), dtype=_EMB_DTYPE
+                ).reshape(len(ids), query.size)
+                norms = np.linalg.norm(matrix, axis=1) * query_norm
+                scores = np.divide(
+                    matrix @ query, norms, out=np.zeros(len(ids)), where=norms > 0
+                )
+                best = int(np.argmax(scores))
+                best_score = float(scores[best])
+                if best_score >= self.threshold:
+                    answer = json.loads(metas[ids[best]])["answer"]
+                    self.stats.hits += 1
+                    # Contexto usado: sobe no LRU e renova o TTL, como no store
+                    pipe = self.client.pipeline(transaction=False)
+                    pipe.zadd(LRU_KEY, {bucket: time.time()})
+                    pipe.expire(bucket, self.ttl_seconds)
+                    await pipe.execute()
+                    logger.info(f"Semantic cache hit (similarity={best_score:.4f})")
+                    return answer
+        except Exception as e:
+            self.stats.errors += 1
+            logger.warning(f"Semantic cache lookup failed: {e}")
+            return None
+
+        self.stats.misses += 1
+        return None
+
+    async def store(
+        self,
+        question: str,
+        question_emb: Sequence[float],
+        chunk_ids: Sequence[str],
+        answer: str,
+    ) -> None:
+        if not self.enabled or not chunk_ids:
+            return
+        bucket = context_key(chunk_ids)
+        entry_id = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+        meta = {"question": question, "answer": answer, "created_at": time.time()}
+        try:
+            await self.client.hset(
+                bucket,
+                mapping={
+                    f"{entry_id}:emb": np.asarray(
+                        question_emb, dtype=_EMB_DTYPE
+                    ).tobytes(),
+                    f"{entry_id}:meta": json.dumps(meta),
+                },
+            )
+            await self.client.expire(bucket, self.ttl_seconds)
+            await self.client.zadd(LRU_KEY, {bucket: time.time()})
+            self.stats.stores += 1
+            await self._trim_bucket(bucket)
+            await self._evict_contexts()
+        except Exception as e:
+            self.stats.errors += 1
+            logger.warning(f"Semantic cache store failed: {e}")
+
+    async def _trim_bucket(self, bucket: str) -> None:
+        fields = [_text(f) for f in await self.client.hkeys(bucket)]
+        entry_ids = sorted({f.rpartition(":")[0] for f in fields})
+        overflow = len(entry_ids) - self.max_per_context
+        if overflow <= 0:
+            return
+        # Ids começam pelo instante de criação: os primeiros são os mais antigos
+        oldest = set(entry_ids[:overflow])
+        await self.client.hdel(
+            bucket, *[f for f in fields if f.rpartition(":")[0] in oldest]
+        )
+        self.stats.evictions += overflow
+
+    async def _evict_contexts(self) -> None:
+        # Buckets expirados por TTL deixam de contar para o limite LRU
+        await self.client.zremrangebyscore(
+            LRU_KEY, "-inf", time.time() - self.ttl_seconds
+        )
+        size = await self.client.zcard(LRU_KEY)
+        overflow = size - self.max_contexts
+        if overflow <= 0:
+            return
+        victims: List[str] = await self.client.zrange(LRU_KEY, 0, overflow - 1)
+        if victims:
+            await self.client.delete(*victims)
+            await self.client.zrem(LRU_KEY, *victims)
+            self.stats.evictions += len(victims)
+
+
+semantic_cache = SemanticAnswerCache(
+    async_redis_bytes_client,
+    threshold=rag_settings.RAG_SEMANTIC_CACHE_THRESHOLD,
+    ttl_seconds=rag_settings.RAG_SEMANTIC_CACHE_TTL_SECONDS,
+    max_contexts=rag_settings.RAG_SEMANTIC_CACHE_MAX_CONTEXTS,
+    max_per_context=rag_settings.RAG_SEMANTIC_CACHE_MAX_PER_CONTEXT,
+    enabled=rag_settings.RAG_SEMANTIC_CACHE_ENABLED,
+)
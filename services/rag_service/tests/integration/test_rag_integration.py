@@ -1,10 +1,11 @@
 import pytest
-import redis
+import redis.asyncio as aioredis
 from fastapi.testclient import TestClient
 
 from services.rag_service import main as rag_main
 from services.rag_service.rag_settings import rag_settings
 from services.rag_service.data_models import User
+from services.rag_service.embedding_cache import EmbeddingCache
 
 
 pytestmark = pytest.mark.integration
@@ -13,50 +14,52 @@ pytestmark = pytest.mark.integration
 @pytest.fixture(autouse=True)
 def _wire_local_redis(monkeypatch):
     # Build a real Redis client using configured endpoint (CI sets secrets)
-    r = redis.Redis(
+    r = aioredis.Redis(
         host=rag_settings.REDIS_ENDPOINT,
         port=rag_settings.REDIS_PORT,
         username=rag_settings.REDIS_USERNAME,
         password=rag_settings.REDIS_PASSWORD,
-        decode_responses=True,
+        decode_responses=False,
         socket_connect_timeout=2,
         socket_timeout=2,
         health_check_interval=10,
     )
-    # Replace global client exposed by the module
-    monkeypatch.setattr(rag_main, "redis_client", r, raising=True)
+    # Replace the embedding cache client exposed by the module
+    monkeypatch.setattr(
+        rag_main, "embedding_cache", EmbeddingCache(r, ttl_seconds=60), raising=True
+    )
     yield
 
 
 @pytest.fixture(autouse=True)
 def _disable_db_and_ingest(monkeypatch):
     # Prevent connecting to Postgres during app startup and requests
-    monkeypatch.setattr(rag_main, "create_db_and_tables", lambda: None, raising=True)
-    monkeypatch.setattr(
-        rag_main, "add_classes_and_embeddings", lambda: None, raising=True
-    )
+    monkeypatch.setattr(rag_main, "run_ingest_if_leader", lambda: True, raising=True)
 
     class _DummySession:
         def __init__(self, *args, **kwargs):
             pass
 
-        def __enter__(self):
+        async def __aenter__(self):
             return self
 
-        def __exit__(self, exc_type, exc, tb):
+        async def __aexit__(self, exc_type, exc, tb):
             return False
 
-        def exec(self, *args, **kwargs):
+        async def execute(self, *args, **kwargs):
+            return None
+
+        async def exec(self, *args, **kwargs):
             return []
 
-    monkeypatch.setattr(rag_main, "Session", _DummySession, raising=True)
+    monkeypatch.setattr(rag_main, "AsyncSession", _DummySession, raising=True)
 
 
 @pytest.fixture()
 def client(monkeypatch):
     # Stub LLM to avoid network
     class _LLM:
-        def invoke(self, prompt, config=None):
+        async def ainvoke(self, prompt, config=None):
             class _R:
                 content = "This is an answer."
 
@@ -90,7 +93,7 @@ def test_question_answer_returns_answer_and_context(client):
 def test_question_answer_error_path_returns_500(monkeypatch):
     # Force the LLM call to raise inside question_answer flow
     class _LLM:
-        def invoke(self, prompt, config=None):
+        async def ainvoke(self, prompt, config=None):
             raise RuntimeError("LLM failed")
 
     def _fake_get_llm(*args, **kwargs):
@@ -110,7 +113,7 @@ def test_embed_returns_embedding_and_caches(monkeypatch):
     # Patch embeddings used by app to deterministic vector
     class _Emb:
         @staticmethod
-        def embed_query(text):
+        async def aembed_query(text):
             return [0.11, 0.22, 0.33]
 
     monkeypatch.setattr(rag_main, "embeddings", _Emb())
@@ -119,14 +122,15 @@ def test_embed_returns_embedding_and_caches(monkeypatch):
         res = c.post("/embed", json=payload)
         assert res.status_code == 200
         data = res.json()
-        assert data.get("embedding") == [0.11, 0.22, 0.33]
+        # float32 na cache: igual a menos da precisão simples
+        assert data.get("embedding") == pytest.approx([0.11, 0.22, 0.33], rel=1e-6)
 
 
 def test_search_returns_results(monkeypatch):
     # Patch embeddings to deterministic vector
     class _Emb:
         @staticmethod
-        def embed_query(text):
+        async def aembed_query(text):
             return [0.5, 0.4, 0.3]
 
     monkeypatch.setattr(rag_main, "embeddings", _Emb())
@@ -1,40 +1,108 @@
+import asyncio
 import json
+import threading
 import uuid
 import pytest
 from fastapi.testclient import TestClient
 
 from services.rag_service import main as main_mod
 from services.rag_service.data_models import User
+from services.rag_service.embedding_cache import EmbeddingCache, pack
+from services.rag_service.semantic_cache import SemanticAnswerCache
 
 
 class FakeRedis:
     def __init__(self):
         self.store = {}
 
-    def get(self, key):
+    async def get(self, key):
         return self.store.get(key)
 
-    def set(self, key, value):
+    async def set(self, key, value, ex=None):
         self.store[key] = value
 
+    async def mget(self, keys):
+        return [self.store.get(key) for key in keys]
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    def set(self, key, value, ex=None):
+        self.ops.append((key, value))
+
+    async def execute(self):
+        for key, value in self.ops:
+            self.redis.store[key] = value
+
+
+class FakeHashRedis:
+    # apenas os comandos usados pela cache semântica
+    def __init__(self):
+        self.hashes = {}
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    async def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update(mapping)
+
+    async def hkeys(self, key):
+        return list(self.hashes.get(key, {}))
+
+    async def expire(self, key, seconds):
+        pass
+
+    async def zadd(self, key, mapping):
+        pass
+
+    async def zremrangebyscore(self, key, min_score, max_score):
+        pass
+
+    async def zcard(self, key):
+        return len(self.hashes)
+
+    def pipeline(self, transaction=True):
+        return FakeHashPipeline()
+
+
+class FakeHashPipeline:
+    # zadd/expire do hit: sem efeito, como os comandos acima
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    async def execute(self):
+        return []
+
 
 class FakeSession:
     def __init__(self, results):
         self._results = results
+        self.settings = []
 
-    def __enter__(self):
+    async def __aenter__(self):
         return self
 
-    def __exit__(self, exc_type, exc, tb):
+    async def __aexit__(self, exc_type, exc, tb):
         return False
 
-    def exec(self, _statement):
+    async def execute(self, statement):
+        # SET LOCAL dos parâmetros do índice ANN
+        self.settings.append(str(statement))
+
+    async def exec(self, _statement):
         # devolve um iterável de resultados simulados
         return self._results
 
 
 class FakeRow:
     def __init__(self, content, chunk_index=0, lesson_id=None):
+        self.id = uuid.uuid4()
         self.content = content
         self.chunk_index = chunk_index
         self.lesson_id = lesson_id or uuid.uuid4()
@@ -50,36 +118,53 @@ def client_with_user(monkeypatch):
     return TestClient(main_mod.app)
 
 
+@pytest.fixture(autouse=True)
+def embedding_cache(monkeypatch):
+    cache = EmbeddingCache(FakeRedis(), model="test-model")
+    monkeypatch.setattr(main_mod, "embedding_cache", cache)
+    return cache
+
+
+@pytest.fixture(autouse=True)
+def semantic_cache(monkeypatch):
+    cache = SemanticAnswerCache(FakeHashRedis())
+    monkeypatch.setattr(main_mod, "semantic_cache", cache)
+    return cache
+
+
 def test_health_ok(client_with_user):
     resp = client_with_user.get("/health")
     assert resp.status_code == 200
     assert resp.json()["service"] == "RAG Service"
 
 
-def test_question_answer_redis_miss_then_ok(client_with_user, monkeypatch):
+def test_question_answer_redis_miss_then_ok(
+    client_with_user, embedding_cache, monkeypatch
+):
     # Redis miss -> chama embeddings.embed_query e grava cache; Session devolve contexto; question_answer devolve AIMessage-like
-    r = FakeRedis()
-    monkeypatch.setattr(main_mod, "redis_client", r)
+    r = embedding_cache.client
 
     class Emb:
         @staticmethod
-        def embed_query(text):
+        async def aembed_query(text):
             return [0.1, 0.2, 0.3]
 
     monkeypatch.setattr(main_mod, "embeddings", Emb)
 
     # Session fake com 2 conteúdos
     fake_results = [FakeRow("C1", 0), FakeRow("C2", 1)]
-    monkeypatch.setattr(main_mod, "Session", lambda engine: FakeSession(fake_results))
+    monkeypatch.setattr(
+        main_mod, "AsyncSession", lambda engine: FakeSession(fake_results)
+    )
 
     class Resp:
         def __init__(self, content):
             self.content = content
 
-    def fake_qa(question, context):
+    async def fake_qa(question, context):
         return Resp("ans")
 
-    monkeypatch.setattr(main_mod, "question_answer", fake_qa)
+    monkeypatch.setattr(main_mod, "aquestion_answer", fake_qa)
 
     body = {"question": "Q?", "top_k": 2}
     resp = client_with_user.post(
@@ -89,19 +174,24 @@ def test_question_answer_redis_miss_then_ok(client_with_user, monkeypatch):
     data = resp.json()
     assert data["answer"] == "ans"
     assert data["context"] == ["C1", "C2"]
-    # cache foi setado com a pergunta como chave
-    assert "Q?" in r.store
+    # cache foi setado com a pergunta como chave (bytes float32)
+    assert r.store[embedding_cache.key("Q?")] == pack([0.1, 0.2, 0.3])
 
 
-def test_question_answer_redis_hit_path(client_with_user, monkeypatch):
-    r = FakeRedis()
-    r.set("QHIT", json.dumps([0.5, 0.5]))
-    monkeypatch.setattr(main_mod, "redis_client", r)
+def test_question_answer_redis_hit_path(client_with_user, embedding_cache, monkeypatch):
+    r = embedding_cache.client
+    r.store[embedding_cache.key("QHIT")] = pack([0.5, 0.5])
 
     # não deve chamar embeddings; ainda assim Session devolve contexto
     fake_results = [FakeRow("CX")]
-    monkeypatch.setattr(main_mod, "Session", lambda engine: FakeSession(fake_results))
-    monkeypatch.setattr(main_mod, "question_answer", lambda q, c: "A")
+    monkeypatch.setattr(
+        main_mod, "AsyncSession", lambda engine: FakeSession(fake_results)
+    )
+
+    async def fake_qa(q, c):
+        return "A"
+
+    monkeypatch.setattr(main_mod, "aquestion_answer", fake_qa)
 
     body = {"question": "QHIT", "top_k": 1}
     resp = client_with_user.post(
@@ -111,15 +201,168 @@ def test_question_answer_redis_hit_path(client_with_user, monkeypatch):
     assert resp.json()["context"] == ["CX"]
 
 
+def test_question_answer_semantic_cache_hit_skips_llm(
+    client_with_user, semantic_cache, monkeypatch
+):
+
+    class Emb:
+        @staticmethod
+        async def aembed_query(text):
+            # perguntas parecidas -> embeddings quase iguais
+            return [1.0, 0.01] if "derivative" in text else [1.0, 0.0]
+
+    monkeypatch.setattr(main_mod, "embeddings", Emb)
+    rows = [FakeRow("C1", 0), FakeRow("C2", 1)]
+    monkeypatch.setattr(main_mod, "AsyncSession", lambda engine: FakeSession(rows))
+
+    calls = {"llm": 0}
+
+    async def fake_qa(question, context):
+        calls["llm"] += 1
+        return "fresh answer"
+
+    monkeypatch.setattr(main_mod, "aquestion_answer", fake_qa)
+
+    first = client_with_user.post(
+        "/question-answer", json={"question": "What is a derivative?", "top_k": 2}
+    )
+    second = client_with_user.post(
+        "/question-answer", json={"question": "Define a derivative", "top_k": 2}
+    )
+    bypass = client_with_user.post(
+        "/question-answer",
+        json={"question": "Define a derivative", "top_k": 2, "bypass_cache": True},
+    )
+
+    assert first.json()["cached"] is False
+    hit = second.json()
+    assert hit.pop("prompt_tokens") == first.json()["prompt_tokens"] > 0
+    assert hit == {
+        "answer": "fresh answer",
+        "context": ["C1", "C2"],
+        "sources": ["chunk_0", "chunk_1"],
+        "cached": True,
+    }
+    assert bypass.json()["cached"] is False
+    assert calls["llm"] == 2
+
+    stats = client_with_user.get("/metrics").json()["semantic_cache"]
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["bypassed"] == 1
+
+
+def _parse_sse(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_question_answer_stream_emits_context_then_tokens(
+    client_with_user, semantic_cache, monkeypatch
+):
+
+    class Emb:
+        @staticmethod
+        async def aembed_query(text):
+            return [0.3, 0.4]
+
+    monkeypatch.setattr(main_mod, "embeddings", Emb)
+    rows = [FakeRow("C1", 0), FakeRow("C2", 1)]
+    monkeypatch.setattr(main_mod, "AsyncSession", lambda engine: FakeSession(rows))
+
+    async def fake_stream(question, context):
+        for token in ["The ", "answer"]:
+            yield token
+
+    monkeypatch.setattr(main_mod, "astream_question_answer", fake_stream)
+
+    body = {"question": "Q?", "top_k": 2}
+    resp = client_with_user.post("/question-answer/stream", json=body)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    events = _parse_sse(resp.text)
+    assert events[0][1].pop("prompt_tokens") > 0
+    assert events == [
+        ("context", {"context": ["C1", "C2"], "sources": ["chunk_0", "chunk_1"]}),
+        ("token", {"token": "The "}),
+        ("token", {"token": "answer"}),
+        ("done", {"cached": False}),
+    ]
+
+    # a resposta completa ficou na cache semântica: segundo pedido não chama o LLM
+    async def no_stream(question, context):
+        raise AssertionError("LLM should not be called")
+        yield  # pragma: no cover
+
+    monkeypatch.setattr(main_mod, "astream_question_answer", no_stream)
+    cached = _parse_sse(
+        client_with_user.post("/question-answer/stream", json=body).text
+    )
+    assert cached[1:] == [
+        ("token", {"token": "The answer"}),
+        ("done", {"cached": True}),
+    ]
+
+
+def test_question_answer_stream_llm_failure_emits_error_event(
+    client_with_user, monkeypatch
+):
+
+    class Emb:
+        @staticmethod
+        async def aembed_query(text):
+            return [0.3, 0.4]
+
+    monkeypatch.setattr(main_mod, "embeddings", Emb)
+    monkeypatch.setattr(
+        main_mod, "AsyncSession", lambda engine: FakeSession([FakeRow("C1")])
+    )
+
+    async def broken_stream(question, context):
+        yield "partial"
+        raise RuntimeError("llm error")
+
+    monkeypatch.setattr(main_mod, "astream_question_answer", broken_stream)
+
+    resp = client_with_user.post("/question-answer/stream", json={"question": "Q"})
+    events = _parse_sse(resp.text)
+    assert [name for name, _ in events] == ["context", "token", "error"]
+    assert "llm error" in events[-1][1]["detail"]
+
+
+def test_question_answer_stream_retrieval_failure_returns_500(
+    client_with_user, monkeypatch
+):
+
+    class Emb:
+        @staticmethod
+        async def aembed_query(text):
+            raise RuntimeError("embedding error")
+
+    monkeypatch.setattr(main_mod, "embeddings", Emb)
+    resp = client_with_user.post("/question-answer/stream", json={"question": "Q"})
+    assert resp.status_code == 500
+
+
 def test_question_answer_error_returns_500(client_with_user, monkeypatch):
-    r = FakeRedis()
-    monkeypatch.setattr(main_mod, "redis_client", r)
-    monkeypatch.setattr(main_mod, "Session", lambda engine: FakeSession([FakeRow("C")]))
+    monkeypatch.setattr(
+        main_mod, "AsyncSession", lambda engine: FakeSession([FakeRow("C")])
+    )
 
-    def boom(*a, **k):
+    class Emb:
+        @staticmethod
+        async def aembed_query(text):
+            return [0.1]
+
+    monkeypatch.setattr(main_mod, "embeddings", Emb)
+
+    async def boom(*a, **k):
         raise RuntimeError("llm error")
 
-    monkeypatch.setattr(main_mod, "question_answer", boom)
+    monkeypatch.setattr(main_mod, "aquestion_answer", boom)
 
     body = {"question": "Q", "top_k": 1}
     resp = client_with_user.post(
@@ -128,28 +371,27 @@ def test_question_answer_error_returns_500(client_with_user, monkeypatch):
     assert resp.status_code == 500
 
 
-def test_embed_cache_miss_and_hit(client_with_user, monkeypatch):
-    r = FakeRedis()
-    monkeypatch.setattr(main_mod, "redis_client", r)
+def test_embed_cache_miss_and_hit(client_with_user, embedding_cache, monkeypatch):
+    r = embedding_cache.client
 
     class Emb:
         @staticmethod
-        def embed_query(text):
+        async def aembed_query(text):
             return [0.7, 0.8]
 
     monkeypatch.setattr(main_mod, "embeddings", Emb)
 
-    # Miss -> gera e guarda sob "u_text"
+    # Miss -> gera e guarda sob a chave do texto (igual para /embed e /search)
     body = {"text": "hello"}
     resp = client_with_user.post(
         "/embed", json=body, headers={"Authorization": "Bearer t"}
     )
     assert resp.status_code == 200
     assert resp.json()["embedding"] == [0.7, 0.8]
-    assert r.store["u_hello"] == json.dumps([0.7, 0.8])
+    assert r.store[embedding_cache.key("hello")] == pack([0.7, 0.8])
 
-    # Hit -> se guardarmos em key "hello", endpoint deve ler e retornar sem gerar novamente
-    r.set("hello", json.dumps([1.0]))
+    # Hit -> lê a mesma chave que escreveu, sem gerar novamente
+    r.store[embedding_cache.key("hello")] = pack([1.0])
     resp2 = client_with_user.post(
         "/embed", json=body, headers={"Authorization": "Bearer t"}
     )
@@ -157,19 +399,20 @@ def test_embed_cache_miss_and_hit(client_with_user, monkeypatch):
     assert resp2.json()["embedding"] == [1.0]
 
 
-def test_search_success_cache_miss(client_with_user, monkeypatch):
-    r = FakeRedis()
-    monkeypatch.setattr(main_mod, "redis_client", r)
+def test_search_success_cache_miss(client_with_user, embedding_cache, monkeypatch):
+    r = embedding_cache.client
 
     class Emb:
         @staticmethod
-        def embed_query(text):
+        async def aembed_query(text):
             return [0.2]
 
     monkeypatch.setattr(main_mod, "embeddings", Emb)
 
     fake_results = [FakeRow("A", 3), FakeRow("B", 4)]
-    monkeypatch.setattr(main_mod, "Session", lambda engine: FakeSession(fake_results))
+    monkeypatch.setattr(
+        main_mod, "AsyncSession", lambda engine: FakeSession(fake_results)
+    )
 
     resp = client_with_user.get(
         "/search",
@@ -180,28 +423,248 @@ def test_search_success_cache_miss(client_with_user, monkeypatch):
     body = resp.json()
     assert body["query"] == "t"
     assert len(body["results"]) == 2
-    assert r.store["u_t"] == json.dumps([0.2])
+    assert r.store[embedding_cache.key("t")] == pack([0.2])
 
 
 def test_search_error_returns_500(client_with_user, monkeypatch):
-    r = FakeRedis()
-    monkeypatch.setattr(main_mod, "redis_client", r)
 
     class Emb:
         @staticmethod
-        def embed_query(text):
+        async def aembed_query(text):
             return [0.2]
 
     monkeypatch.setattr(main_mod, "embeddings", Emb)
 
     # FakeSession levanta erro ao exec
     class BadSession(FakeSession):
-        def exec(self, _):
+        async def exec(self, _):
             raise RuntimeError("db error")
 
-    monkeypatch.setattr(main_mod, "Session", lambda engine: BadSession([]))
+    monkeypatch.setattr(main_mod, "AsyncSession", lambda engine: BadSession([]))
 
     resp = client_with_user.get(
         "/search", params={"text": "t"}, headers={"Authorization": "Bearer t"}
     )
     assert resp.status_code == 500
+
+
+def test_embed_batch_returns_input_order_and_embeds_once(
+    client_with_user, embedding_cache, monkeypatch
+):
+    r = embedding_cache.client
+    r.store[embedding_cache.key("cached")] = pack([9.0])
+    calls = []
+
+    class Emb:
+        @staticmethod
+        async def aembed_documents(texts):
+            calls.append(list(texts))
+            return [[float(i)] for i, _ in enumerate(texts)]
+
+    monkeypatch.setattr(main_mod, "embeddings", Emb)
+
+    resp = client_with_user.post(
+        "/embed/batch", json={"texts": ["x", "cached", "y", "x"]}
+    )
+    assert resp.status_code == 200
+    assert resp.json()["embeddings"] == [[0.0], [9.0], [1.0], [0.0]]
+    assert calls == [["x", "y"]]
+
+
+def test_embed_batch_rejects_empty_and_oversized(client_with_user, monkeypatch):
+    monkeypatch.setattr(main_mod.rag_settings, "RAG_BATCH_MAX_TEXTS", 2)
+    assert client_with_user.post("/embed/batch", json={"texts": []}).status_code == 422
+    resp = client_with_user.post("/embed/batch", json={"texts": ["a", "b", "c"]})
+    assert resp.status_code == 422
+
+
+def test_top_k_is_capped_on_every_search_path(client_with_user):
+    too_many = main_mod.MAX_TOP_K + 1
+    resp = client_with_user.post(
+        "/search/batch", json={"texts": ["a"], "top_k": too_many}
+    )
+    assert resp.status_code == 422
+    resp = client_with_user.get("/search", params={"text": "a", "top_k": too_many})
+    assert resp.status_code == 422
+    resp = client_with_user.post(
+        "/question-answer", json={"question": "q", "top_k": too_many}
+    )
+    assert resp.status_code == 422
+
+
+def test_search_batch_single_round_trip(client_with_user, monkeypatch):
+    class Emb:
+        @staticmethod
+        async def aembed_documents(texts):
+            return [[float(len(t))] for t in texts]
+
+    class BatchRow(FakeRow):
+        def __init__(self, ord, content):
+            super().__init__(content)
+            self.ord = ord
+
+    class BatchSession(FakeSession):
+        def __init__(self):
+            super().__init__([])
+            self.params = []
+
+        async def execute(self, statement, params=None):
+            if params is None:
+                return await super().execute(statement)
+            self.params.append(params)
+            return [BatchRow(1, "a1"), BatchRow(1, "a2"), BatchRow(2, "bb1")]
+
+    session = BatchSession()
+    monkeypatch.setattr(main_mod, "embeddings", Emb)
+    monkeypatch.setattr(main_mod, "AsyncSession", lambda engine: session)
+
+    resp = client_with_user.post(
+        "/search/batch", json={"texts": ["a", "bb", "a"], "top_k": 2}
+    )
+    assert resp.status_code == 200
+    results = resp.json()["results"]
+    assert [r["query"] for r in results] == ["a", "bb", "a"]
+    assert [[x["content"] for x in r["results"]] for r in results] == [
+        ["a1", "a2"],
+        ["bb1"],
+        ["a1", "a2"],
+    ]
+    # Uma única consulta para as duas perguntas distintas
+    assert len(session.params) == 1
+    assert session.params[0]["top_k"] == 2
+    assert len(session.params[0]["queries"]) == 2
+    assert "ef_search" in session.settings[0]
+
+
+def test_retrieval_weights_are_passed_per_request(client_with_user, monkeypatch):
+
+    class Emb:
+        @staticmethod
+        async def aembed_query(text):
+            return [0.1, 0.2, 0.3]
+
+    monkeypatch.setattr(main_mod, "embeddings", Emb)
+    monkeypatch.setattr(
+        main_mod, "AsyncSession", lambda engine: FakeSession([FakeRow("C1")])
+    )
+    calls = []
+
+    def fake_hybrid_query(question, question_emb, top_k, **weights):
+        calls.append((question, top_k, weights))
+        return object()
+
+    monkeypatch.setattr(main_mod, "hybrid_query", fake_hybrid_query)
+
+    resp = client_with_user.get(
+        "/search",
+        params={"text": "d/dx sin(x^2)", "top_k": 3, "lexical_weight": 2.0},
+        headers={"Authorization": "Bearer t"},
+    )
+    assert resp.status_code == 200
+    assert calls[-1] == (
+        "d/dx sin(x^2)",
+        3,
+        {"vector_weight": 1.0, "lexical_weight": 2.0},
+    )
+
+    monkeypatch.setattr(main_mod.rag_settings, "RAG_HYBRID_LEXICAL_WEIGHT", 0.0)
+    resp = client_with_user.get(
+        "/search", params={"text": "limits"}, headers={"Authorization": "Bearer t"}
+    )
+    assert resp.status_code == 200
+    # sem peso no pedido, vale o default da configuração
+    assert calls[-1][2]["lexical_weight"] == 0.0
+
+    resp = client_with_user.get(
+        "/search",
+        params={"text": "limits", "lexical_weight": -1},
+        headers={"Authorization": "Bearer t"},
+    )
+    assert resp.status_code == 422
+
+
+def test_ann_search_parameters_depend_on_request_class(client_with_user, monkeypatch):
+
+    class Emb:
+        @staticmethod
+        async def aembed_query(text):
+            return [0.1, 0.2, 0.3]
+
+    async def fake_qa(question, context):
+        return "ans"
+
+    sessions = []
+
+    def _session(engine):
+        sessions.append(FakeSession([FakeRow("C1")]))
+        return sessions[-1]
+
+    monkeypatch.setattr(main_mod, "embeddings", Emb)
+    monkeypatch.setattr(main_mod, "AsyncSession", _session)
+    monkeypatch.setattr(main_mod, "aquestion_answer", fake_qa)
+    monkeypatch.setattr(main_mod.rag_settings, "RAG_HYBRID_LEXICAL_WEIGHT", 0.0)
+    monkeypatch.setattr(main_mod.rag_settings, "RAG_HNSW_EF_SEARCH_QA", 120)
+    monkeypatch.setattr(main_mod.rag_settings, "RAG_HNSW_EF_SEARCH_SEARCH", 30)
+
+    headers = {"Authorization": "Bearer t"}
+    client_with_user.post(
+        "/question-answer", json={"question": "Q?", "top_k": 2}, headers=headers
+    )
+    client_with_user.get("/search", params={"text": "t"}, headers=headers)
+
+    assert sessions[0].settings == ["SET LOCAL hnsw.ef_search = 120"]
+    assert sessions[1].settings == ["SET LOCAL hnsw.ef_search = 30"]
+
+
+def test_memory_backend_serves_vector_search_in_process(client_with_user, monkeypatch):
+    from services.rag_service.memory_index import IndexedChunk
+
+    class FakeMemoryIndex:
+        def __init__(self):
+            self.chunk = IndexedChunk("c1", "l1", 0, "in-memory chunk")
+            self.by_id = {"c1": self.chunk}
+
+        def __len__(self):
+            return 1
+
+        def search_with_lookup(self, queries, k):
+            return [[(self.chunk, 0.9)]], self.by_id
+
+    def _no_session(engine):
+        raise AssertionError("pgvector path should not be used")
+
+    class Emb:
+        @staticmethod
+        async def aembed_query(text):
+            return [0.1, 0.2, 0.3]
+
+    monkeypatch.setattr(main_mod, "embeddings", Emb)
+    monkeypatch.setattr(main_mod, "memory_index", FakeMemoryIndex())
+    monkeypatch.setattr(main_mod, "AsyncSession", _no_session)
+    monkeypatch.setattr(main_mod.rag_settings, "RAG_RETRIEVAL_BACKEND", "memory")
+
+    resp = client_with_user.get(
+        "/search",
+        params={"text": "limits", "lexical_weight": 0},
+        headers={"Authorization": "Bearer t"},
+    )
+    assert resp.status_code == 200
+    assert resp.json()["results"] == [
+        {"content": "in-memory chunk", "chunk_index": 0, "lesson_id": "l1"}
+    ]
+
+
+def test_prompt_tokens_are_counted_off_the_event_loop(monkeypatch):
+    threads = []
+
+    class CountingTokenizer:
+        def count(self, text):
+            threads.append(threading.current_thread())
+            return 7
+
+    monkeypatch.setattr(main_mod, "get_tokenizer", lambda: CountingTokenizer())
+
+    _, prompt_tokens = asyncio.run(main_mod._assemble("q", []))
+
+    assert prompt_tokens == 7
+    assert threads and threads[0] is not threading.main_thread()
@@ -0,0 +1,95 @@
+from dataclasses import dataclass
+
+from services.rag_service.context import ContextStats, assemble_context
+
+
+@dataclass
+class Chunk:
+    id: str
+    lesson_id: str
+    chunk_index: int
+    content: str
+
+
+class WordTokenizer:
+    # 1 token por palavra: contas fáceis de verificar
+    def count(self, text):
+        return len(text.split())
+
+    def truncate(self, text, max_tokens):
+        return " ".join(text.split()[:max_tokens])
+
+
+def _assemble(chunks, **kwargs):
+    kwargs.setdefault("max_tokens", 1000)
+    kwargs.setdefault("dedup_threshold", 0.85)
+    kwargs.setdefault("merge_neighbours", True)
+    return assemble_context(chunks, tokenizer=WordTokenizer(), **kwargs)
+
+
+def test_near_duplicates_keep_best_ranked():
+    text = "the derivative of sin x is cos x by the limit definition"
+    chunks = [
+        Chunk("a", "L1", 0, text),
+        Chunk("b", "L2", 4, text.upper() + "  "),
+        Chunk("c", "L3", 2, "integration by parts reverses the product rule"),
+        # contido no primeiro: também é duplicado
+        Chunk("d", "L4", 7, "of sin x is cos x by the limit"),
+    ]
+    out = _assemble(chunks)
+    assert out.chunk_ids == ["a", "c"]
+    assert out.chunks_deduped == 2
+
+
+def test_adjacent_chunks_of_a_lesson_are_merged_in_order():
+    seam = "so the slope of the tangent line"
+    chunks = [
+        Chunk("b", "L1", 1, f"{seam} equals the derivative"),
+        Chunk("x", "L2", 0, "unrelated passage about matrices"),
+        Chunk("a", "L1", 0, f"a limit of secant slopes {seam}"),
+        Chunk("c", "L1", 3, "a later section of the lesson"),
+    ]
+    out = _assemble(chunks)
+    assert out.passages == [
+        f"a limit of secant slopes {seam} equals the derivative",
+        "unrelated passage about matrices",
+        "a later section of the lesson",
+    ]
+    assert out.chunk_ids == ["a", "b", "x", "c"]
+    assert out.chunks_merged == 1
+
+    separate = _assemble(chunks, merge_neighbours=False)
+    assert len(separate.passages) == 4
+
+
+def test_budget_skips_passages_that_do_not_fit():
+    chunks = [
+        Chunk("a", "L1", 0, "one two three four"),
+        Chunk("b", "L2", 0, " ".join(["long"] * 20)),
+        Chunk("c", "L3", 0, "five six"),
+    ]
+    out = _assemble(chunks, max_tokens=6)
+    assert out.chunk_ids == ["a", "c"]
+    assert out.context_tokens == 6
+    assert out.chunks_dropped == 1
+
+    unlimited = _assemble(chunks, max_tokens=0)
+    assert unlimited.chunk_ids == ["a", "b", "c"]
+
+
+def test_best_passage_is_truncated_when_it_alone_exceeds_budget():
+    chunks = [Chunk("a", "L1", 0, " ".join(str(i) for i in range(50)))]
+    out = _assemble(chunks, max_tokens=5)
+    assert out.passages == ["0 1 2 3 4"]
+    assert out.context_tokens == 5
+
+
+def test_stats_average_prompt_tokens():
+    stats = ContextStats()
+    out = _assemble([Chunk("a", "L1", 0, "x y"), Chunk("b", "L1", 0, "x y")])
+    stats.record(out, 100)
+    stats.record(out, 300)
+    data = stats.as_dict()
+    assert data["requests"] == 2
+    assert data["chunks_deduped"] == 2
+    assert data["avg_prompt_tokens"] == 200.0
@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+from services.rag_service.embedding_cache import (
+    JSON_CHARS_PER_FLOAT,
+    EmbeddingCache,
+    pack,
+    unpack,
+)
+
+
+class FakeBytesRedis:
+    def __init__(self, fail=False):
+        self.store = {}
+        self.ttl = {}
+        self.fail = fail
+
+    async def get(self, key):
+        if self.fail:
+            raise ConnectionError("redis down")
+        return self.store.get(key)
+
+    async def set(self, key, value, ex=None):
+        if self.fail:
+            raise ConnectionError("redis down")
+        self.store[key] = value
+        self.ttl[key] = ex
+
+    async def mget(self, keys):
+        if self.fail:
+            raise ConnectionError("redis down")
+        self.mgets = getattr(self, "mgets", 0) + 1
+        return [self.store.get(key) for key in keys]
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    def set(self, key, value, ex=None):
+        self.ops.append((key, value, ex))
+
+    async def execute(self):
+        for key, value, ex in self.ops:
+            await self.redis.set(key, value, ex=ex)
+
+
+def test_pack_roundtrip_and_size():
+    vec = [0.25, -0.5, 1.0]
+    assert len(pack(vec)) == 12
+    assert len(pack(vec, "float16")) == 6
+    assert unpack(pack(vec)) == vec
+    assert unpack(pack(vec, "float16"), "float16") == vec
+
+
+def test_keys_are_namespaced_by_model_and_dtype():
+    a = EmbeddingCache(FakeBytesRedis(), model="m1")
+    b = EmbeddingCache(FakeBytesRedis(), model="m2")
+    c = EmbeddingCache(FakeBytesRedis(), model="m1", dtype="float16")
+    assert a.key("hi").startswith("rag:emb:m1:float32:")
+    assert len({a.key("hi"), b.key("hi"), c.key("hi")}) == 3
+    with pytest.raises(ValueError):
+        EmbeddingCache(FakeBytesRedis(), dtype="float64")
+
+
+def test_get_or_embed_miss_then_hit_with_ttl_and_stats():
+    client = FakeBytesRedis()
+    cache = EmbeddingCache(client, model="m", ttl_seconds=60)
+    calls = []
+
+    async def embed(text):
+        calls.append(text)
+        return [0.5] * 1536
+
+    first = asyncio.run(cache.get_or_embed("derivative", embed))
+    second = asyncio.run(cache.get_or_embed("derivative", embed))
+
+    assert first == second == [0.5] * 1536
+    assert calls == ["derivative"]
+    assert client.ttl[cache.key("derivative")] == 60
+    stats = cache.stats.as_dict()
+    assert stats["hits"] == 1 and stats["misses"] == 1 and stats["hit_rate"] == 0.5
+    assert stats["bytes_stored"] == 1536 * 4
+    assert stats["bytes_saved"] == 1536 * (JSON_CHARS_PER_FLOAT - 4)
+
+
+def test_redis_errors_fall_back_to_embedding():
+    cache = EmbeddingCache(FakeBytesRedis(fail=True), model="m")
+
+    async def embed(text):
+        return [1.0]
+
+    assert asyncio.run(cache.get_or_embed("x", embed)) == [1.0]
+    assert cache.stats.errors == 2
+
+
+def test_get_or_embed_many_dedups_and_embeds_misses_once():
+    client = FakeBytesRedis()
+    cache = EmbeddingCache(client, model="m", ttl_seconds=30)
+    client.store[cache.key("b")] = pack([2.0])
+    calls = []
+
+    async def embed_documents(texts):
+        calls.append(list(texts))
+        return [[float(len(t))] for t in texts]
+
+    vectors = asyncio.run(
+        cache.get_or_embed_many(["a", "b", "a", "ccc"], embed_documents)
+    )
+
+    assert vectors == [[1.0], [2.0], [1.0], [3.0]]
+    assert calls == [["a", "ccc"]]
+    assert client.mgets == 1
+    assert client.ttl[cache.key("ccc")] == 30
+    assert cache.stats.hits == 1 and cache.stats.misses == 2
+    assert cache.stats.stores == 2
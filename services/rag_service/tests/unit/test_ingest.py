@@ -0,0 +1,314 @@
+import threading
+import time
+
+from services.rag_service import ingest
+from services.rag_service.data_models import Lesson_Embeddings
+
+
+class FakeEmbedder:
+    def __init__(self, delay=0.0):
+        self.calls = []
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.calls.append(list(texts))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        return [[float(len(t)), 1.0] for t in texts]
+
+
+class FakeSplitter:
+    class _Doc:
+        def __init__(self, text):
+            self.page_content = text
+
+    def create_documents(self, texts):
+        return [self._Doc(part) for part in texts[0].split(". ")]
+
+
+class FakeSession:
+    def __init__(self):
+        self.executed = []
+
+    def execute(self, statement, params):
+        self.executed.append((statement, params))
+
+
+def test_clean_transcript_removes_tags_and_whitespace():
+    raw = "- [Instructor] Hello\n\n   world - [Voiceover] again"
+    assert ingest.clean_transcript(raw) == "Hello world again"
+
+
+def test_embed_in_batches_preserves_order_and_batches():
+    texts = [f"t{'x' * i}" for i in range(10)]
+    embedder = FakeEmbedder()
+    progress = []
+
+    vectors = ingest.embed_in_batches(
+        texts,
+        embedder=embedder,
+        batch_size=4,
+        max_concurrency=2,
+        on_progress=lambda done, total: progress.append((done, total)),
+    )
+
+    assert vectors == [[float(len(t)), 1.0] for t in texts]
+    assert sorted(len(c) for c in embedder.calls) == [2, 4, 4]
+    assert progress[-1] == (10, 10)
+
+
+def test_embed_in_batches_respects_concurrency_limit():
+    embedder = FakeEmbedder(delay=0.02)
+    ingest.embed_in_batches(
+        [str(i) for i in range(12)], embedder=embedder, batch_size=1, max_concurrency=3
+    )
+    assert len(embedder.calls) == 12
+    assert embedder.max_in_flight <= 3
+
+
+def test_chunk_lessons_keeps_lesson_order():
+    chunks = ingest.chunk_lessons(
+        ["a. b", "c", "d. e. f"], splitter=FakeSplitter(), max_concurrency=2
+    )
+    assert chunks == [["a", "b"], ["c"], ["d", "e", "f"]]
+
+
+def test_memoized_embeddings_embeds_each_sentence_window_once():
+    base = FakeEmbedder()
+    memo = ingest.MemoizedEmbeddings(base, batch_size=2)
+
+    first = memo.embed_documents(["ab", "c", "ab", "def"])
+    second = memo.embed_documents(["c", "gh"])
+
+    assert first == [[2.0, 1.0], [1.0, 1.0], [2.0, 1.0], [3.0, 1.0]]
+    assert second == [[1.0, 1.0], [2.0, 1.0]]
+    assert sorted(map(sorted, base.calls)) == [["ab", "c"], ["def"], ["gh"]]
+    assert (memo.misses, memo.hits) == (4, 2)
+
+
+def test_bulk_insert_embeddings_uses_executemany_batches():
+    session = FakeSession()
+    rows = [{"chunk_index": i} for i in range(5)]
+
+    assert ingest.bulk_insert_embeddings(session, rows, batch_size=2) == 5
+
+    assert [len(params) for _, params in session.executed] == [2, 2, 1]
+    statement = session.executed[0][0]
+    assert statement.table.name == Lesson_Embeddings.__tablename__
+
+
+class _Manifest:
+    def __init__(self, file_hash, chunker_version=None, embedding_model=None):
+        self.file_hash = file_hash
+        self.chunker_version = chunker_version or ingest.CHUNKER_VERSION
+        self.embedding_model = embedding_model or ingest.rag_settings.model
+
+
+def test_plan_ingest_detects_new_changed_unchanged_and_removed():
+    plan = ingest.plan_ingest(
+        {"a.txt": "h1", "b.txt": "h2", "c.txt": "h3", "d.txt": "h4"},
+        lessons={"a.txt": object(), "b.txt": object(), "c.txt": object(), "x.txt": 1},
+        manifests={
+            "a.txt": _Manifest("h1"),
+            "b.txt": _Manifest("old"),
+            "x.txt": _Manifest("hx"),
+        },
+    )
+    assert plan.new == ["d.txt"]
+    # c.txt não tem manifesto (ingestão antiga): é re-embebido uma vez
+    assert plan.changed == ["b.txt", "c.txt"]
+    assert plan.unchanged == ["a.txt"]
+    assert plan.removed == ["x.txt"]
+
+
+def test_plan_ingest_reembeds_on_chunker_or_model_change_and_force():
+    lessons = {"a.txt": object()}
+    stale_model = {"a.txt": _Manifest("h1", embedding_model="other-model")}
+    stale_chunker = {"a.txt": _Manifest("h1", chunker_version="semantic-v0")}
+    fresh = {"a.txt": _Manifest("h1")}
+
+    assert ingest.plan_ingest({"a.txt": "h1"}, lessons, stale_model).changed
+    assert ingest.plan_ingest({"a.txt": "h1"}, lessons, stale_chunker).changed
+    assert ingest.plan_ingest({"a.txt": "h1"}, lessons, fresh).unchanged
+    assert ingest.plan_ingest({"a.txt": "h1"}, lessons, fresh, force=True).changed
+
+
+def test_lesson_metadata_and_file_hash(tmp_path):
+    meta = ingest.lesson_metadata("calculus_test_limits.txt")
+    assert meta == {
+        "content_path": "data/calculus_test_limits.txt",
+        "module": "limits",
+        "topic": "Calculus",
+    }
+    f = tmp_path / "a.txt"
+    f.write_text("hello", encoding="utf-8")
+    assert ingest.file_sha256(f) == (
+        "2cf24dba5fb0a30e26e83b2ac5b9e29e1b161e5c1fa7425e73043362938b9824"
+    )
+
+
+class _SyncSession:
+    def __init__(self, lessons, manifests):
+        self.rows = {
+            ingest.Khan_Academy_Lesson: lessons,
+            ingest.Lesson_Ingest_Manifest: manifests,
+        }
+        self.executed = []
+        self.added = []
+        self.commits = 0
+
+    def __call__(self, _engine):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def exec(self, statement):
+        entity = statement.column_descriptions[0]["entity"]
+
+        class _Result:
+            def all(_self):
+                return list(self.rows[entity])
+
+        return _Result()
+
+    def execute(self, statement, params=None):
+        self.executed.append((statement, params))
+
+    def add(self, obj):
+        self.added.append(obj)
+
+    def flush(self):
+        pass
+
+    def commit(self):
+        self.commits += 1
+
+
+def test_sync_corpus_only_embeds_changed_files(tmp_path, monkeypatch):
+    (tmp_path / "same.txt").write_text("a. b", encoding="utf-8")
+    (tmp_path / "edited.txt").write_text("c. d. e", encoding="utf-8")
+    (tmp_path / "new.txt").write_text("f", encoding="utf-8")
+
+    same = ingest.Khan_Academy_Lesson(
+        content_path="data/same.txt", module="same", topic="Calculus", date=None
+    )
+    edited = ingest.Khan_Academy_Lesson(
+        content_path="data/edited.txt", module="edited", topic="Calculus", date=None
+    )
+    gone = ingest.Khan_Academy_Lesson(
+        content_path="data/gone.txt", module="gone", topic="Calculus", date=None
+    )
+    manifests = [
+        ingest.Lesson_Ingest_Manifest(
+            lesson_id=same.id,
+            file_name="same.txt",
+            file_hash=ingest.file_sha256(tmp_path / "same.txt"),
+            chunker_version=ingest.CHUNKER_VERSION,
+            embedding_model=ingest.rag_settings.model,
+        ),
+        ingest.Lesson_Ingest_Manifest(
+            lesson_id=edited.id,
+            file_name="edited.txt",
+            file_hash="stale",
+            chunker_version=ingest.CHUNKER_VERSION,
+            embedding_model=ingest.rag_settings.model,
+        ),
+    ]
+    session = _SyncSession([same, edited, gone], manifests)
+    embedder = FakeEmbedder()
+    monkeypatch.setattr(ingest, "Session", session)
+    monkeypatch.setattr(ingest, "embeddings", embedder)
+    monkeypatch.setattr(ingest, "text_splitter", FakeSplitter())
+    monkeypatch.setattr(ingest, "ensure_vector_index", lambda: None)
+
+    plan = ingest.sync_corpus(tmp_path)
+
+    assert plan.as_dict() == {"new": 1, "changed": 1, "unchanged": 1, "removed": 1}
+    # só os chunks de edited.txt (3) e new.txt (1) são embebidos
+    assert sorted(t for call in embedder.calls for t in call) == ["c", "d", "e", "f"]
+    inserted = [p for _, p in session.executed if isinstance(p, list)]
+    assert {row["lesson_id"] for row in inserted[0]} == {
+        edited.id,
+        next(o.id for o in session.added if getattr(o, "module", None) == "new"),
+    }
+    assert manifests[1].file_hash == ingest.file_sha256(tmp_path / "edited.txt")
+    assert manifests[1].chunk_count == 3
+    assert session.commits == 1
+    deletes = [s for s, p in session.executed if p is None]
+    assert {s.table.name for s in deletes} == {
+        "lesson_embeddings",
+        "lesson_ingest_manifest",
+        "khan_academy_lesson",
+    }
+
+
+def test_sync_corpus_dry_run_writes_nothing(tmp_path, monkeypatch):
+    (tmp_path / "new.txt").write_text("f", encoding="utf-8")
+    session = _SyncSession([], [])
+    monkeypatch.setattr(ingest, "Session", session)
+
+    plan = ingest.sync_corpus(tmp_path, dry_run=True)
+
+    assert plan.new == ["new.txt"]
+    assert session.executed == [] and session.added == [] and session.commits == 0
+
+
+class _LockConn:
+    def __init__(self, acquired):
+        self.acquired = acquired
+        self.sql = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement, params=None):
+        self.sql.append(str(statement))
+
+        class _Result:
+            def scalar(_self):
+                return self.acquired
+
+        return _Result()
+
+
+class _LockEngine:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def connect(self):
+        return self.conn
+
+
+def test_run_ingest_if_leader_skips_when_lock_is_taken(monkeypatch):
+    conn = _LockConn(acquired=False)
+    monkeypatch.setattr(ingest, "engine", _LockEngine(conn))
+    monkeypatch.setattr(ingest, "sync_corpus", lambda *a, **k: 1 / 0)
+
+    assert ingest.run_ingest_if_leader() is False
+    assert conn.sql == ["SELECT pg_try_advisory_lock(:key)"]
+
+
+def test_run_ingest_if_leader_ingests_and_unlocks(monkeypatch):
+    conn = _LockConn(acquired=True)
+    calls = []
+    monkeypatch.setattr(ingest, "engine", _LockEngine(conn))
+    monkeypatch.setattr(ingest, "create_db_and_tables", lambda: calls.append("db"))
+    monkeypatch.setattr(ingest, "sync_corpus", lambda *a, **k: calls.append("sync"))
+
+    assert ingest.run_ingest_if_leader() is True
+    assert calls == ["db", "sync"]
+    assert conn.sql[-1] == "SELECT pg_advisory_unlock(:key)"
@@ -1,21 +1,73 @@
+import threading
+
 from fastapi.testclient import TestClient
 from services.rag_service import main as main_mod
 
 
-def test_lifespan_calls_db_and_ingest(monkeypatch):
-    called = {"db": 0, "ingest": 0}
+def test_lifespan_runs_ingest_in_background(monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+
+    def fake_ingest():
+        started.set()
+        release.wait(timeout=5)
+        return True
+
+    monkeypatch.setattr(main_mod, "run_ingest_if_leader", fake_ingest)
+    monkeypatch.setattr(main_mod.rag_settings, "RAG_INGEST_ON_STARTUP", True)
+
+    with TestClient(main_mod.app) as client:
+        # O arranque não espera pela ingestão
+        assert started.wait(timeout=5)
+        assert main_mod.ingest_state["state"] == "running"
+        assert client.get("/health/live").status_code == 200
+        release.set()
+
 
-    def fake_create():
-        called["db"] += 1
+def test_lifespan_skips_ingest_when_disabled(monkeypatch):
+    called = {"ingest": 0}
 
     def fake_ingest():
         called["ingest"] += 1
+        return True
 
-    monkeypatch.setattr(main_mod, "create_db_and_tables", fake_create)
-    monkeypatch.setattr(main_mod, "add_classes_and_embeddings", fake_ingest)
+    monkeypatch.setattr(main_mod, "run_ingest_if_leader", fake_ingest)
+    monkeypatch.setattr(main_mod.rag_settings, "RAG_INGEST_ON_STARTUP", False)
 
     with TestClient(main_mod.app):
         pass
 
-    assert called["db"] == 1
-    assert called["ingest"] == 1
+    assert called["ingest"] == 0
+
+
+def test_readiness_reports_index_availability(monkeypatch):
+    ready = {"value": False}
+
+    async def fake_check():
+        return ready["value"]
+
+    monkeypatch.setattr(main_mod, "_check_index_ready", fake_check)
+    monkeypatch.setattr(main_mod, "_index_ready", False)
+    monkeypatch.setattr(main_mod.rag_settings, "RAG_INGEST_ON_STARTUP", False)
+
+    with TestClient(main_mod.app) as client:
+        resp = client.get("/health/ready")
+        assert resp.status_code == 503
+        assert resp.json()["index"] is False
+
+        ready["value"] = True
+        resp = client.get("/health/ready")
+        assert resp.status_code == 200
+        assert resp.json()["status"] == "ready"
+
+
+def test_readiness_is_not_ready_when_db_unreachable(monkeypatch):
+    async def failing_check():
+        raise RuntimeError("db down")
+
+    monkeypatch.setattr(main_mod, "_check_index_ready", failing_check)
+    monkeypatch.setattr(main_mod, "_index_ready", False)
+    monkeypatch.setattr(main_mod.rag_settings, "RAG_INGEST_ON_STARTUP", False)
+
+    with TestClient(main_mod.app) as client:
+        assert client.get("/health/ready").status_code == 503
@@ -0,0 +1,69 @@
+import asyncio
+import threading
+
+import httpx
+
+from services.rag_service.llm_registry import LLMClientRegistry
+
+
+class FakeChatOpenAI:
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+
+def _ok(request):
+    return httpx.Response(200, json={"ok": True})
+
+
+def test_clients_are_shared_per_configuration_and_pooled_per_model():
+    registry = LLMClientRegistry(factory=FakeChatOpenAI)
+
+    a = registry.get("gpt-4o-mini", 0.2, timeout=45.0, api_key="k")
+    b = registry.get("gpt-4o-mini", 0.2, timeout=45.0, api_key="k")
+    c = registry.get("gpt-4o-mini", 0.7)
+    d = registry.get("gpt-4o", 0.2)
+
+    assert a is b
+    assert a is not c
+    # Mesmo modelo, mesmo pool HTTP (o limite de concorrência é por modelo)
+    assert a.kwargs["http_client"] is c.kwargs["http_client"]
+    assert a.kwargs["http_client"] is not d.kwargs["http_client"]
+    assert a.kwargs["api_key"] == "k"
+    stats = registry.as_dict()
+    assert stats["clients"] == 3 and stats["created"] == 3 and stats["reused"] == 1
+    assert set(stats["models"]) == {"gpt-4o-mini", "gpt-4o"}
+
+
+def test_pool_metrics_count_sync_and_async_requests():
+    entered = threading.Event()
+    release = threading.Event()
+
+    def slow(request):
+        entered.set()
+        release.wait(timeout=5)
+        return httpx.Response(200)
+
+    registry = LLMClientRegistry(
+        max_connections=4,
+        factory=FakeChatOpenAI,
+        transport=httpx.MockTransport(slow),
+        async_transport=httpx.MockTransport(_ok),
+    )
+    pool = registry.pool("m")
+
+    worker = threading.Thread(target=pool.client.get, args=("http://llm/v1",))
+    worker.start()
+    assert entered.wait(timeout=5)
+    assert registry.as_dict()["models"]["m"]["in_flight"] == 1
+    assert registry.as_dict()["models"]["m"]["utilization"] == 0.25
+    release.set()
+    worker.join()
+
+    asyncio.run(pool.async_client.get("http://llm/v1"))
+
+    stats = registry.as_dict()["models"]["m"]
+    assert stats["requests"] == 2
+    assert stats["in_flight"] == 0
+    assert stats["peak_in_flight"] == 1
+    assert stats["errors"] == 0
+    assert stats["limit"] == 4
@@ -0,0 +1,141 @@
+import threading
+
+import numpy as np
+import pytest
+
+from services.rag_service.memory_index import IndexedChunk, MemoryVectorIndex
+
+
+class FakeSource:
+    def __init__(self, lessons):
+        # lesson_id -> (versão, [vetores])
+        self.lessons = lessons
+        self.loaded = []
+
+    def version(self):
+        return "|".join(f"{k}:{v[0]}" for k, v in sorted(self.lessons.items()))
+
+    def lesson_versions(self):
+        return {k: v[0] for k, v in self.lessons.items()}
+
+    def load_chunks(self, lesson_ids):
+        self.loaded.append(sorted(lesson_ids))
+        out = []
+        for lesson_id in sorted(lesson_ids):
+            for i, vec in enumerate(self.lessons[lesson_id][1]):
+                chunk = IndexedChunk(f"{lesson_id}-{i}", lesson_id, i, f"text {i}")
+                out.append((chunk, vec))
+        return out
+
+
+def _corpus(seed, lessons=3, per_lesson=20, dim=8):
+    rng = np.random.default_rng(seed)
+    return {
+        f"l{n}": ("v1", rng.standard_normal((per_lesson, dim)).tolist())
+        for n in range(lessons)
+    }
+
+
+def _brute_force(source, query, k):
+    ids, vecs = [], []
+    for lesson_id, (_, vectors) in sorted(source.lessons.items()):
+        for i, vec in enumerate(vectors):
+            ids.append(f"{lesson_id}-{i}")
+            vecs.append(vec)
+    m = np.asarray(vecs)
+    scores = (m / np.linalg.norm(m, axis=1, keepdims=True)) @ (
+        query / np.linalg.norm(query)
+    )
+    return [ids[i] for i in np.argsort(-scores)[:k]]
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_search_matches_exact_cosine_top_k(tmp_path, dtype):
+    source = FakeSource(_corpus(0))
+    index = MemoryVectorIndex(tmp_path, source=source, dtype=dtype)
+    assert index.refresh() is True
+
+    queries = np.random.default_rng(1).standard_normal((4, 8))
+    results = index.search(queries, k=5)
+
+    assert len(results) == 4
+    for query, hits in zip(queries, results):
+        got = [chunk.id for chunk, _ in hits]
+        if dtype == "float32":
+            assert got == _brute_force(source, query, 5)
+        else:
+            assert len(set(got) & set(_brute_force(source, query, 5))) >= 4
+        scores = [score for _, score in hits]
+        assert scores == sorted(scores, reverse=True)
+
+
+def test_refresh_is_noop_without_version_bump(tmp_path):
+    source = FakeSource(_corpus(0))
+    index = MemoryVectorIndex(tmp_path, source=source)
+    index.refresh()
+    assert index.refresh() is False
+    assert len(source.loaded) == 1
+
+
+def test_refresh_is_incremental_on_ingest_version_bump(tmp_path):
+    lessons = _corpus(0)
+    source = FakeSource(lessons)
+    index = MemoryVectorIndex(tmp_path, source=source)
+    index.refresh()
+
+    # l1 re-embebida, l2 removida, l3 nova
+    lessons["l1"] = ("v2", np.ones((5, 8)).tolist())
+    del lessons["l2"]
+    lessons["l3"] = ("v1", np.full((2, 8), -1.0).tolist())
+    assert index.refresh() is True
+
+    assert source.loaded[-1] == ["l1", "l3"]
+    assert index.stats["rows_reused"] == 20
+    assert len(index) == 20 + 5 + 2
+    assert {c.lesson_id for c in index.chunks} == {"l0", "l1", "l3"}
+    hit, _ = index.search([[1.0] * 8], k=1)[0][0]
+    assert hit.lesson_id == "l1"
+
+
+def test_other_workers_reuse_the_snapshot_on_disk(tmp_path):
+    source = FakeSource(_corpus(0))
+    MemoryVectorIndex(tmp_path, source=source).refresh()
+
+    other = MemoryVectorIndex(tmp_path, source=source)
+    assert other.refresh() is True
+    # o segundo worker só mapeia o ficheiro, não volta a ler o Postgres
+    assert len(source.loaded) == 1
+    assert isinstance(other.matrix, np.memmap)
+    assert len(other) == 60
+
+
+def test_empty_index_returns_no_hits(tmp_path):
+    index = MemoryVectorIndex(tmp_path, source=FakeSource({}))
+    index.refresh()
+    assert len(index) == 0
+    assert index.search([[0.1] * 8], k=3) == [[]]
+
+
+def test_search_never_mixes_snapshots_during_refresh(tmp_path):
+    big, small = _corpus(0), {"l0": ("v2", np.ones((5, 8)).tolist())}
+    source = FakeSource(big)
+    index = MemoryVectorIndex(tmp_path, source=source)
+    index.refresh()
+    stop = threading.Event()
+
+    def _flip():
+        # alterna entre um corpus de 60 linhas e um de 5
+        for i in range(20):
+            source.lessons = small if i % 2 == 0 else big
+            index.refresh()
+        stop.set()
+
+    refresher = threading.Thread(target=_flip)
+    refresher.start()
+    while not stop.is_set():
+        for hits in index.search([[1.0] * 8], k=10):
+            assert len(hits) in (5, 10)
+        # Os hits resolvem-se sempre no mapa do snapshot em que foram achados
+        results, by_id = index.search_with_lookup([[1.0] * 8], k=10)
+        assert all(by_id.get(chunk.id) is chunk for chunk, _ in results[0])
+    refresher.join()
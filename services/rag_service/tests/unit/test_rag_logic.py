@@ -1,7 +1,12 @@
-from unittest.mock import patch, MagicMock
-from services.rag_service.model import question_answer
+from unittest.mock import patch, MagicMock, AsyncMock
+from services.rag_service.model import (
+    question_answer,
+    aquestion_answer,
+    astream_question_answer,
+)
 from services.rag_service.rag_utils import format_question_prompt, get_llm
-from langchain_core.messages.ai import AIMessage
+from services.rag_service.llm_registry import LLMClientRegistry
+from langchain_core.messages.ai import AIMessage, AIMessageChunk
 from unittest.mock import ANY
 
 
@@ -17,19 +22,24 @@ def test_format_question_prompt():
 
 
 # Test for get_llm
-@patch("services.rag_service.rag_utils.ChatOpenAI")
-def test_get_llm(MockChatOpenAI):
-    # Configure the mock to behave like the real ChatOpenAI class
-    mock_instance = MockChatOpenAI.return_value
+def test_get_llm():
+    MockChatOpenAI = MagicMock()
+    registry = LLMClientRegistry(factory=MockChatOpenAI)
 
-    # Call the function to be tested
-    llm = get_llm(model_name="test-model", temperature=0.5)
+    # Call the function twice: the client is built once and then reused
+    with patch("services.rag_service.rag_utils.llm_registry", registry):
+        llm = get_llm(model_name="test-model", temperature=0.5)
+        again = get_llm(model_name="test-model", temperature=0.5)
 
-    # Assert that ChatOpenAI was called with the correct parameters
-    MockChatOpenAI.assert_called_once_with(model="test-model", temperature=0.5)
+    # Assert that ChatOpenAI was built with the parameters and the pooled clients
+    MockChatOpenAI.assert_called_once()
+    kwargs = MockChatOpenAI.call_args.kwargs
+    assert kwargs["model"] == "test-model"
+    assert kwargs["temperature"] == 0.5
+    assert kwargs["http_async_client"] is registry.pool("test-model").async_client
 
-    # Assert that the function returned the mock instance
-    assert llm == mock_instance
+    # Assert that the function returned the shared instance
+    assert llm is again is MockChatOpenAI.return_value
 
 
 # Test for question_answer
@@ -80,3 +90,45 @@ def test_question_answer_empty_context(mock_format_prompt, mock_get_llm):
         "Formatted prompt with no context", config={"callbacks": [ANY]}
     )
     assert result == "I need more context."
+
+
+# Test for aquestion_answer (async path used by the API)
+@patch("services.rag_service.rag_utils.get_llm")
+@patch("services.rag_service.rag_utils.format_question_prompt")
+async def test_aquestion_answer(mock_format_prompt, mock_get_llm):
+    # Arrange
+    mock_llm = MagicMock()
+    mock_llm.ainvoke = AsyncMock(return_value=AIMessage(content="The answer is 4."))
+    mock_get_llm.return_value = mock_llm
+    mock_format_prompt.return_value = "Formatted prompt"
+
+    # Act
+    result = await aquestion_answer("What is 2+2?", ["Basic arithmetic"])
+
+    # Assert
+    mock_llm.ainvoke.assert_awaited_once_with(
+        "Formatted prompt", config={"callbacks": [ANY]}
+    )
+    mock_llm.invoke.assert_not_called()
+    assert result == "The answer is 4."
+
+
+# Test for astream_question_answer (SSE endpoint)
+@patch("services.rag_service.rag_utils.get_llm")
+@patch("services.rag_service.rag_utils.format_question_prompt")
+async def test_astream_question_answer_yields_non_empty_tokens(
+    mock_format_prompt, mock_get_llm
+):
+    async def fake_astream(prompt, config=None):
+        for piece in ["The ", "", "answer"]:
+            yield AIMessageChunk(content=piece)
+
+    mock_llm = MagicMock()
+    mock_llm.astream = fake_astream
+    mock_get_llm.return_value = mock_llm
+    mock_format_prompt.return_value = "Formatted prompt"
+
+    tokens = [t async for t in astream_question_answer("Q", ["ctx"])]
+
+    assert tokens == ["The ", "answer"]
+    mock_format_prompt.assert_called_once_with("Q", ["ctx"])
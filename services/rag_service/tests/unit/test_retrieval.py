@@ -0,0 +1,82 @@
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from services.rag_service import retrieval
+
+
+def _sql(statement):
+    return str(statement.compile(dialect=postgresql.dialect()))
+
+
+def test_rrf_combines_rankings_with_weights():
+    fused = retrieval.reciprocal_rank_fusion(
+        [["a", "b", "c"], ["c", "d"]], weights=[1.0, 1.0], k=60
+    )
+    ids = [doc_id for doc_id, _ in fused]
+    # "c" aparece nas duas listas e passa para o topo
+    assert ids[0] == "c"
+    assert set(ids) == {"a", "b", "c", "d"}
+    assert fused[0][1] == pytest.approx(1 / 63 + 1 / 61)
+
+
+def test_rrf_weight_zero_ignores_a_ranking_and_limit():
+    fused = retrieval.reciprocal_rank_fusion(
+        [["a", "b"], ["z", "b"]], weights=[1.0, 0.0], limit=1
+    )
+    assert fused == [("a", pytest.approx(1 / 61))]
+
+
+def test_hybrid_query_without_lexical_weight_is_plain_vector_search():
+    sql = _sql(retrieval.hybrid_query("q", [0.0] * 3, 5, lexical_weight=0))
+    assert "<=>" in sql
+    assert "websearch_to_tsquery" not in sql
+
+
+def test_hybrid_query_fuses_vector_and_full_text_in_one_statement():
+    sql = _sql(
+        retrieval.hybrid_query(
+            "L'Hôpital rule", [0.0] * 3, 4, lexical_weight=0.5, config="simple"
+        )
+    )
+    assert "WITH vec AS" in sql and "lex AS" in sql
+    assert "websearch_to_tsquery('simple'::regconfig" in sql
+    # mesma expressão do índice GIN para que o planner o possa usar
+    assert "to_tsvector('simple'::regconfig, lesson_embeddings.content)" in sql
+    assert "UNION ALL" in sql
+
+
+def test_fts_config_is_validated():
+    with pytest.raises(ValueError):
+        retrieval.fts_document("english'; DROP TABLE x; --")
+
+
+def test_ann_search_setting_per_index_type_and_class(monkeypatch):
+    settings = retrieval.rag_settings
+    monkeypatch.setattr(settings, "RAG_HNSW_EF_SEARCH_SEARCH", 40)
+    monkeypatch.setattr(settings, "RAG_IVFFLAT_PROBES_QA", 12)
+
+    assert str(retrieval.ann_search_setting("search", 5, "hnsw")) == (
+        "SET LOCAL hnsw.ef_search = 40"
+    )
+    # ef_search nunca fica abaixo do nº de candidatos pedidos ao índice
+    assert str(retrieval.ann_search_setting("search", 50, "hnsw")) == (
+        "SET LOCAL hnsw.ef_search = 50"
+    )
+    assert str(retrieval.ann_search_setting("qa", 50, "ivfflat")) == (
+        "SET LOCAL ivfflat.probes = 12"
+    )
+    with pytest.raises(ValueError):
+        retrieval.ann_search_setting("bulk", 5, "hnsw")
+
+
+def test_vector_index_definition():
+    hnsw = retrieval.vector_index("hnsw")
+    ivf = retrieval.vector_index("ivfflat")
+    assert hnsw.name == "class_data_index"
+    assert hnsw.dialect_options["postgresql"]["using"] == "hnsw"
+    assert ivf.name == "class_data_ivfflat_index"
+    assert ivf.dialect_options["postgresql"]["with"] == {
+        "lists": retrieval.rag_settings.RAG_IVFFLAT_LISTS
+    }
+    with pytest.raises(ValueError):
+        retrieval.vector_index("flat")
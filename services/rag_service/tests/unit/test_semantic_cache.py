@@ -0,0 +1,198 @@
+import json
+
+import numpy as np
+import pytest
+
+from services.rag_service.semantic_cache import (
+    LRU_KEY,
+    SemanticAnswerCache,
+    context_key,
+    cosine_similarity,
+)
+
+
+class FakeAsyncPipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, name):
+        def _queue(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+
+        return _queue
+
+    async def execute(self):
+        return [await getattr(self.redis, n)(*a, **k) for n, a, k in self.calls]
+
+
+class FakeAsyncRedis:
+    """Subconjunto assíncrono de comandos Redis usados pela cache semântica."""
+
+    def __init__(self):
+        self.hashes = {}
+        self.zsets = {}
+        self.ttls = {}
+
+    async def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update(mapping)
+
+    async def hkeys(self, key):
+        return list(self.hashes.get(key, {}))
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    async def hlen(self, key):
+        return len(self.hashes.get(key, {}))
+
+    async def hdel(self, key, *fields):
+        for field in fields:
+            self.hashes.get(key, {}).pop(field, None)
+
+    async def expire(self, key, seconds):
+        self.ttls[key] = seconds
+
+    async def ttl(self, key):
+        return self.ttls.get(key, -1)
+
+    async def exists(self, key):
+        return int(key in self.hashes)
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.hashes.pop(key, None)
+            self.zsets.pop(key, None)
+
+    async def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    async def zcard(self, key):
+        return len(self.zsets.get(key, {}))
+
+    async def zrange(self, key, start, end):
+        members = sorted(self.zsets.get(key, {}).items(), key=lambda kv: kv[1])
+        return [m for m, _ in members][start : end + 1]
+
+    async def zrem(self, key, *members):
+        for member in members:
+            self.zsets.get(key, {}).pop(member, None)
+
+    async def zremrangebyscore(self, key, min_score, max_score):
+        zset = self.zsets.get(key, {})
+        for member, score in list(zset.items()):
+            if score <= max_score:
+                zset.pop(member)
+
+    def pipeline(self, transaction=True):
+        return FakeAsyncPipeline(self)
+
+    async def dbsize(self):
+        return len(self.hashes) + len(self.zsets)
+
+
+@pytest.fixture
+def redis():
+    return FakeAsyncRedis()
+
+
+def test_cosine_similarity_bounds():
+    assert cosine_similarity([1.0, 0.0], [2.0, 0.0]) == pytest.approx(1.0)
+    assert cosine_similarity([1.0, 0.0], [0.0, 1.0]) == pytest.approx(0.0)
+    assert cosine_similarity([0.0, 0.0], [1.0, 0.0]) == 0.0
+
+
+def test_context_key_ignores_ranking_order():
+    assert context_key(["a", "b", "c"]) == context_key(["c", "a", "b"])
+    assert context_key(["a", "b"]) != context_key(["a", "b", "c"])
+
+
+async def test_lookup_hits_only_above_threshold_and_same_context(redis):
+    cache = SemanticAnswerCache(redis, threshold=0.9)
+    await cache.store("q", [1.0, 0.0], ["c1", "c2"], "cached answer")
+
+    assert await cache.lookup([0.99, 0.05], ["c2", "c1"]) == "cached answer"
+    # embedding distante -> miss
+    assert await cache.lookup([0.0, 1.0], ["c1", "c2"]) is None
+    # mesmo embedding mas contexto diferente -> miss
+    assert await cache.lookup([1.0, 0.0], ["c1", "c3"]) is None
+
+    stats = cache.stats.as_dict()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["hit_rate"] == pytest.approx(1 / 3, rel=1e-3)
+
+
+async def test_store_sets_ttl_and_trims_bucket(redis):
+    cache = SemanticAnswerCache(redis, ttl_seconds=60, max_per_context=2)
+    for i in range(3):
+        await cache.store(f"q{i}", [1.0, float(i)], ["c1"], f"a{i}")
+
+    bucket = context_key(["c1"])
+    # dois campos por entrada (embedding + meta)
+    assert await redis.hlen(bucket) == 4
+    answers = [
+        json.loads(v)["answer"]
+        for f, v in redis.hashes[bucket].items()
+        if f.endswith(":meta")
+    ]
+    assert sorted(answers) == ["a1", "a2"]
+    assert 0 < await redis.ttl(bucket) <= 60
+    assert cache.stats.evictions == 1
+
+
+async def test_hit_refreshes_bucket_ttl_and_lru_score(redis):
+    cache = SemanticAnswerCache(redis, ttl_seconds=60)
+    await cache.store("q", [1.0, 0.0], ["c1"], "a")
+    bucket = context_key(["c1"])
+    # simula o TTL a acabar e um score LRU antigo
+    redis.ttls[bucket] = 5
+    redis.zsets[LRU_KEY][bucket] = 0.0
+
+    assert await cache.lookup([1.0, 0.0], ["c1"]) == "a"
+
+    assert await redis.ttl(bucket) == 60
+    assert redis.zsets[LRU_KEY][bucket] > 0.0
+
+
+async def test_embeddings_are_stored_as_packed_float32(redis):
+    cache = SemanticAnswerCache(redis)
+    await cache.store("q", [0.5, -1.0, 2.0], ["c1"], "a")
+
+    fields = redis.hashes[context_key(["c1"])]
+    (emb,) = [v for f, v in fields.items() if f.endswith(":emb")]
+    assert emb == np.asarray([0.5, -1.0, 2.0], dtype="<f4").tobytes()
+    # dimensão diferente da pergunta: ignorado em vez de falhar
+    assert await cache.lookup([0.5, -1.0], ["c1"]) is None
+    assert cache.stats.errors == 0
+
+
+async def test_lru_evicts_least_recently_used_context(redis):
+    cache = SemanticAnswerCache(redis, max_contexts=2)
+    await cache.store("q1", [1.0], ["c1"], "a1")
+    await cache.store("q2", [1.0], ["c2"], "a2")
+    # acesso a c1 torna c2 o menos usado recentemente
+    assert await cache.lookup([1.0], ["c1"]) == "a1"
+    await cache.store("q3", [1.0], ["c3"], "a3")
+
+    assert await redis.exists(context_key(["c2"])) == 0
+    assert await redis.exists(context_key(["c1"])) == 1
+    assert await redis.zcard(LRU_KEY) == 2
+
+
+async def test_disabled_cache_is_noop(redis):
+    cache = SemanticAnswerCache(redis, enabled=False)
+    await cache.store("q", [1.0], ["c1"], "a")
+    assert await cache.lookup([1.0], ["c1"]) is None
+    assert await redis.dbsize() == 0
+
+
+async def test_redis_errors_are_swallowed():
+    class Broken:
+        async def hgetall(self, key):
+            raise ConnectionError("down")
+
+    cache = SemanticAnswerCache(Broken())
+    assert await cache.lookup([1.0], ["c1"]) is None
+    assert cache.stats.errors == 1
@@ -0,0 +1,111 @@
+"""
+Benchmark: tempo de avaliação de um quiz vs nº de perguntas, em série (como
+o ciclo antigo do /eval-service), com `grading.grade_quiz` (concorrente,
+limitado por EVAL_MAX_CONCURRENCY) e em modo "batch" (`--batch-size`
+perguntas por chamada), contra um LLM simulado com latência configurável
+(uma chamada batch demora --llm-ms mais --per-item-ms por pergunta).
+
+Uso (requer as variáveis de ambiente do evaluation_service, como nos testes):
+
+    python -m tests.perf.bench_eval_grading --lengths 1 5 10 20 --llm-ms 800 \
+        --batch-size 10
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from services.evaluation_service import grading
+from services.evaluation_service.eval_settings import eval_settings
+
+
+class _Msg:
+    def __init__(self, content: str) -> None:
+        self.content = content
+
+
+def _stub_llm(latency: float, jitter: float):
+    async def grade(question: str, answer: str) -> _Msg:
+        await asyncio.sleep(latency * random.uniform(1 - jitter, 1 + jitter))
+        return _Msg(json.dumps({"correct_answer": "x", "feedback": "", "score": 1}))
+
+    return grade
+
+
+def _stub_batch_llm(latency: float, per_item: float, jitter: float):
+    async def grade_batch(pairs):
+        delay = (latency + per_item * len(pairs)) * random.uniform(
+            1 - jitter, 1 + jitter
+        )
+        await asyncio.sleep(delay)
+        return {
+            "grades": [
+                {"index": i, "correct_answer": "x", "feedback": "", "score": 1}
+                for i in range(len(pairs))
+            ]
+        }
+
+    return grade_batch
+
+
+async def _serial(questions, answers, grade) -> None:
+    for question, answer in zip(questions, answers):
+        grading.parse_grade(await grade(question, answer))
+
+
+async def _bench(args) -> None:
+    grade = _stub_llm(args.llm_ms / 1e3, args.jitter)
+    grade_batch = _stub_batch_llm(
+        args.llm_ms / 1e3, args.per_item_ms / 1e3, args.jitter
+    )
+    print(
+        f"{'questions':>9} {'serial (s)':>11} {'concurrent (s)':>15} "
+        f"{'batch (s)':>10} {'batch calls':>12}"
+    )
+    for n in args.lengths:
+        questions = [f"Q{i}" for i in range(n)]
+        answers = ["answer"] * n
+
+        started = time.perf_counter()
+        await _serial(questions, answers, grade)
+        serial = time.perf_counter() - started
+
+        started = time.perf_counter()
+        await grading.grade_quiz(questions, answers, grade)
+        concurrent = time.perf_counter() - started
+
+        calls = grading.grading_stats.llm_calls
+        started = time.perf_counter()
+        await grading.grade_quiz_batched(
+            questions, answers, grade_batch, grade, args.batch_size
+        )
+        batch = time.perf_counter() - started
+        calls = grading.grading_stats.llm_calls - calls
+
+        print(f"{n:>9} {serial:>11.2f} {concurrent:>15.2f} {batch:>10.2f} {calls:>12}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--lengths", type=int, nargs="+", default=[1, 5, 10, 20])
+    parser.add_argument("--llm-ms", type=float, default=800.0)
+    parser.add_argument("--per-item-ms", type=float, default=60.0)
+    parser.add_argument("--batch-size", type=int, default=eval_settings.EVAL_BATCH_SIZE)
+    parser.add_argument("--jitter", type=float, default=0.25)
+    parser.add_argument(
+        "--concurrency", type=int, default=eval_settings.EVAL_MAX_CONCURRENCY
+    )
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    eval_settings.EVAL_MAX_CONCURRENCY = args.concurrency
+    asyncio.run(_bench(args))
+
+
+if __name__ == "__main__":
+    main()
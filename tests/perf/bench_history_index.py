@@ -0,0 +1,117 @@
+"""
+Benchmark: listar o histórico de um utilizador com o SCAN antigo de
+`quizz_request:<user>:*` (O(total de chaves)) vs uma página do índice por
+utilizador (`history_index.read_page`, O(chaves do utilizador)), com muitas
+chaves de outros utilizadores no mesmo Redis.
+
+    docker run --rm -p 6379:6379 redis:7
+    python -m tests.perf.bench_history_index --url redis://localhost:6379/0 \\
+        --others 1000000 --mine 200
+
+As chaves criadas (`quizz_request:bench-*` e o índice) são apagadas no fim,
+exceto com `--keep`.
+
+Requer as variáveis de ambiente do quizz_gen_service, como nos testes.
+"""
+
+import argparse
+import json
+import statistics
+import time
+from typing import List
+
+import redis
+
+from services.quizz_gen_service import history_index
+
+KIND = "quizz_request"
+ME = "bench-me"
+
+
+def _populate(client, others: int, mine: int, chunk: int = 10_000) -> None:
+    value = json.dumps({"questions": ["1. Q"], "tags": ["bench"]})
+    for start in range(0, others, chunk):
+        pipe = client.pipeline(transaction=False)
+        for i in range(start, min(start + chunk, others)):
+            pipe.set(f"{KIND}:bench-other-{i % 5000}:{i}", value)
+        pipe.execute()
+    for i in range(mine):
+        key = f"{KIND}:{ME}:{i}"
+        client.set(key, value)
+        history_index.record(client, KIND, ME, key, created_at=i)
+
+
+def _scan_listing(client) -> List[str]:
+    # Implementação anterior de /get-quizz-questions
+    keys: List[str] = []
+    cursor = 0
+    while True:
+        cursor, batch = client.scan(cursor=cursor, match=f"{KIND}:{ME}:*", count=100)
+        keys.extend(batch)
+        if cursor == 0:
+            break
+    return client.mget(keys) if keys else []
+
+
+def _timed(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def _cleanup(client) -> None:
+    batch = []
+    for key in client.scan_iter(match=f"{KIND}:bench-*", count=1000):
+        batch.append(key)
+        if len(batch) >= 1000:
+            client.delete(*batch)
+            batch = []
+    if batch:
+        client.delete(*batch)
+    client.delete(history_index.index_key(KIND, ME))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--url", default="redis://localhost:6379/0")
+    parser.add_argument("--others", type=int, default=1_000_000)
+    parser.add_argument("--mine", type=int, default=200)
+    parser.add_argument("--page", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+
+    client = redis.Redis.from_url(args.url, decode_responses=True)
+
+    start = time.perf_counter()
+    _populate(client, args.others, args.mine)
+    print(
+        f"populated {args.others} other-user keys + {args.mine} own keys "
+        f"in {time.perf_counter() - start:.1f}s (dbsize={client.dbsize()})"
+    )
+    try:
+        scan_ms = _timed(lambda: _scan_listing(client), args.repeat)
+        page_ms = _timed(
+            lambda: history_index.read_page(client, KIND, ME, 0, args.page),
+            args.repeat,
+        )
+        assert len(_scan_listing(client)) == args.mine
+        page = history_index.read_page(client, KIND, ME, 0, args.page)
+        assert page is not None and page.total == args.mine
+    finally:
+        if not args.keep:
+            _cleanup(client)
+
+    print(f"{'method':<28}{'median ms':>12}")
+    print(f"{'SCAN + MGET (all keys)':<28}{scan_ms:>12.2f}")
+    print(f"{'index page (' + str(args.page) + ')':<28}{page_ms:>12.2f}")
+    print(f"speedup: {scan_ms / page_ms:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
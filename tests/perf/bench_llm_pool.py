@@ -0,0 +1,159 @@
+"""
+Benchmark: ChatOpenAI construído por chamada vs cliente partilhado do
+LLMClientRegistry, contra um servidor local compatível com a API da OpenAI.
+
+O servidor stub (HTTP/1.1 keep-alive, sem TLS) responde a
+/v1/chat/completions após --delay-ms e conta as ligações TCP abertas. Para
+cada modo mede a latência p50/p99 por chamada, o tempo total e o número de
+ligações, em série (invoke) e em concorrência (ainvoke + gather).
+
+    python -m tests.perf.bench_llm_pool --calls 200 --concurrency 16 --delay-ms 20
+
+Contra a API real o custo de cada ligação nova inclui ainda o handshake TLS.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List
+
+from langchain_openai import ChatOpenAI
+
+from services.rag_service.llm_registry import LLMClientRegistry
+
+MODEL = "gpt-4o-mini"
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    delay = 0.0
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self) -> None:
+        super().setup()
+        with _StubHandler.lock:
+            _StubHandler.connections += 1
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.delay)
+        body = json.dumps(
+            {
+                "id": "chatcmpl-bench",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": MODEL,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "ok"},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": 1,
+                    "completion_tokens": 1,
+                    "total_tokens": 2,
+                },
+            }
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def _percentiles(samples: List[float]):
+    samples.sort()
+    p99 = samples[min(len(samples) - 1, math.ceil(len(samples) * 0.99) - 1)]
+    return statistics.median(samples) * 1e3, p99 * 1e3
+
+
+def _report(label: str, latencies: List[float], wall: float, connections: int):
+    p50, p99 = _percentiles(latencies)
+    print(
+        f"{label:<28} p50 {p50:7.2f} ms  p99 {p99:7.2f} ms  "
+        f"total {wall:6.2f} s  tcp connections {connections}"
+    )
+
+
+def _run_serial(label: str, get_llm: Callable[[], ChatOpenAI], calls: int) -> None:
+    before = _StubHandler.connections
+    latencies: List[float] = []
+    started = time.perf_counter()
+    for _ in range(calls):
+        t0 = time.perf_counter()
+        get_llm().invoke("ping")
+        latencies.append(time.perf_counter() - t0)
+    wall = time.perf_counter() - started
+    _report(label, latencies, wall, _StubHandler.connections - before)
+
+
+async def _run_concurrent(
+    label: str, get_llm: Callable[[], ChatOpenAI], calls: int, concurrency: int
+) -> None:
+    before = _StubHandler.connections
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def one() -> None:
+        async with semaphore:
+            t0 = time.perf_counter()
+            await get_llm().ainvoke("ping")
+            latencies.append(time.perf_counter() - t0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(calls)))
+    wall = time.perf_counter() - started
+    _report(label, latencies, wall, _StubHandler.connections - before)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--delay-ms", type=float, default=20.0)
+    parser.add_argument("--max-connections", type=int, default=32)
+    args = parser.parse_args()
+
+    _StubHandler.delay = args.delay_ms / 1e3
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    def per_call() -> ChatOpenAI:
+        return ChatOpenAI(model=MODEL, base_url=base_url, api_key="sk-bench")
+
+    registry = LLMClientRegistry(max_connections=args.max_connections)
+
+    def shared() -> ChatOpenAI:
+        return registry.get(MODEL, 0.7, base_url=base_url, api_key="sk-bench")
+
+    _run_serial("per-call ChatOpenAI (serial)", per_call, args.calls)
+    _run_serial("registry (serial)", shared, args.calls)
+    asyncio.run(
+        _run_concurrent(
+            "per-call ChatOpenAI (async)", per_call, args.calls, args.concurrency
+        )
+    )
+    asyncio.run(
+        _run_concurrent("registry (async)", shared, args.calls, args.concurrency)
+    )
+    print(json.dumps(registry.as_dict()["models"][MODEL]))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Benchmark: concorrência vs latência p95 do endpoint /question-answer do RAG.
+
+Corre a app FastAPI em-processo (httpx + ASGITransport) com backends
+simulados (Redis, embeddings, pgvector e LLM com latências configuráveis),
+para medir quantos pedidos em voo um único worker aguenta.
+
+Uso (requer as variáveis de ambiente do rag_service, como nos testes):
+
+    python -m tests.perf.bench_rag_async --levels 1 10 50 100 200 --requests 400
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import httpx
+
+from services.rag_service import main as rag_main
+from services.rag_service.data_models import User
+from services.rag_service.embedding_cache import EmbeddingCache
+from services.rag_service.semantic_cache import SemanticAnswerCache
+
+
+class _StubRedis:
+    def __init__(self) -> None:
+        self.store: dict[str, str] = {}
+
+    async def get(self, key):
+        await asyncio.sleep(0.001)
+        return self.store.get(key)
+
+    async def set(self, key, value, ex=None):
+        await asyncio.sleep(0.001)
+        self.store[key] = value
+
+
+class _StubEmbeddings:
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+
+    async def aembed_query(self, text):
+        await asyncio.sleep(self.latency)
+        return [0.0] * 1536
+
+
+class _Row:
+    def __init__(self, i: int) -> None:
+        self.id = uuid.uuid4()
+        self.content = f"chunk {i}"
+        self.chunk_index = i
+        self.lesson_id = uuid.uuid4()
+
+
+class _StubSession:
+    latency = 0.01
+
+    def __init__(self, *args, **kwargs) -> None:
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+    async def execute(self, _statement):
+        pass
+
+    async def exec(self, _statement):
+        await asyncio.sleep(self.latency)
+        return [_Row(i) for i in range(3)]
+
+
+def _install_stubs(emb_latency: float, db_latency: float, llm_latency: float):
+    async def _fake_user():
+        return User(username="bench", email=None, full_name=None, disabled=False)
+
+    async def _fake_answer(question, context):
+        await asyncio.sleep(llm_latency)
+        return "stub answer"
+
+    _StubSession.latency = db_latency
+    rag_main.app.dependency_overrides[rag_main.get_current_active_user] = _fake_user
+    rag_main.embedding_cache = EmbeddingCache(_StubRedis())
+    # perguntas distintas: a cache semântica só acrescentaria round trips ao Redis
+    rag_main.semantic_cache = SemanticAnswerCache(None, enabled=False)
+    rag_main.embeddings = _StubEmbeddings(emb_latency)
+    rag_main.AsyncSession = _StubSession
+    rag_main.aquestion_answer = _fake_answer
+
+
+async def _run_level(concurrency: int, total: int) -> tuple[float, float, float]:
+    latencies: list[float] = []
+    sem = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=rag_main.app)
+
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=120
+    ) as client:
+
+        async def _one(i: int) -> None:
+            async with sem:
+                started = time.perf_counter()
+                resp = await client.post(
+                    "/question-answer",
+                    # perguntas distintas: força o caminho completo (cache miss)
+                    json={"question": f"What is a derivative? #{i}", "top_k": 3},
+                )
+                resp.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+
+        wall_start = time.perf_counter()
+        await asyncio.gather(*(_one(i) for i in range(total)))
+        wall = time.perf_counter() - wall_start
+
+    latencies.sort()
+    p50 = statistics.median(latencies)
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    return p50, p95, total / wall
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 10, 50, 100])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--emb-latency", type=float, default=0.05)
+    parser.add_argument("--db-latency", type=float, default=0.01)
+    parser.add_argument("--llm-latency", type=float, default=1.0)
+    args = parser.parse_args()
+
+    _install_stubs(args.emb_latency, args.db_latency, args.llm_latency)
+    print(f"{'concurrency':>11} {'p50 (s)':>9} {'p95 (s)':>9} {'req/s':>8}")
+    for level in args.levels:
+        p50, p95, rps = await _run_level(level, max(args.requests, level))
+        print(f"{level:>11} {p50:>9.3f} {p95:>9.3f} {rps:>8.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
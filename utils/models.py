@@ -6,12 +6,15 @@ from utils.format_prompt import (
     format_router_prompt,
     format_planner_prompt,
 )
+from utils.llm_registry import LLMClientRegistry
 from typing import List
 
 
+llm_registry = LLMClientRegistry()
+
+
 def get_llm(model_name: str = "gpt-4o-mini", temperature: float = 0.7) -> ChatOpenAI:
-    llm = ChatOpenAI(model=model_name, temperature=temperature)
-    return llm
+    return llm_registry.get(model_name, temperature)
 
 
 def evaluate_answer(question: str, answer: str) -> str: